@@ -0,0 +1,49 @@
+"""
+Parallel Journal Benchmark
+Reports the time to build the transaction data of a period per number of workers
+
+Usage:
+    python -m benchmarks.parallel_journal BOOK CHECKINGS_GUID START_DATE END_DATE [MAX_WORKERS]
+"""
+
+from datetime import date
+import os
+import sys
+import time
+
+import piecash
+
+from core.transaction_journal import TransactionJournal, TransactionJournalConfig
+
+
+def benchmark(book_path: str, checkings_guid: str, start_date: date, end_date: date, max_workers: int):
+    book = piecash.open_book(book_path, open_if_lock=True, readonly=True)
+
+    serial_time = None
+    serial_data = None
+    for workers in range(1, max_workers + 1):
+        with TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid=checkings_guid,
+                eager_load=True,
+                workers=workers if workers > 1 else None)) as journal:
+            start = time.perf_counter()
+            data = journal.get_transaction_data(start_date, end_date)
+            elapsed = time.perf_counter() - start
+
+        if serial_time is None:
+            serial_time = elapsed
+            serial_data = data
+        identical = data == serial_data
+        print("{} worker(s): {:.3f}s, speedup {:.2f}x, {} items, identical: {}".format(
+            workers, elapsed, serial_time / elapsed, len(data.items), identical))
+
+    book.close()
+
+
+if __name__ == "__main__":
+    benchmark(
+        book_path=sys.argv[1],
+        checkings_guid=sys.argv[2],
+        start_date=date.fromisoformat(sys.argv[3]),
+        end_date=date.fromisoformat(sys.argv[4]),
+        max_workers=int(sys.argv[5]) if len(sys.argv) > 5 else os.cpu_count())
@@ -0,0 +1,59 @@
+"""
+Recurrence Batch Benchmark
+Compares the expansion of many scheduled transaction recurrences one by one with RecurrenceExpander
+and all at once with RecurrenceBatchExpander, over a long forecast horizon
+
+Usage:
+    python -m benchmarks.recurrence_batch [COUNT] [YEARS]
+"""
+
+from datetime import date, timedelta
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from core.recurrence import RecurrenceBatchExpander, RecurrenceExpander
+
+
+def get_recurrences(count: int) -> list[SimpleNamespace]:
+    """Returns count recurrences, mostly monthly or weekly, starting on random days (month ends included)"""
+    rng = random.Random(0)
+    return [SimpleNamespace(
+        recurrence_period_type=rng.choice(["month", "month", "month", "week", "week", "end of month", "year"]),
+        recurrence_mult=rng.choice([1, 1, 1, 2, 3]),
+        recurrence_period_start=date(2015, 1, 1) + timedelta(days=rng.randrange(3000)),
+        recurrence_weekend_adjust=rng.choice(["none", "back", "forward"])) for _ in range(count)]
+
+
+def scalar(recurrences: list, start_date: date, end_date: date) -> list[list[date]]:
+    """Expands each recurrence with RecurrenceExpander"""
+    return [RecurrenceExpander.get_occurences(recurrence, start_date, end_date) for recurrence in recurrences]
+
+
+def batch(recurrences: list, start_date: date, end_date: date) -> list[list[date]]:
+    """Expands every recurrence at once with RecurrenceBatchExpander"""
+    return RecurrenceBatchExpander.get_occurences(
+        recurrences, [start_date] * len(recurrences), [end_date] * len(recurrences))
+
+
+def measure(expand, recurrences: list, start_date: date, end_date: date) -> tuple[float, list[list[date]]]:
+    """Returns the time (in seconds) to expand the recurrences inside the window, and the occurences"""
+    start = time.perf_counter()
+    occurences = expand(recurrences, start_date, end_date)
+    return time.perf_counter() - start, occurences
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    recurrences = get_recurrences(count)
+    start_date = date(2024, 1, 1)
+    end_date = date(2024 + years, 1, 1)
+    scalar_time, scalar_occurences = measure(scalar, recurrences, start_date, end_date)
+    batch_time, batch_occurences = measure(batch, recurrences, start_date, end_date)
+    assert batch_occurences == scalar_occurences
+    print("occurences:     {:8d}".format(sum(len(dates) for dates in batch_occurences)))
+    print("one by one:     {:8.3f}s".format(scalar_time))
+    print("batch:          {:8.3f}s".format(batch_time))
+    print("speedup: {:.1f}x".format(scalar_time / batch_time))
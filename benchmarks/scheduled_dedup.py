@@ -0,0 +1,77 @@
+"""
+Scheduled Dedup Benchmark
+Compares TransactionDataItem.from_simplified with the former list-based dedup of the scheduled
+transactions already recorded (and list concatenation of the simplified transactions),
+on a synthetic busy day where every scheduled transaction has been recorded
+
+Usage:
+    python -m benchmarks.scheduled_dedup [COUNT]
+"""
+
+from datetime import date
+from decimal import Decimal
+import sys
+import time
+from types import SimpleNamespace
+
+from core.simple_transaction import SimpleTransaction
+from core.transaction_data_item import TransactionDataItem
+from core.typings import TransactionType
+
+
+def get_day(count: int) -> tuple[list[list[SimpleTransaction]], list[str], list[SimpleNamespace]]:
+    """
+    Returns the simplified splits of count recorded transactions, the guids of the scheduled
+    transactions behind them and the scheduled transactions (in reverse order)
+    """
+    guids = ["{:032x}".format(index) for index in range(count)]
+    records = [[SimpleTransaction(
+        value=Decimal(index % 1000) / 100,
+        description="Payroll",
+        from_account="Income:Salary",
+        to_account="Assets:Current Assets:Checkings",
+        transaction_type=TransactionType.INCOME)] for index in range(count)]
+    scheduled = [SimpleNamespace(guid=guid) for guid in reversed(guids)]
+    return records, guids, scheduled
+
+
+def former(records: list[list[SimpleTransaction]], guids: list[str], scheduled: list) -> TransactionDataItem:
+    """Builds the item as before: concatenated lists, and linear lookups and removals of the guids"""
+    transactions = []
+    for record in records:
+        transactions = transactions + record
+    sch_guids = list(guids)
+    for sch in scheduled:
+        if sch.guid in sch_guids:
+            sch_guids.remove(sch.guid)
+    return TransactionDataItem(date=date(2022, 1, 25), transactions=transactions)
+
+
+def current(records: list[list[SimpleTransaction]], guids: list[str], scheduled: list) -> TransactionDataItem:
+    """Builds the item as from_transactions does now"""
+    transactions = []
+    for record in records:
+        transactions.extend(record)
+    return TransactionDataItem.from_simplified(
+        date=date(2022, 1, 25),
+        recorded=transactions,
+        recorded_scheduled_guids=guids,
+        scheduled=scheduled)
+
+
+def measure(build, count: int) -> tuple[float, TransactionDataItem]:
+    """Returns the time (in seconds) to build the item of a day of count transactions, and the item"""
+    records, guids, scheduled = get_day(count)
+    start = time.perf_counter()
+    item = build(records, guids, scheduled)
+    return time.perf_counter() - start, item
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    former_time, former_item = measure(former, count)
+    current_time, current_item = measure(current, count)
+    assert current_item == former_item
+    print("list dedup:     {:8.3f}s".format(former_time))
+    print("multiset dedup: {:8.3f}s".format(current_time))
+    print("speedup: {:.1f}x".format(former_time / current_time))
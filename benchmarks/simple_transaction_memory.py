@@ -0,0 +1,70 @@
+"""
+SimpleTransaction Memory Benchmark
+Compares the memory used by SimpleTransaction with the former dict-backed dataclass,
+both built with a new account full name string per transaction (as Account.fullname does)
+
+Usage:
+    python -m benchmarks.simple_transaction_memory [COUNT]
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+import sys
+import tracemalloc
+
+from core.simple_transaction import SimpleTransaction
+from core.typings import TransactionType
+
+
+@dataclass
+class DictSimpleTransaction:
+    """
+    SimpleTransaction as it was before: a regular dataclass without interning
+    """
+    value: Decimal
+    description: str = ""
+    from_account: str = ""
+    from_account_guid: str = ""
+    to_account: str = ""
+    to_account_guid: str = ""
+    transaction_type: TransactionType = TransactionType.OPENING_BALANCE
+    is_scheduled: bool = False
+
+
+ACCOUNTS = [
+    ("Assets:Current Assets:Checkings", "24b92fc00a9440c2856281f6eb093536"),
+    ("Expenses:Food:Groceries", "a0bb4f5c1ac04fbfb6e6a2fa6be0a3c1"),
+    ("Expenses:Housing:Rent", "63e5a6a23a0e4bbf8d6c1bb0f7cc1e07"),
+    ("Liabilities:Credit card", "8e9104e0e32c4e439be578f8549aea62"),
+]
+
+
+def measure(cls, count: int) -> int:
+    """Returns the memory allocated (in bytes) to build count transactions of the class"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    transactions = []
+    for index in range(count):
+        from_name, from_guid = ACCOUNTS[index % len(ACCOUNTS)]
+        to_name, to_guid = ACCOUNTS[(index + 1) % len(ACCOUNTS)]
+        transactions.append(cls(
+            value=Decimal(index % 1000) / 100,
+            description="Transaction",
+            # New strings, as Account.fullname builds the name on each call
+            from_account="".join(from_name.split(":", 1)[:1]) + from_name[from_name.find(":"):],
+            from_account_guid=from_guid[:16] + from_guid[16:],
+            to_account="".join(to_name.split(":", 1)[:1]) + to_name[to_name.find(":"):],
+            to_account_guid=to_guid[:16] + to_guid[16:],
+            transaction_type=TransactionType.EXPENSE))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dict_size = measure(DictSimpleTransaction, count)
+    slots_size = measure(SimpleTransaction, count)
+    print("dataclass:            {:>12} bytes ({:.0f} per transaction)".format(dict_size, dict_size / count))
+    print("slotted and interned: {:>12} bytes ({:.0f} per transaction)".format(slots_size, slots_size / count))
+    print("ratio: {:.2f}".format(slots_size / dict_size))
@@ -0,0 +1,80 @@
+"""
+SQL Backend Benchmark
+Compares the time to build the transaction data of a period with the orm backend (piecash objects,
+eager loaded) and the sql backend (SQLAlchemy Core rows), on a copy of the sample book filled
+with synthetic transactions
+
+Usage:
+    python -m benchmarks.sql_backend [COUNT]
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import piecash
+from piecash.core.transaction import Split, Transaction
+
+from core.transaction_journal import TransactionJournal, TransactionJournalConfig
+from tests.test_piecash_helper import sample_data_path
+
+CHECKINGS_GUID = "24b92fc00a9440c2856281f6eb093536"
+LIABILITIES_GUID = "8e9104e0e32c4e439be578f8549aea62"
+
+
+def fill_book(book_path: str, count: int) -> None:
+    """Adds count transactions between the checkings, food and credit card accounts, over about 3 years"""
+    book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+    checkings = book.accounts(fullname="Assets:Checkings")
+    food = book.accounts(fullname="Expenses:Food")
+    credit_card = book.accounts(fullname="Liabilities:Credit card")
+    for index in range(count):
+        from_account = checkings if index % 3 else credit_card
+        value = Decimal(index % 5000 + 1) / 100
+        Transaction(
+            currency=checkings.commodity,
+            description="Synthetic {}".format(index % 100),
+            post_date=date(2021, 9, 1) + timedelta(days=index % 1000),
+            splits=[
+                Split(account=from_account, value=-value),
+                Split(account=food, value=value)
+            ])
+    book.save()
+    book.close()
+
+
+def measure(book_path: str, backend: str, start_date: date, end_date: date):
+    """Returns the time (in seconds) to build the transaction data of the period, and the data"""
+    book = piecash.open_book(book_path, open_if_lock=True, readonly=True)
+    journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+        checkings_parent_guid=CHECKINGS_GUID,
+        liabilities_parent_guid=LIABILITIES_GUID,
+        eager_load=True,
+        backend=backend))
+    start = time.perf_counter()
+    data = journal.get_transaction_data(start_date, end_date)
+    elapsed = time.perf_counter() - start
+    book.close()
+    return elapsed, data
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as directory:
+        book_path = os.path.join(directory, "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        fill_book(book_path, count)
+
+        start_date = date(2021, 9, 1)
+        end_date = date(2024, 6, 30)
+        orm_time, orm_data = measure(book_path, "orm", start_date, end_date)
+        sql_time, sql_data = measure(book_path, "sql", start_date, end_date)
+        assert sql_data == orm_data
+        print("transactions:   {:8d}".format(sum(len(item.transactions) for item in orm_data.items)))
+        print("orm:            {:8.3f}s".format(orm_time))
+        print("sql:            {:8.3f}s".format(sql_time))
+        print("speedup: {:.1f}x".format(orm_time / sql_time))
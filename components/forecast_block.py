@@ -46,6 +46,8 @@ class ForecastComponent(BaseComponent):
 
             trx_data = TransactionStore.load_data(data)
             balance_data = trx_data.get_balance_data()
+            if len(balance_data) > 0:
+                balance_data["balance"] = trx_data.to_decimal(balance_data["balance"])
 
             fig = go.Figure()
 
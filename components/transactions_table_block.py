@@ -180,16 +180,16 @@ class TransactionTableComponent(BaseComponent):
             trx_data = TransactionStore.load_data(data)
             df = self.get_filtered_data(trx_data.get_dataframe(), relayoutData, legends)
 
-            df["value"] = df["value"].astype(float)
+            df["value"] = trx_data.to_decimal(df["value"]).astype(float)
             df["is_scheduled"] = df["is_scheduled"].astype('str')
 
             df['transaction_type'] = df['transaction_type'].map({
-                TransactionType.EXPENSE: 'Expense',
-                TransactionType.INCOME: 'Income',
-                TransactionType.LIABILITY: 'Liability',
-                TransactionType.OPENING_BALANCE: 'Opening Balance',
-                TransactionType.QUITTANCE: 'Quittance',
-                TransactionType.TRANSFER: 'Transfer'
+                TransactionType.EXPENSE.name: 'Expense',
+                TransactionType.INCOME.name: 'Income',
+                TransactionType.LIABILITY.name: 'Liability',
+                TransactionType.OPENING_BALANCE.name: 'Opening Balance',
+                TransactionType.QUITTANCE.name: 'Quittance',
+                TransactionType.TRANSFER.name: 'Transfer'
             })
 
             df['date'] = df["date"].dt.strftime('%d-%m-%Y')
@@ -224,10 +224,14 @@ class TransactionTableComponent(BaseComponent):
             if legends[i]:
                 allowed_legends.append(legends_type[i])
 
+        # The accounts are categoricals: match each distinct account once, then select its rows
+        from_accounts = df["from_account"].astype("category")
+        categories = from_accounts.cat.categories
+
         dataframes = []
-        dataframes.append(df[df["transaction_type"] == TransactionType.INCOME])
+        dataframes.append(df[df["transaction_type"] == TransactionType.INCOME.name])
         for allowed in allowed_legends:
-            temp_df = df[df["from_account"].str.contains(allowed["type"])]
+            temp_df = df[from_accounts.isin(categories[categories.str.contains(allowed["type"])])]
             dataframes.append(temp_df[temp_df["is_scheduled"] == allowed["scheduled"]])
 
         return pd.concat(dataframes).sort_values('date')
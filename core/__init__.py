@@ -6,4 +6,19 @@ from .transaction_journal import TransactionJournal, TransactionJournalConfig
 from .transaction_data import TransactionData, TransactionDataConfig
 from .transaction_data_item import TransactionDataItem
 from .simple_transaction import SimpleTransaction, TransactionType
-from .typings import RawTransactionData, BalanceType, TransactionType, Balance, BalanceData
\ No newline at end of file
+from .typings import RawTransactionData, BalanceType, TransactionType, Balance, BalanceData
+from .query_counter import QueryCounter
+from .recurrence import RecurrenceBatchExpander, RecurrenceExpander
+from .account_balance import AccountBalance
+from .balance_checkpoint import BalanceCheckpointStore, BookState
+from .transaction_columns import TransactionColumns
+from .sql_journal_backend import SqlJournalBackend
+from .transaction_data_cache import TransactionDataCache, CacheStats
+from .balance_engine import BalanceEngine, ItemBalances
+from .money import Money
+from .scheduled_matcher import ScheduledMatcher
+from .transaction_classifier import TransactionClassifier
+from .account_hierarchy import AccountHierarchy
+from .account_directory import AccountDirectory, AccountEntry
+from .scheduled_formula import ScheduledFormula
+from .scheduled_template import CompiledTemplate, ScheduledTemplateCache
@@ -0,0 +1,282 @@
+"""
+Account Balance
+"""
+
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+import hashlib
+
+from piecash.core.account import Account
+from piecash.core.book import Book
+from piecash.core.transaction import Split, Transaction
+from sqlalchemy import case, event, func, inspect, literal, select
+
+from core.balance_checkpoint import BalanceCheckpointStore, BookState
+
+
+class AccountBalance:
+    """
+    Computes the balance of an account (and all its children) with a single SUM query,
+    instead of loading every split of the subtree into Python as Account.get_balance does.
+
+    When a BalanceCheckpointStore is given, balances are computed from the nearest
+    month-end checkpoint plus the splits posted since it.
+    The checkpoints are validated against the whole book on the first lookup, then again only after expire
+    (e.g. when the book may have been changed by another session). The changes flushed by the session of the
+    book are tracked instead: only the checkpoints from their post dates are invalidated (all of them if an
+    account was moved).
+    """
+
+    def __init__(self, book: Book, checkpoints: BalanceCheckpointStore = None) -> None:
+        self.book = book
+        self.checkpoints = checkpoints
+        self._synced = False
+        # Post dates of the changes flushed since the last commit, invalidated again on a rollback
+        self._uncommitted: set[date] = set()
+        self._uncommitted_accounts = False
+        if checkpoints is not None:
+            event.listen(book.session, "after_flush", self._track_changes)
+            event.listen(book.session, "after_commit", self._commit_changes)
+            event.listen(book.session, "after_rollback", self._rollback_changes)
+
+    def close(self) -> None:
+        """Stops tracking the changes of the session and using the checkpoints (their store is left open)"""
+        if self.checkpoints is not None:
+            event.remove(self.book.session, "after_flush", self._track_changes)
+            event.remove(self.book.session, "after_commit", self._commit_changes)
+            event.remove(self.book.session, "after_rollback", self._rollback_changes)
+            self.checkpoints = None
+
+    def expire(self) -> None:
+        """Validates the checkpoints again against the whole book on the next lookup"""
+        self._synced = False
+
+    def _track_changes(self, session, flush_context) -> None:
+        """Invalidates the checkpoints from the post dates of the splits and transactions flushed by the session"""
+        post_dates = set()
+        accounts = False
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Transaction):
+                post_dates.update(inspect(obj).attrs._post_date.history.sum())
+            elif isinstance(obj, Split):
+                post_dates.update(tr.post_date for tr in inspect(obj).attrs.transaction.load_history().sum()
+                                  if tr is not None)
+            elif isinstance(obj, Account) and obj not in session.new:
+                # The balances of a subtree change with the accounts moved in or out, or their commodity
+                state = inspect(obj)
+                accounts = accounts or any(state.attrs[key].history.has_changes() for key in [
+                    "parent", "parent_guid", "commodity", "commodity_guid"]) or obj in session.deleted
+        post_dates.discard(None)
+
+        self._invalidate(post_dates, accounts)
+        self._uncommitted.update(post_dates)
+        self._uncommitted_accounts = self._uncommitted_accounts or accounts
+
+    def _commit_changes(self, session) -> None:
+        """Forgets the changes tracked since the last commit, once committed"""
+        self._uncommitted.clear()
+        self._uncommitted_accounts = False
+
+    def _rollback_changes(self, session) -> None:
+        """Invalidates the checkpoints stored since the changes rolled back were flushed"""
+        self._invalidate(self._uncommitted, self._uncommitted_accounts)
+        self._commit_changes(session)
+
+    def _invalidate(self, post_dates: set[date], accounts: bool) -> None:
+        """Removes the checkpoints from the earliest of the post dates (all of them if an account was moved)"""
+        if accounts:
+            self.checkpoints.clear()
+        elif len(post_dates) > 0:
+            self.checkpoints.invalidate(from_date=min(post_dates))
+
+    def _get_subtree(self, account_guid: str):
+        """Returns a recursive CTE with the guid and commodity of the account and its descendants"""
+        subtree = select(
+            Account.guid.label("guid"),
+            Account.commodity_guid.label("commodity_guid")
+        ).where(
+            Account.guid == account_guid
+        ).cte("subtree", recursive=True)
+
+        return subtree.union_all(select(
+            Account.guid,
+            Account.commodity_guid
+        ).where(
+            Account.parent_guid == subtree.c.guid
+        ))
+
+    def get_raw_balances(self, account: Account, at_dates: list[date], from_date: date = None) -> list[Decimal]:
+        """
+        Returns, for each of the (sorted) dates, the sum of the split quantities of the subtree
+        posted in ]from_date, at_date], without the natural sign of the account.
+        Everything is computed by a single query, bucketing the splits by date.
+        Returns None when the subtree holds different commodities, as they can't be summed without prices.
+        """
+        subtree = self._get_subtree(account.guid)
+
+        if len(at_dates) == 1:
+            bucket = literal(0)
+        else:
+            bucket = case(
+                *[(Transaction.post_date <= at_date, index) for index, at_date in enumerate(at_dates)],
+                else_=len(at_dates))
+
+        query = select(
+            bucket,
+            subtree.c.commodity_guid,
+            Split._quantity_denom,
+            func.sum(Split._quantity_num)
+        ).select_from(Split).join(
+            Transaction, Split.transaction_guid == Transaction.guid
+        ).join(
+            subtree, Split.account_guid == subtree.c.guid
+        ).where(
+            Transaction.post_date <= at_dates[-1]
+        ).group_by(
+            bucket,
+            subtree.c.commodity_guid,
+            Split._quantity_denom
+        )
+        if from_date is not None:
+            query = query.where(Transaction.post_date > from_date)
+
+        buckets = [Decimal(0)] * len(at_dates)
+        for index, commodity_guid, denom, num in self.book.session.execute(query):
+            if commodity_guid != account.commodity_guid:
+                return None
+            buckets[index] = buckets[index] + Decimal(num) / Decimal(denom)
+
+        balances = []
+        balance = Decimal(0)
+        for value in buckets:
+            balance = balance + value
+            balances.append(balance)
+        return balances
+
+    def get_raw_balance(self, account: Account, at_date: date, from_date: date = None) -> Decimal:
+        """
+        Returns the sum of the split quantities of the subtree, posted in ]from_date, at_date],
+        without the natural sign of the account (None if it holds different commodities)
+        """
+        balances = self.get_raw_balances(account=account, at_dates=[at_date], from_date=from_date)
+        return balances[0] if balances is not None else None
+
+    def get_balances(self, account: Account, at_dates: list[date]) -> list[Decimal]:
+        """
+        Returns the balance of the account (including its children) at each of the (sorted) dates,
+        with the same sign conventions as Account.get_balance, using a single query
+        """
+        balances = self.get_raw_balances(account=account, at_dates=at_dates)
+        if balances is None:
+            # Multiple commodities: let piecash convert them
+            return [account.get_balance(at_date=at_date) for at_date in at_dates]
+        return [balance * account.sign for balance in balances]
+
+    def get_book_state(self) -> BookState:
+        """
+        Returns the current state of the book, used to validate the checkpoints: a checksum per month of the
+        number of splits and the sums of their values and quantities by post date and account,
+        and a checksum of the parent and commodity of every account (two queries)
+        """
+        rows = self.book.session.execute(select(
+            Transaction.post_date,
+            Split.account_guid,
+            func.count(Split.guid),
+            func.sum(Split._value_num),
+            func.sum(Split._quantity_num)
+        ).select_from(Split).join(
+            Transaction, Split.transaction_guid == Transaction.guid
+        ).group_by(
+            Transaction.post_date,
+            Split.account_guid
+        ))
+
+        months: dict[str, list[tuple]] = {}
+        for post_date, *accounts in rows:
+            months.setdefault(post_date.strftime("%Y-%m"), []).append((post_date.isoformat(), *accounts))
+
+        hierarchy = self.book.session.execute(select(
+            Account.guid,
+            Account.parent_guid,
+            Account.commodity_guid
+        )).all()
+        return BookState(
+            book_guid=self.book.guid,
+            months={month: hashlib.sha1(repr(sorted(accounts)).encode()).hexdigest()
+                    for month, accounts in months.items()},
+            accounts=hashlib.sha1(repr(sorted(tuple(row) for row in hierarchy)).encode()).hexdigest())
+
+    def sync_checkpoints(self) -> None:
+        """
+        Invalidates the checkpoints affected by the changes made to the book since they were stored:
+        the checkpoints are removed from the earliest month whose splits were added, deleted or edited
+        (or all of them for another book, or when an account was moved)
+        """
+        state = self.get_book_state()
+        stored = self.checkpoints.get_state()
+
+        if stored is None or stored.book_guid != state.book_guid or stored.accounts != state.accounts:
+            self.checkpoints.clear()
+        else:
+            changed = [
+                month for month in set(state.months) | set(stored.months)
+                if state.months.get(month) != stored.months.get(month)]
+            if len(changed) > 0:
+                self.checkpoints.invalidate(from_date=date.fromisoformat(min(changed) + "-01"))
+
+        if stored != state:
+            self.checkpoints.set_state(state)
+        self._synced = True
+
+    def _get_month_end(self, at_date: date) -> date:
+        """Returns the last month end on or before the given date"""
+        if at_date.day == calendar.monthrange(at_date.year, at_date.month)[1]:
+            return at_date
+        return at_date.replace(day=1) - timedelta(days=1)
+
+    def _get_checkpointed_raw_balance(self, account: Account, at_date: date) -> Decimal:
+        """Returns the raw balance using (and updating) the checkpoints of the account"""
+        month_end = self._get_month_end(at_date)
+        checkpoint = self.checkpoints.get_checkpoint(account_guid=account.guid, at_date=at_date)
+
+        from_date = None
+        opening = Decimal(0)
+        if checkpoint is not None:
+            from_date, opening = checkpoint
+
+        if from_date is not None and from_date >= month_end:
+            delta = self.get_raw_balance(account=account, at_date=at_date, from_date=from_date)
+            return opening + delta if delta is not None else None
+
+        balances = self.get_raw_balances(account=account, at_dates=[month_end, at_date], from_date=from_date)
+        if balances is None:
+            return None
+
+        self.checkpoints.set_checkpoint(
+            account_guid=account.guid,
+            checkpoint_date=month_end,
+            balance=opening + balances[0])
+        return opening + balances[1]
+
+    def get_balance(self, account: Account, at_date: date, from_date: date = None) -> Decimal:
+        """
+        Returns the balance of the account (including its children) at a given date,
+        with the same sign conventions as Account.get_balance.
+        If from_date is set, only the splits posted after it are considered.
+        """
+        if self.checkpoints is not None and from_date is None:
+            if not self._synced:
+                self.sync_checkpoints()
+            balance = self._get_checkpointed_raw_balance(account=account, at_date=at_date)
+        else:
+            balance = self.get_raw_balance(account=account, at_date=at_date, from_date=from_date)
+
+        if balance is None:
+            # Multiple commodities: let piecash convert them
+            balance = account.get_balance(at_date=at_date)
+            if from_date is not None:
+                balance = balance - account.get_balance(at_date=from_date)
+            return balance
+
+        return balance * account.sign
@@ -0,0 +1,97 @@
+"""
+Account Directory
+"""
+
+from dataclasses import dataclass
+
+from piecash.core.account import Account
+from piecash.core.book import Book
+from piecash.core.commodity import Commodity
+from sqlalchemy import select
+
+from core.account_hierarchy import AccountHierarchy
+
+
+@dataclass(frozen=True)
+class AccountEntry:
+    """
+    Account fields needed to simplify a transaction, without the ORM
+    """
+    guid: str
+    name: str
+    # Full name, as Account.fullname (empty for the root account)
+    fullname: str
+    type: str
+    parent_guid: str = None
+    commodity_guid: str = None
+    # Smallest fraction of the commodity (e.g. 100 for cents)
+    fraction: int = None
+
+
+class AccountDirectory:
+    """
+    Every account of a book by guid, loaded in a single query,
+    with their full names resolved once instead of through the parent objects on each access
+    """
+
+    def __init__(self, accounts: dict[str, AccountEntry]) -> None:
+        self.accounts = accounts
+        self._hierarchy: AccountHierarchy = None
+
+    def __getitem__(self, guid: str) -> AccountEntry:
+        return self.accounts[guid]
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self.accounts
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    @classmethod
+    def from_book(cls, book: Book) -> "AccountDirectory":
+        """Loads the accounts of the book, with their commodities, in a single query"""
+        rows = book.session.execute(select(
+            Account.guid,
+            Account.name,
+            Account.type,
+            Account.parent_guid,
+            Account.commodity_guid,
+            Commodity.fraction
+        ).outerjoin(
+            Commodity, Commodity.guid == Account.commodity_guid
+        )).all()
+        parents = {guid: (name, parent_guid) for guid, name, _type, parent_guid, _commodity, _fraction in rows}
+
+        fullnames: dict[str, str] = {}
+
+        def get_fullname(guid: str) -> str:
+            if guid not in fullnames:
+                name, parent_guid = parents[guid]
+                if parent_guid is None or parent_guid not in parents:
+                    # The root account has no name in the full names
+                    fullnames[guid] = ""
+                else:
+                    parent_fullname = get_fullname(parent_guid)
+                    fullnames[guid] = "{}:{}".format(parent_fullname, name) if parent_fullname else name
+            return fullnames[guid]
+
+        return cls({guid: AccountEntry(
+            guid=guid,
+            name=name,
+            fullname=get_fullname(guid),
+            type=account_type,
+            parent_guid=parent_guid,
+            commodity_guid=commodity_guid,
+            fraction=fraction
+        ) for guid, name, account_type, parent_guid, commodity_guid, fraction in rows})
+
+    def get_fullnames(self) -> dict[str, str]:
+        """Returns the full name of every account, by guid"""
+        return {guid: account.fullname for guid, account in self.accounts.items()}
+
+    def get_hierarchy(self) -> AccountHierarchy:
+        """Returns the index of the descendants of the accounts, built on the first call"""
+        if self._hierarchy is None:
+            self._hierarchy = AccountHierarchy(
+                {guid: account.parent_guid for guid, account in self.accounts.items()})
+        return self._hierarchy
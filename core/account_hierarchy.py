@@ -0,0 +1,55 @@
+"""
+Account Hierarchy
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class AccountHierarchy:
+    """
+    Index of the descendants of every account of a book by guid (a closure table), built once,
+    so subtree membership is a set lookup on guids instead of a prefix test on full names
+    """
+
+    def __init__(self, parents: dict[str, str]) -> None:
+        """Builds the index from the parent guid of every account guid (None for the root)"""
+        ancestors: dict[str, list[str]] = {}
+
+        def get_ancestors(guid: str) -> list[str]:
+            if guid not in ancestors:
+                parent_guid = parents.get(guid)
+                inherited = get_ancestors(parent_guid) if parent_guid in parents else []
+                ancestors[guid] = inherited + [guid]
+            return ancestors[guid]
+
+        descendants: dict[str, set[str]] = {guid: set() for guid in parents}
+        for guid in parents:
+            for ancestor in get_ancestors(guid):
+                descendants[ancestor].add(guid)
+        self.descendants: dict[str, frozenset[str]] = {
+            guid: frozenset(subtree) for guid, subtree in descendants.items()}
+
+    def get_subtree(self, guid: str) -> frozenset[str]:
+        """Returns the guids of the account and all its descendants"""
+        return self.descendants.get(guid, frozenset())
+
+    @classmethod
+    def is_descendant_name(cls, fullname: str, ancestor_fullname: str) -> bool:
+        """
+        Returns if the full account name is the ancestor one or one of its descendants
+        (for data without guids: siblings sharing a prefix, like "Assets:Checkings 2", are not descendants)
+        """
+        return isinstance(fullname, str) and (
+            fullname == ancestor_fullname or fullname.startswith(ancestor_fullname + ":"))
+
+    @classmethod
+    def is_in_subtree(cls, guids, subtree: frozenset[str]) -> np.ndarray:
+        """Returns, for each guid of an array (or column, categorical included), if it is in the subtree"""
+        return pd.Series(guids, dtype=None if isinstance(guids, pd.Series) else object).isin(subtree).to_numpy()
+
+    @classmethod
+    def are_descendant_names(cls, fullnames, ancestor_fullname: str) -> np.ndarray:
+        """Returns, for each full account name of an array (or column), if it is the ancestor or a descendant"""
+        names = pd.Series(fullnames, dtype=None if isinstance(fullnames, pd.Series) else object).astype(object)
+        return ((names == ancestor_fullname) | names.str.startswith(ancestor_fullname + ":", na=False)).to_numpy()
@@ -0,0 +1,109 @@
+"""
+Balance Checkpoint
+"""
+
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+import sqlite3
+
+
+@dataclass
+class BookState:
+    """
+    Snapshot of the book used to detect the changes made since the checkpoints were stored
+    """
+    book_guid: str
+    # "YYYY-MM" -> checksum of the splits posted in the month
+    months: dict[str, str] = field(default_factory=dict)
+    # Checksum of the parent and commodity of every account, behind the subtrees of the balances
+    accounts: str = None
+
+
+class BalanceCheckpointStore:
+    """
+    Sidecar SQLite store keeping month-end balances per account subtree,
+    usually as a file next to the book (e.g. "personal.gnucash.checkpoints")
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                account_guid TEXT NOT NULL,
+                checkpoint_date TEXT NOT NULL,
+                balance TEXT NOT NULL,
+                PRIMARY KEY (account_guid, checkpoint_date)
+            );
+            CREATE TABLE IF NOT EXISTS book (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                book_guid TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS month_checksums (
+                month TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS accounts_checksum (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                checksum TEXT NOT NULL
+            );
+        """)
+
+    @classmethod
+    def for_book(cls, book_path: str):
+        """Opens the store living next to the given book file"""
+        return cls("{}.checkpoints".format(book_path))
+
+    def get_state(self) -> BookState:
+        """Returns the state of the book when the checkpoints were last validated"""
+        row = self.connection.execute("SELECT book_guid FROM book WHERE id = 0").fetchone()
+        if row is None:
+            return None
+        accounts = self.connection.execute("SELECT checksum FROM accounts_checksum WHERE id = 0").fetchone()
+        return BookState(
+            book_guid=row[0],
+            months=dict(self.connection.execute("SELECT month, checksum FROM month_checksums")),
+            accounts=accounts[0] if accounts is not None else None)
+
+    def set_state(self, state: BookState) -> None:
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO book VALUES (0, ?)", (state.book_guid,))
+            self.connection.execute("DELETE FROM month_checksums")
+            self.connection.executemany("INSERT INTO month_checksums VALUES (?, ?)", state.months.items())
+            self.connection.execute("DELETE FROM accounts_checksum")
+            if state.accounts is not None:
+                self.connection.execute("INSERT INTO accounts_checksum VALUES (0, ?)", (state.accounts,))
+
+    def get_checkpoint(self, account_guid: str, at_date: date) -> tuple[date, Decimal]:
+        """Returns the nearest checkpoint (date, balance) on or before the given date"""
+        row = self.connection.execute(
+            "SELECT checkpoint_date, balance FROM checkpoints "
+            "WHERE account_guid = ? AND checkpoint_date <= ? "
+            "ORDER BY checkpoint_date DESC LIMIT 1",
+            (account_guid, at_date.isoformat())
+        ).fetchone()
+        if row is None:
+            return None
+        return (date.fromisoformat(row[0]), Decimal(row[1]))
+
+    def set_checkpoint(self, account_guid: str, checkpoint_date: date, balance: Decimal) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                (account_guid, checkpoint_date.isoformat(), str(balance)))
+
+    def invalidate(self, from_date: date) -> None:
+        """Removes the checkpoints on or after the given date"""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM checkpoints WHERE checkpoint_date >= ?",
+                (from_date.isoformat(),))
+
+    def clear(self) -> None:
+        """Removes all the checkpoints"""
+        with self.connection:
+            self.connection.execute("DELETE FROM checkpoints")
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,169 @@
+"""
+Balance Engine
+Vectorized computation of the running balances of TransactionDataItems
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from decimal import Decimal
+
+import numpy as np
+
+from core.account_hierarchy import AccountHierarchy
+from core.money import Money
+from core.typings import TransactionType
+
+"""
+Running balances (checkings, scheduled checkings, liability, scheduled liability)
+"""
+BalanceState = tuple
+
+
+@dataclass
+class ItemBalances:
+    """
+    Balances of TransactionDataItems, one entry per item in each array.
+    The recorded and scheduled diffs are the ones of TransactionDataItem.get_balance, and
+    the running balances are the ones after the item.
+    """
+    has_checkings: np.ndarray
+    checkings_recorded: np.ndarray
+    checkings_scheduled: np.ndarray
+    checkings: np.ndarray
+    scheduled_checkings: np.ndarray
+    has_liability: np.ndarray
+    liability_recorded: np.ndarray
+    liability_scheduled: np.ndarray
+    liability: np.ndarray
+    scheduled_liability: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.has_checkings)
+
+    def _get_arrays(self) -> list[np.ndarray]:
+        return [getattr(self, field.name) for field in dataclasses.fields(self)]
+
+    def get_state(self, index: int) -> BalanceState:
+        """Returns the running balances after the item at the given index"""
+        return (
+            self.checkings[index],
+            self.scheduled_checkings[index],
+            self.liability[index],
+            self.scheduled_liability[index])
+
+    def head(self, count: int) -> "ItemBalances":
+        """Returns the balances of the first count items"""
+        return ItemBalances(*[values[:count] for values in self._get_arrays()])
+
+    def concat(self, other: "ItemBalances") -> "ItemBalances":
+        """Returns the balances of these items followed by the other ones"""
+        return ItemBalances(*[
+            np.concatenate((values, other_values))
+            for values, other_values in zip(self._get_arrays(), other._get_arrays())])
+
+
+class BalanceEngine:
+    """
+    Computes the balances of TransactionDataItems over a columnar table of their transactions:
+    the diffs of each item are grouped sums, and the running balances are cumulative sums.
+    The values are Decimal objects, or int minor units summed as int64 arrays.
+    """
+
+    CHECKINGS_SIGNS = {
+        TransactionType.INCOME: 1,
+        TransactionType.EXPENSE: -1,
+        TransactionType.QUITTANCE: -1
+    }
+    LIABILITY_SIGNS = {
+        TransactionType.LIABILITY: 1,
+        TransactionType.QUITTANCE: -1
+    }
+
+    @classmethod
+    def _get_group_sums(cls, values: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+        """Returns the sums of the values in each [bounds[i], bounds[i + 1][ group (0 for empty groups)"""
+        zero = np.zeros(1, dtype=np.int64) if values.dtype == np.int64 else np.array([Decimal(0)], dtype=object)
+        cumulated = np.concatenate((zero, np.cumsum(values)))
+        return cumulated[bounds[1:]] - cumulated[bounds[:-1]]
+
+    @classmethod
+    def _get_running(
+            cls,
+            has: np.ndarray,
+            recorded: np.ndarray,
+            scheduled: np.ndarray,
+            opening,
+            scheduled_opening) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the running recorded and scheduled balances. As in the item by item computation,
+        the scheduled balance also gets the scheduled diff when it differs from the recorded one.
+        """
+        scheduled_diff = recorded + np.where(has & (scheduled != recorded).astype(bool), scheduled, 0)
+        return (
+            opening + np.cumsum(recorded),
+            scheduled_opening + np.cumsum(scheduled_diff))
+
+    @classmethod
+    def get_item_balances(
+            cls,
+            items: list,
+            state: BalanceState = (0, 0, 0, 0),
+            checkings_parent: str = None,
+            minor_units: bool = False,
+            checkings_accounts: frozenset[str] = None) -> ItemBalances:
+        """
+        Returns the balances of the TransactionDataItems, starting from the given running balances.
+        The transfers count for the checkings when they come from or go to the checkings accounts
+        (by guid), or the checkings parent and its descendants (by full name) if not given.
+        With minor_units, the values and balances are int64, and OverflowError is raised
+        if the sums could exceed its bounds.
+        """
+        transactions = [tr for item in items for tr in item.transactions]
+        counts = np.fromiter((len(item.transactions) for item in items), dtype=np.int64, count=len(items))
+        bounds = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(counts)))
+
+        values = np.fromiter(
+            (tr.value for tr in transactions), dtype=np.int64 if minor_units else object, count=len(transactions))
+        if minor_units:
+            Money.check_sums(values, state)
+        is_recorded = ~np.fromiter((tr.is_scheduled for tr in transactions), dtype=bool, count=len(transactions))
+        types = np.fromiter((tr.transaction_type for tr in transactions), dtype=object, count=len(transactions))
+
+        def get_signs(signs_by_type: dict) -> np.ndarray:
+            signs = np.zeros(len(transactions), dtype=np.int64)
+            for transaction_type, sign in signs_by_type.items():
+                signs[types == transaction_type] = sign
+            return signs
+
+        checkings_signs = get_signs(cls.CHECKINGS_SIGNS)
+        if checkings_accounts is not None or checkings_parent is not None:
+            is_transfer = types == TransactionType.TRANSFER
+            transfers = [transactions[index] for index in np.flatnonzero(is_transfer).tolist()]
+
+            def get_column(name: str) -> np.ndarray:
+                return np.fromiter((getattr(tr, name) for tr in transfers), dtype=object, count=len(transfers))
+
+            if checkings_accounts is not None:
+                relevant_from = AccountHierarchy.is_in_subtree(get_column("from_account_guid"), checkings_accounts)
+                relevant_to = AccountHierarchy.is_in_subtree(get_column("to_account_guid"), checkings_accounts)
+            else:
+                relevant_from = AccountHierarchy.are_descendant_names(get_column("from_account"), checkings_parent)
+                relevant_to = AccountHierarchy.are_descendant_names(get_column("to_account"), checkings_parent)
+            checkings_signs[is_transfer] = (
+                relevant_to.astype(np.int64) - relevant_from.astype(np.int64))
+        liability_signs = get_signs(cls.LIABILITY_SIGNS)
+
+        def get_balances(signs: np.ndarray, opening, scheduled_opening):
+            # Only the transactions changing the balance are summed, grouped by item
+            rows = np.flatnonzero(signs)
+            row_bounds = np.searchsorted(rows, bounds)
+            has = row_bounds[1:] > row_bounds[:-1]
+            signed_values = values[rows] * (signs[rows] if minor_units else signs[rows].astype(object))
+            recorded = cls._get_group_sums(np.where(is_recorded[rows], signed_values, 0), row_bounds)
+            scheduled = cls._get_group_sums(signed_values, row_bounds)
+            running, scheduled_running = cls._get_running(has, recorded, scheduled, opening, scheduled_opening)
+            return has, recorded, scheduled, running, scheduled_running
+
+        checkings_balances = get_balances(checkings_signs, state[0], state[1])
+        liability_balances = get_balances(liability_signs, state[2], state[3])
+        return ItemBalances(*checkings_balances, *liability_balances)
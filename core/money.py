@@ -0,0 +1,57 @@
+"""
+Money
+Exact amounts as int64 minor units of a commodity (e.g. cents for a fraction of 100)
+"""
+
+from decimal import Decimal
+
+import numpy as np
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+class Money:
+
+    @classmethod
+    def check(cls, minor: int) -> int:
+        """Returns the amount in minor units, raising OverflowError if it doesn't fit in an int64"""
+        if minor < INT64_MIN or minor > INT64_MAX:
+            raise OverflowError("{} minor units don't fit in an int64".format(minor))
+        return minor
+
+    @classmethod
+    def check_sums(cls, values: np.ndarray, openings: tuple = ()) -> None:
+        """
+        Raises OverflowError if a running sum of the int64 values, starting from any of the openings,
+        could exceed the int64 bounds (checked against the sum of the absolute values)
+        """
+        bound = max((abs(int(opening)) for opening in openings), default=0)
+        if len(values) > 0:
+            bound = bound + int(np.abs(values).max()) * len(values)
+        if bound > INT64_MAX:
+            raise OverflowError("Sums of {} minor units may not fit in an int64".format(len(values)))
+
+    @classmethod
+    def to_minor(cls, value: Decimal, fraction: int) -> int:
+        """
+        Converts an amount to minor units of the given fraction,
+        raising ValueError if it isn't a whole number of them
+        """
+        minor = Decimal(value) * fraction
+        if minor != minor.to_integral_value():
+            raise ValueError("{} is not a multiple of 1/{}".format(value, fraction))
+        return cls.check(int(minor))
+
+    @classmethod
+    def from_ratio(cls, num: int, denom: int, fraction: int) -> int:
+        """Converts a num/denom amount (as stored by GnuCash) to minor units of the given fraction"""
+        minor, remainder = divmod(num * fraction, denom)
+        if remainder != 0:
+            raise ValueError("{}/{} is not a multiple of 1/{}".format(num, denom, fraction))
+        return cls.check(minor)
+
+    @classmethod
+    def to_decimal(cls, minor: int, fraction: int) -> Decimal:
+        """Converts an amount in minor units of the given fraction back to Decimal"""
+        return Decimal(int(minor)) / fraction
@@ -0,0 +1,33 @@
+"""
+Query Counter
+"""
+
+from piecash.core.book import Book
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements sent to the database of a book while active
+
+    Usage:
+        with QueryCounter(book) as counter:
+            journal.get_transaction_data(start_date, end_date)
+        print(counter.count)
+    """
+
+    def __init__(self, book: Book) -> None:
+        self.engine = book.session.bind
+        self.count = 0
+        self.statements: list[str] = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.count = self.count + 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
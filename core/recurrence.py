@@ -0,0 +1,263 @@
+"""
+Recurrence
+Closed-form expansion of the GnuCash recurrence patterns
+"""
+
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+from piecash._common import Recurrence
+
+
+class RecurrenceExpander:
+    """
+    Computes the occurences of a recurrence inside a date window.
+
+    Each occurence is computed directly from its index (relative to the
+    recurrence_period_start), so the expansion jumps straight to the first
+    occurence of the window and only walks the occurences inside it.
+    """
+
+    DAY_PERIODS = {"day": 1, "week": 7}
+    MONTH_PERIODS = {"month": 1, "end of month": 1, "nth weekday": 1, "last weekday": 1, "year": 12}
+
+    # Maximum number of days an occurence can be moved by the weekend adjust
+    WEEKEND_SLACK = timedelta(days=2)
+
+    @classmethod
+    def get_period_type(cls, recurrence: Recurrence) -> str:
+        """Returns the normalized period type ("end_of_month" and "end of month" are the same)"""
+        return recurrence.recurrence_period_type.replace("_", " ")
+
+    @classmethod
+    def get_month_day(cls, recurrence: Recurrence, year: int, month: int) -> int:
+        """Returns the day of the occurence for a given month, clamped to the month length"""
+        start = recurrence.recurrence_period_start
+        period_type = cls.get_period_type(recurrence)
+        days_in_month = calendar.monthrange(year, month)[1]
+
+        if period_type == "nth weekday" or period_type == "last weekday":
+            first_weekday = calendar.weekday(year, month, 1)
+            first_day = 1 + (start.weekday() - first_weekday) % 7
+            if period_type == "last weekday":
+                return first_day + ((days_in_month - first_day) // 7) * 7
+            nth = (start.day - 1) // 7
+            day = first_day + nth * 7
+            return day if day <= days_in_month else day - 7
+
+        start_days_in_month = calendar.monthrange(start.year, start.month)[1]
+        if period_type == "end of month" or start.day == start_days_in_month:
+            return days_in_month
+        return min(start.day, days_in_month)
+
+    @classmethod
+    def get_occurence(cls, recurrence: Recurrence, index: int) -> date:
+        """Returns the occurence (before weekend adjust) for the given index"""
+        start = recurrence.recurrence_period_start
+        period_type = cls.get_period_type(recurrence)
+
+        if period_type == "once":
+            return start if index == 0 else None
+        if period_type in cls.DAY_PERIODS:
+            step = cls.DAY_PERIODS[period_type] * recurrence.recurrence_mult
+            return start + timedelta(days=index * step)
+        if period_type in cls.MONTH_PERIODS:
+            step = cls.MONTH_PERIODS[period_type] * recurrence.recurrence_mult
+            month_index = start.month - 1 + index * step
+            year = start.year + month_index // 12
+            month = month_index % 12 + 1
+            return date(year, month, cls.get_month_day(recurrence, year, month))
+
+        raise AttributeError("Unknown '{}' as period of recurrence".format(recurrence.recurrence_period_type))
+
+    @classmethod
+    def get_first_index(cls, recurrence: Recurrence, from_date: date) -> int:
+        """Returns the index of the first occurence (before weekend adjust) on or after from_date"""
+        start = recurrence.recurrence_period_start
+        period_type = cls.get_period_type(recurrence)
+
+        if from_date <= start or period_type == "once":
+            return 0
+        if period_type in cls.DAY_PERIODS:
+            step = cls.DAY_PERIODS[period_type] * recurrence.recurrence_mult
+            return -(-(from_date - start).days // step)
+        if period_type in cls.MONTH_PERIODS:
+            step = cls.MONTH_PERIODS[period_type] * recurrence.recurrence_mult
+            months = (from_date.year - start.year) * 12 + from_date.month - start.month
+            index = months // step
+            while cls.get_occurence(recurrence, index) < from_date:
+                index = index + 1
+            return index
+
+        raise AttributeError("Unknown '{}' as period of recurrence".format(recurrence.recurrence_period_type))
+
+    @classmethod
+    def get_next_occurence(cls, recurrence: Recurrence, previous_date: date) -> date:
+        """Returns the occurence (before weekend adjust) following previous_date"""
+        return cls.get_occurence(
+            recurrence,
+            cls.get_first_index(recurrence, previous_date + timedelta(days=1)))
+
+    @classmethod
+    def adjust_weekend(cls, recurrence: Recurrence, occurence: date) -> date:
+        """Moves an occurence falling on a weekend according to recurrence_weekend_adjust"""
+        weekday = occurence.weekday()
+        if weekday < 5:
+            return occurence
+        if recurrence.recurrence_weekend_adjust == "back":
+            return occurence - timedelta(days=weekday - 4)
+        if recurrence.recurrence_weekend_adjust == "forward":
+            return occurence + timedelta(days=7 - weekday)
+        return occurence
+
+    @classmethod
+    def get_occurences(cls, recurrence: Recurrence, start_date: date, end_date: date) -> list[date]:
+        """Get the list of dates, inside [start_date, end_date], based on the recurrence patterns"""
+        occurences = list()
+
+        index = cls.get_first_index(recurrence, start_date - cls.WEEKEND_SLACK)
+        occurence = cls.get_occurence(recurrence, index)
+        while occurence is not None and occurence <= end_date + cls.WEEKEND_SLACK:
+            adjusted = cls.adjust_weekend(recurrence, occurence)
+            if adjusted >= start_date and adjusted <= end_date:
+                occurences.append(adjusted)
+            index = index + 1
+            occurence = cls.get_occurence(recurrence, index)
+
+        return occurences
+
+
+class RecurrenceBatchExpander:
+    """
+    Computes the occurences of many recurrences at once, each inside its own date window,
+    with datetime64 arithmetic on arrays of recurrences instead of a loop per occurence.
+
+    The day, week, month, end of month and year periods are expanded together, as the same
+    closed forms as RecurrenceExpander (including the month-end clamping), and the other periods
+    fall back to RecurrenceExpander.
+    """
+
+    MONTH_PERIODS = {"month": 1, "end of month": 1, "year": 12}
+
+    WEEKEND_SLACK = np.timedelta64(RecurrenceExpander.WEEKEND_SLACK.days, "D")
+
+    @classmethod
+    def get_occurences(
+            cls,
+            recurrences: list[Recurrence],
+            start_dates: list[date],
+            end_dates: list[date]) -> list[list[date]]:
+        """Get the list of dates of each recurrence, inside its [start_date, end_date], in the same order"""
+        occurences: list[list[date]] = [None] * len(recurrences)
+        day_positions, month_positions = [], []
+        for position, recurrence in enumerate(recurrences):
+            period_type = RecurrenceExpander.get_period_type(recurrence)
+            if period_type in RecurrenceExpander.DAY_PERIODS:
+                day_positions.append(position)
+            elif period_type in cls.MONTH_PERIODS:
+                month_positions.append(position)
+            else:
+                occurences[position] = RecurrenceExpander.get_occurences(
+                    recurrence, start_dates[position], end_dates[position])
+
+        for positions, expand in [(day_positions, cls._expand_days), (month_positions, cls._expand_months)]:
+            if len(positions) == 0:
+                continue
+            batch = [recurrences[position] for position in positions]
+            starts = np.array([start_dates[position] for position in positions], dtype="datetime64[D]")
+            ends = np.array([end_dates[position] for position in positions], dtype="datetime64[D]")
+            owners, dates = expand(batch, starts, ends)
+
+            owners, dates = cls._adjust_weekend(batch, starts, ends, owners, dates)
+            splits = np.cumsum(np.bincount(owners, minlength=len(batch)))[:-1]
+            for position, batch_dates in zip(positions, np.split(dates.astype(object), splits)):
+                occurences[position] = batch_dates.tolist()
+
+        return occurences
+
+    @classmethod
+    def _get_indexes(cls, first: np.ndarray, last: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the owner and the index of every index of [first, last] of each recurrence (none if empty)"""
+        counts = np.maximum(last - first + 1, 0)
+        owners = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, first[owners] + offsets
+
+    @classmethod
+    def _expand_days(
+            cls,
+            recurrences: list[Recurrence],
+            starts: np.ndarray,
+            ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the owner and the date (before weekend adjust) of the occurences of day and week periods"""
+        origins = np.array([recurrence.recurrence_period_start for recurrence in recurrences], dtype="datetime64[D]")
+        steps = np.array([
+            RecurrenceExpander.DAY_PERIODS[RecurrenceExpander.get_period_type(recurrence)] * recurrence.recurrence_mult
+            for recurrence in recurrences], dtype=np.int64)
+
+        from_days = (starts - cls.WEEKEND_SLACK - origins).astype(np.int64)
+        to_days = (ends + cls.WEEKEND_SLACK - origins).astype(np.int64)
+        first = np.maximum(-(-from_days // steps), 0)
+        last = np.floor_divide(to_days, steps)
+
+        owners, indexes = cls._get_indexes(first, last)
+        return owners, origins[owners] + (indexes * steps[owners]).astype("timedelta64[D]")
+
+    @classmethod
+    def _expand_months(
+            cls,
+            recurrences: list[Recurrence],
+            starts: np.ndarray,
+            ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the owner and the date (before weekend adjust) of the occurences of month periods,
+        with the day of the start clamped to the month length (or its last day, for the end of month)
+        """
+        origins = np.array([recurrence.recurrence_period_start for recurrence in recurrences], dtype="datetime64[D]")
+        steps = np.array([
+            cls.MONTH_PERIODS[RecurrenceExpander.get_period_type(recurrence)] * recurrence.recurrence_mult
+            for recurrence in recurrences], dtype=np.int64)
+
+        origin_months = origins.astype("datetime64[M]")
+        origin_days = (origins - origin_months).astype(np.int64) + 1
+        origin_lengths = ((origin_months + 1).astype("datetime64[D]") - origin_months).astype(np.int64)
+        to_end = np.array([
+            RecurrenceExpander.get_period_type(recurrence) == "end of month" for recurrence in recurrences])
+        to_end = to_end | (origin_days == origin_lengths)
+
+        # Every month with a possible occurence: the first one may fall before the window, and is filtered out
+        from_months = ((starts - cls.WEEKEND_SLACK).astype("datetime64[M]") - origin_months).astype(np.int64)
+        to_months = ((ends + cls.WEEKEND_SLACK).astype("datetime64[M]") - origin_months).astype(np.int64)
+        first = np.maximum(from_months // steps, 0)
+        last = np.floor_divide(to_months, steps)
+
+        owners, indexes = cls._get_indexes(first, last)
+        months = origin_months[owners] + (indexes * steps[owners]).astype("timedelta64[M]")
+        lengths = ((months + 1).astype("datetime64[D]") - months).astype(np.int64)
+        days = np.where(to_end[owners], lengths, np.minimum(origin_days[owners], lengths))
+        return owners, months.astype("datetime64[D]") + (days - 1).astype("timedelta64[D]")
+
+    @classmethod
+    def _adjust_weekend(
+            cls,
+            recurrences: list[Recurrence],
+            starts: np.ndarray,
+            ends: np.ndarray,
+            owners: np.ndarray,
+            dates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Moves the occurences falling on a weekend according to recurrence_weekend_adjust,
+        and keeps the ones inside the window of their recurrence
+        """
+        adjusts = np.array([recurrence.recurrence_weekend_adjust for recurrence in recurrences], dtype=object)
+        # 1970-01-01 was a Thursday (Monday is 0)
+        weekdays = (dates.astype(np.int64) + 3) % 7
+        weekend = weekdays >= 5
+        back = weekend & (adjusts[owners] == "back")
+        forward = weekend & (adjusts[owners] == "forward")
+        shifts = np.where(back, 4 - weekdays, np.where(forward, 7 - weekdays, 0))
+        dates = dates + shifts.astype("timedelta64[D]")
+
+        inside = (dates >= starts[owners]) & (dates <= ends[owners])
+        return owners[inside], dates[inside]
@@ -0,0 +1,87 @@
+"""
+Scheduled Formula
+Safe evaluation of the credit/debit formulas of the GnuCash scheduled transaction templates
+"""
+
+import ast
+from dataclasses import dataclass, field
+from decimal import Decimal, DivisionByZero, InvalidOperation
+import operator
+from typing import Callable, ClassVar
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg
+}
+
+
+def _to_decimal(value) -> Decimal:
+    """Converts the value of a variable, reading a float from its shortest repr"""
+    return Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+
+
+@dataclass(frozen=True)
+class ScheduledFormula:
+    """
+    Arithmetic formula (numbers, variables, + - * / and parentheses) compiled once into nested Decimal
+    operations: nothing else of the Python syntax is accepted, and nothing is ever passed to eval
+    """
+    text: str
+    variables: frozenset[str]
+    _evaluate: Callable[[dict], Decimal] = field(compare=False, repr=False)
+
+    # text -> compiled formula, shared by every template
+    _compiled: ClassVar[dict[str, "ScheduledFormula"]] = {}
+
+    @classmethod
+    def compile(cls, text: str) -> "ScheduledFormula":
+        """Compiles a formula, once per text (raises ValueError if it isn't a supported arithmetic formula)"""
+        if text not in cls._compiled:
+            try:
+                tree = ast.parse(text.strip(), mode="eval")
+            except SyntaxError as e:
+                raise ValueError("Invalid formula '{}': {}".format(text, e.msg))
+            variables = set()
+            evaluate = cls._compile_node(tree.body, text.strip(), variables)
+            cls._compiled[text] = cls(text=text, variables=frozenset(variables), _evaluate=evaluate)
+        return cls._compiled[text]
+
+    @classmethod
+    def _compile_node(cls, node: ast.AST, text: str, variables: set) -> Callable[[dict], Decimal]:
+        """Compiles a node of the formula into a function of the variables, collecting their names"""
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            # Read from the source, as a float literal isn't exact
+            value = Decimal(ast.get_source_segment(text, node))
+            return lambda bindings: value
+        elif isinstance(node, ast.Name):
+            name = node.id
+            variables.add(name)
+            return lambda bindings: bindings[name]
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            unary = _UNARY_OPERATORS[type(node.op)]
+            operand = cls._compile_node(node.operand, text, variables)
+            return lambda bindings: unary(operand(bindings))
+        elif isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            binary = _BINARY_OPERATORS[type(node.op)]
+            left = cls._compile_node(node.left, text, variables)
+            right = cls._compile_node(node.right, text, variables)
+            return lambda bindings: binary(left(bindings), right(bindings))
+        raise ValueError("Unsupported '{}' in formula '{}'".format(ast.get_source_segment(text, node), text))
+
+    def evaluate(self, variables: dict[str, Decimal] = None) -> Decimal:
+        """Evaluates the formula with the values of its variables (raises ValueError if any is missing)"""
+        bindings = variables if variables is not None else {}
+        missing = self.variables.difference(bindings)
+        if len(missing) > 0:
+            raise ValueError("Missing {} to evaluate formula '{}'".format(", ".join(sorted(missing)), self.text))
+        try:
+            return self._evaluate({name: _to_decimal(bindings[name]) for name in self.variables})
+        except (DivisionByZero, InvalidOperation) as e:
+            raise ValueError("Can't evaluate formula '{}': {}".format(self.text, e))
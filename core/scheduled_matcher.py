@@ -0,0 +1,42 @@
+"""
+Scheduled Matcher
+Pairs the recorded instances of scheduled transactions with their occurences within a tolerance window
+"""
+
+from bisect import bisect_left
+from datetime import date, timedelta
+
+from core.typings import ScheduledTransactionOccurences
+
+
+class ScheduledMatcher:
+
+    @classmethod
+    def match(
+            cls,
+            occurences: list[ScheduledTransactionOccurences],
+            recorded: list[tuple[str, date]],
+            tolerance_days: int) -> list[ScheduledTransactionOccurences]:
+        """
+        Pairs each recorded (scheduled guid, post_date) instance with the earliest unpaired occurence of its
+        scheduled transaction at most tolerance_days away, and returns the occurences (sorted) with every
+        paired one moved to the post date of its instance, so it is cancelled by the recorded one of that date.
+
+        The instances are processed by date: as the window only moves forward, the paired occurences
+        of a scheduled transaction are the ones before a pointer in its sorted dates, found with bisect.
+        """
+        tolerance = timedelta(days=tolerance_days)
+        dates_by_guid: dict[str, list[date]] = {tr.guid: sorted(dates) for tr, dates in occurences}
+        matched_by_guid: dict[str, list[date]] = {guid: list(dates) for guid, dates in dates_by_guid.items()}
+        pointers: dict[str, int] = dict.fromkeys(dates_by_guid, 0)
+
+        for guid, post_date in sorted(recorded, key=lambda instance: instance[1]):
+            if guid not in dates_by_guid:
+                continue
+            dates = dates_by_guid[guid]
+            position = max(pointers[guid], bisect_left(dates, post_date - tolerance))
+            if position < len(dates) and dates[position] <= post_date + tolerance:
+                matched_by_guid[guid][position] = post_date
+                pointers[guid] = position + 1
+
+        return [(tr, sorted(matched_by_guid[tr.guid])) for tr, _dates in occurences]
@@ -0,0 +1,227 @@
+"""
+Scheduled Template
+"""
+
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from piecash.core.transaction import ScheduledTransaction
+from sqlalchemy import inspect
+
+from core.account_directory import AccountDirectory
+from core.scheduled_formula import ScheduledFormula
+from core.transaction_classifier import TransactionClassifier
+from core.typings import TransactionType
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    Template of a ScheduledTransaction parsed once: the pairs of template splits by amount,
+    with their accounts and type, ready to be simplified at each occurence
+    """
+    guid: str
+    name: str
+    # (value, from_account, from_account_guid, to_account, to_account_guid, transaction_type) of each pair
+    pairs: tuple[tuple[Decimal, str, str, str, str, TransactionType], ...]
+    # Compiled formula of each pair with variables (None if its value is constant)
+    formulas: tuple[ScheduledFormula, ...] = ()
+    # Fraction of the commodity of the split of each formula, its values are rounded to (None to keep them)
+    fractions: tuple[int, ...] = ()
+    # Errors of the formulas this evaluator can't compile (their numeric slots are used)
+    unsupported: tuple[str, ...] = ()
+
+    @classmethod
+    def compile(
+            cls,
+            tr: ScheduledTransaction,
+            classifier: TransactionClassifier = None,
+            directory: AccountDirectory = None) -> "CompiledTemplate":
+        """
+        Parses the template splits (and their sched-xaction slots) of a ScheduledTransaction,
+        resolving the accounts with the directory, if given.
+        The splits are paired by amount, or by formula when it has variables: its value is then
+        evaluated at each occurence (the numeric slot, last computed by GnuCash, is the default),
+        and rounded to the fraction of the commodity of its split, as GnuCash does.
+        """
+        def get_account(slot):
+            return slot.value if directory is None else directory[slot.guid_val]
+
+        def get_fraction(account) -> int:
+            if directory is not None:
+                return account.fraction
+            return account.commodity.fraction if account.commodity is not None else None
+
+        unsupported = []
+
+        def get_formula(slots, name: str) -> ScheduledFormula:
+            try:
+                return cls.get_formula(slots, name)
+            except ValueError as e:
+                unsupported.append(str(e))
+                return None
+
+        trx = {}
+        for split in tr.template_account.splits:
+            slots = split["sched-xaction"]
+            debit_value = slots["debit-numeric"].value
+            credit_value = slots["credit-numeric"].value
+            debit_formula = get_formula(slots, "debit-formula")
+            credit_formula = get_formula(slots, "credit-formula")
+            is_debit = debit_value > 0 or (credit_value <= 0 and debit_formula is not None)
+            is_credit = not is_debit and (credit_value > 0 or credit_formula is not None)
+            if not is_debit and not is_credit:
+                continue
+
+            value = abs(debit_value if debit_value > 0 else credit_value)
+            formula = debit_formula if is_debit else credit_formula if is_credit else None
+            key = value if formula is None else formula.text
+            account = get_account(slots["account"])
+            if key not in trx:
+                trx[key] = {"value": value, "formula": formula, "fraction": None}
+            if formula is not None and trx[key]["fraction"] is None:
+                trx[key]["fraction"] = get_fraction(account)
+            if is_debit:
+                trx[key]["to_account"] = account
+            else:
+                trx[key]["from_account"] = account
+
+        classifier = classifier if classifier is not None else TransactionClassifier()
+        pairs = []
+        formulas = []
+        fractions = []
+        for key in trx.keys():
+            value = trx[key]["value"]
+            to_account = trx[key].get("to_account")
+            from_account = trx[key].get("from_account")
+
+            if to_account is None:
+                raise AttributeError("Can't find to_account for transaction {}".format(tr.guid))
+            if from_account is None:
+                raise AttributeError("Can't find from_account for transaction {}".format(tr.guid))
+
+            transaction_type = classifier.classify(
+                to_account=to_account, from_account=from_account, reference="{} ({})".format(tr.name, tr.guid))
+            pairs.append((
+                value,
+                from_account.fullname,
+                from_account.guid,
+                to_account.fullname,
+                to_account.guid,
+                transaction_type))
+            formulas.append(trx[key]["formula"])
+            fractions.append(trx[key]["fraction"])
+
+        has_formulas = any(formula is not None for formula in formulas)
+        return cls(
+            guid=tr.guid,
+            name=tr.name,
+            pairs=tuple(pairs),
+            formulas=tuple(formulas) if has_formulas else (),
+            fractions=tuple(fractions) if has_formulas else (),
+            unsupported=tuple(unsupported))
+
+    @classmethod
+    def get_formula(cls, slots, name: str) -> ScheduledFormula:
+        """
+        Returns the compiled formula of a template split slot, only if it has variables: a constant one
+        was already evaluated by GnuCash into the numeric slot
+        (raises ValueError if this evaluator can't compile it)
+        """
+        try:
+            text = slots[name].value
+        except KeyError:
+            return None
+        if not text or not text.strip():
+            return None
+        formula = ScheduledFormula.compile(text)
+        return formula if len(formula.variables) > 0 else None
+
+    def get_values(self, variables: dict[str, Decimal] = None) -> list[Decimal]:
+        """
+        Returns the value of each pair, evaluating the formulas whose variables are all given,
+        rounded half up to the fraction of their commodity (the others keep the value of their numeric slot)
+        """
+        values = [pair[0] for pair in self.pairs]
+        if variables is not None and len(self.formulas) > 0:
+            for position, (formula, fraction) in enumerate(zip(self.formulas, self.fractions)):
+                if formula is not None and formula.variables.issubset(variables):
+                    values[position] = self.round_value(abs(formula.evaluate(variables)), fraction)
+        return values
+
+    @classmethod
+    def round_value(cls, value: Decimal, fraction: int = None) -> Decimal:
+        """Rounds the value half up to a whole number of 1/fraction (unchanged if no fraction)"""
+        if fraction is None:
+            return value
+        return (value * fraction).to_integral_value(rounding=ROUND_HALF_UP) / fraction
+
+    def get_issues(self, variables: dict[str, Decimal] = None) -> list[str]:
+        """
+        Returns why values of the template fall back to their numeric slots (empty if none):
+        formulas that can't be compiled, and formulas with variables without value
+        (GnuCash leaves the numeric slot of those at 0)
+        """
+        bound = variables if variables is not None else {}
+        issues = list(self.unsupported)
+        for formula, pair in zip(self.formulas, self.pairs):
+            if formula is not None and not formula.variables.issubset(bound):
+                issues.append("No value for {} in formula '{}': {} is used".format(
+                    ", ".join(sorted(formula.variables.difference(bound))), formula.text, pair[0]))
+        return issues
+
+
+class ScheduledTemplateCache:
+    """
+    Compiled templates by ScheduledTransaction guid. A template is compiled again when the fields
+    of its ScheduledTransaction change, and all of them when the version of the templates changes.
+    The variables are the values bound to the variables of the formulas of the templates.
+    """
+
+    def __init__(self, variables: dict[str, Decimal] = None) -> None:
+        self.variables = variables
+        self.version = None
+        # guid -> (fingerprint of the ScheduledTransaction, compiled template)
+        self._templates: dict[str, tuple[tuple, CompiledTemplate]] = {}
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+    def set_version(self, version) -> None:
+        """Sets the version of the templates of the book, dropping every template compiled for another version"""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    @classmethod
+    def get_fingerprint(cls, tr: ScheduledTransaction) -> tuple:
+        """Returns the values of the columns of the ScheduledTransaction, read from the loaded object"""
+        return tuple(getattr(tr, column.key) for column in inspect(tr).mapper.column_attrs)
+
+    def get(
+            self,
+            tr: ScheduledTransaction,
+            classifier: TransactionClassifier = None,
+            directory: AccountDirectory = None) -> CompiledTemplate:
+        """Returns the compiled template of the ScheduledTransaction, compiling it if missing or outdated"""
+        fingerprint = self.get_fingerprint(tr)
+        cached = self._templates.get(tr.guid)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        template = CompiledTemplate.compile(tr, classifier=classifier, directory=directory)
+        self._templates[tr.guid] = (fingerprint, template)
+        return template
+
+    def get_report(self) -> str:
+        """
+        Returns a summary of the cached templates with values falling back to their numeric slots,
+        one line per issue (empty if none)
+        """
+        return "\n".join(
+            "{} ({}): {}".format(template.name, template.guid, issue)
+            for _, template in sorted(self._templates.values(), key=lambda cached: cached[1].name)
+            for issue in template.get_issues(self.variables))
@@ -1,18 +1,29 @@
 from decimal import Decimal
 from dataclasses import dataclass
+import sys
 from typing import Dict
 import pandas as pd
 from piecash.core.account import Account
 
-from piecash.core.transaction import ScheduledTransaction, Split, Transaction
+from piecash.core.transaction import ScheduledTransaction, Transaction
 
+from core.account_directory import AccountDirectory
+from core.money import Money
+from core.scheduled_template import CompiledTemplate, ScheduledTemplateCache
+from core.transaction_classifier import TransactionClassifier
 from core.typings import TransactionType
 
 
-@dataclass
+def _intern(value):
+    """Interns strings, so equal account names and guids share a single copy"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
 class SimpleTransaction:
     """
-    Describes a simplified transaction
+    Describes a simplified transaction.
+    Slotted, with interned account names and guids, as a period holds many of them.
     """
     value: Decimal
     description: str = ""
@@ -23,6 +34,12 @@ class SimpleTransaction:
     transaction_type: TransactionType = TransactionType.OPENING_BALANCE
     is_scheduled: bool = False
 
+    def __post_init__(self):
+        self.from_account = _intern(self.from_account)
+        self.from_account_guid = _intern(self.from_account_guid)
+        self.to_account = _intern(self.to_account)
+        self.to_account_guid = _intern(self.to_account_guid)
+
     def get_dataframe(self) -> pd.DataFrame:
         """
         Returns a dataframe with the current data
@@ -44,123 +61,152 @@ class SimpleTransaction:
 
     @classmethod
     def get_transaction_type(cls, to_account: Account, from_account: Account) -> TransactionType:
-        transaction_type: TransactionType
-        if to_account.type == "LIABILITY":
-            transaction_type = TransactionType.QUITTANCE
-        elif to_account.type == "EXPENSE":
-            if from_account.type == "LIABILITY":
-                transaction_type = TransactionType.LIABILITY
-            else:
-                transaction_type = TransactionType.EXPENSE
-        elif to_account.type == "BANK" or to_account.type == "ASSET":
-            if from_account.type == "BANK" or from_account.type == "ASSET":
-                transaction_type = TransactionType.TRANSFER
-            else:
-                transaction_type = TransactionType.INCOME
-        return transaction_type
+        """Returns the type of a transaction between the accounts (None if the pair of types isn't classified)"""
+        return TransactionClassifier.TYPES.get((to_account.type, from_account.type))
 
     @classmethod
-    def simplify_record(cls, tr: Transaction):
+    def get_scheduled_guid(cls, tr: Transaction) -> str:
         """
-        Simplify a Transaction object into SimpleTransaction
+        Returns the guid of the ScheduledTransaction behind a Transaction (None if not scheduled),
+        reading the slot directly instead of querying the ScheduledTransaction itself
         """
-        split: Split
+        for slot in tr.slots:
+            if slot.name == "from-sched-xaction":
+                return slot.guid_val
+        return None
 
+    @classmethod
+    def get_split_pairs(
+            cls,
+            splits: list[tuple[Decimal, Account]],
+            reference: str,
+            classifier: TransactionClassifier = None) -> list[tuple[Decimal, Account, Account, TransactionType]]:
+        """
+        Pairs the debit and credit splits (value, account) of a transaction by their absolute value,
+        returning a list of (value, from_account, to_account, transaction_type) classified by the classifier.
+        The accounts only need the fullname, guid and type attributes.
+        """
+        classifier = classifier if classifier is not None else TransactionClassifier()
         trx = {}
-        for split in tr.splits:
-            value = abs(split.value)
+        for split_value, account in splits:
+            value = abs(split_value)
             if value not in trx:
                 trx[value] = {}
-            if split.is_debit:
-                trx[value]["to_account"] = split.account
-            elif split.is_credit:
-                trx[value]["from_account"] = split.account
+            if split_value > 0:
+                trx[value]["to_account"] = account
+            elif split_value < 0:
+                trx[value]["from_account"] = account
 
-        simplified_transactions = []
+        pairs = []
         for value in trx.keys():
             if "to_account" not in trx[value]:
-                raise AttributeError("Missing to_account for {}-{} ({})".format(tr.post_date, tr.description, tr.guid))
+                raise AttributeError("Missing to_account for {}".format(reference))
             if "from_account" not in trx[value]:
-                raise AttributeError("Missing from_account for {}-{} ({})".format(tr.post_date, tr.description, tr.guid))
+                raise AttributeError("Missing from_account for {}".format(reference))
 
             to_account = trx[value]["to_account"]
             from_account = trx[value]["from_account"]
-            
-            try:
-                transaction_type = SimpleTransaction.get_transaction_type(to_account=to_account, from_account=from_account)
-            except:
-                transaction_type = TransactionType.EXPENSE
-                print("{} -> {} ({})".format(from_account.fullname, to_account.fullname, tr.description))
-
-            simplified_transactions.append(cls(
-                value=value,
-                description=tr.description,
-                from_account=from_account.fullname,
-                from_account_guid=from_account.guid,
-                to_account=to_account.fullname,
-                to_account_guid=to_account.guid,
-                transaction_type=transaction_type
-            ))
-
-        return simplified_transactions
+            transaction_type = classifier.classify(
+                to_account=to_account, from_account=from_account, reference=reference)
+
+            pairs.append((value, from_account, to_account, transaction_type))
+
+        return pairs
+
+    @classmethod
+    def simplify_record(
+            cls,
+            tr: Transaction,
+            fraction: int = None,
+            classifier: TransactionClassifier = None,
+            directory: AccountDirectory = None):
+        """
+        Simplify a Transaction object into SimpleTransaction
+        (with values in minor units of the fraction, if given, and accounts from the directory, if given)
+        """
+        pairs = cls.get_split_pairs(
+            splits=[(split.value, split.account if directory is None else directory[split.account_guid])
+                    for split in tr.splits],
+            reference="{}-{} ({})".format(tr.post_date, tr.description, tr.guid),
+            classifier=classifier)
+
+        return [cls(
+            value=value if fraction is None else Money.to_minor(value, fraction),
+            description=tr.description,
+            from_account=from_account.fullname,
+            from_account_guid=from_account.guid,
+            to_account=to_account.fullname,
+            to_account_guid=to_account.guid,
+            transaction_type=transaction_type
+        ) for value, from_account, to_account, transaction_type in pairs]
 
     @classmethod
-    def simplify_scheduled_record(cls, tr: ScheduledTransaction):
+    def simplify_scheduled_record(
+            cls,
+            tr: ScheduledTransaction,
+            fraction: int = None,
+            classifier: TransactionClassifier = None,
+            directory: AccountDirectory = None,
+            templates: ScheduledTemplateCache = None,
+            variables: dict[str, Decimal] = None):
         """
         Simplify a ScheduledTransaction object into SimpleTransaction
+        (with values in minor units of the fraction, if given, and accounts from the directory, if given),
+        using its compiled template from the templates cache, if given.
+        The formulas with variables are evaluated with the given ones (or else the ones of the cache).
         """
-        split: Split
-        trx = {}
-        if tr.guid == "05a8aacc72a447e4b385a52972ccce25":
-            # TODO: Handle formulas
-            splitFromAccount = tr.template_account.splits[0]
-            splitToAccount = tr.template_account.splits[2]
-            trx[Decimal(830.04)] = {
-                "from_account": splitFromAccount["sched-xaction"]["account"].value,
-                "to_account": splitToAccount["sched-xaction"]["account"].value
-            }
+        if templates is not None:
+            template = templates.get(tr, classifier=classifier, directory=directory)
+            variables = variables if variables is not None else templates.variables
         else:
-            for split in tr.template_account.splits:
-                slots = split["sched-xaction"]
-                debit_value = slots["debit-numeric"].value
-                credit_value = slots["credit-numeric"].value
-                value = abs(debit_value if debit_value > 0 else credit_value)
-                if value not in trx:
-                    trx[value] = {}
-                if debit_value > 0:
-                    trx[value]["to_account"] = slots["account"].value
-                elif credit_value > 0:
-                    trx[value]["from_account"] = slots["account"].value
-
-        simplified_transactions = []
-        for value in trx.keys():
-            to_account = trx[value]["to_account"]
-            from_account = trx[value]["from_account"]
-            transaction_type = SimpleTransaction.get_transaction_type(to_account=to_account, from_account=from_account)
+            template = CompiledTemplate.compile(tr, classifier=classifier, directory=directory)
+
+        values = template.get_values(variables)
+        return [cls(
+            value=value if fraction is None else Money.to_minor(value, fraction),
+            description=template.name,
+            from_account=from_account,
+            from_account_guid=from_account_guid,
+            to_account=to_account,
+            to_account_guid=to_account_guid,
+            transaction_type=transaction_type,
+            is_scheduled=True
+        ) for value, (_, from_account, from_account_guid, to_account, to_account_guid, transaction_type)
+            in zip(values, template.pairs)]
 
-            if to_account is None:
-                raise AttributeError("Can't find to_account for transaction {}".format(tr.guid))
-
-            simplified_transactions.append(cls(
-                value=value,
-                description=tr.name,
-                from_account=from_account.fullname,
-                from_account_guid=from_account.guid,
-                to_account=to_account.fullname,
-                to_account_guid=to_account.guid,
-                transaction_type=transaction_type,
-                is_scheduled=True
-            ))
+    @classmethod
+    def get_raw_transaction_type(cls, raw_type) -> TransactionType:
+        """Decodes a transaction type, serialized by its name (or as a dict by pandas to_json)"""
+        if isinstance(raw_type, str):
+            return TransactionType[raw_type]
+        if isinstance(raw_type, Dict):
+            return TransactionType[raw_type["name"]]
+        return raw_type
 
-        return simplified_transactions
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, fraction: int = None) -> list:
+        """
+        Loads the SimpleTransactions of every row of a dataframe, decoding each column at once
+        (the values are minor units of the fraction, if given)
+        """
+        if fraction is None:
+            values = [Decimal(value) for value in df["value"].tolist()]
+        else:
+            values = [Money.check(int(value)) for value in df["value"].tolist()]
+        rows = zip(
+            values,
+            df["description"].tolist(),
+            df["from_account"].tolist(),
+            df["from_account_guid"].tolist(),
+            df["to_account"].tolist(),
+            df["to_account_guid"].tolist(),
+            [cls.get_raw_transaction_type(raw_type) for raw_type in df["transaction_type"].tolist()],
+            df["is_scheduled"].tolist())
+        return [cls(*row) for row in rows]
 
     @classmethod
     def from_series(cls, series: pd.Series):
 
-        raw_type = series["transaction_type"]
-        if isinstance(raw_type, Dict):
-            raw_type = TransactionType[raw_type["name"]]
-
         return cls(
             value=Decimal(series["value"]),
             description=series["description"],
@@ -168,6 +214,6 @@ class SimpleTransaction:
             from_account_guid=series["from_account_guid"],
             to_account=series["to_account"],
             to_account_guid=series["to_account_guid"],
-            transaction_type=raw_type,
+            transaction_type=cls.get_raw_transaction_type(series["transaction_type"]),
             is_scheduled=series["is_scheduled"]
         )
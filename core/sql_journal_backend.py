@@ -0,0 +1,109 @@
+"""
+SQL Journal Backend
+Reads the recorded transactions straight from the GnuCash tables (SQLAlchemy Core),
+without building piecash Transaction, Split or Account objects
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from piecash.core.book import Book
+from piecash.core.transaction import Split, Transaction
+from piecash.kvp import Slot
+from sqlalchemy import select
+
+from core.account_directory import AccountDirectory
+from core.money import Money
+from core.simple_transaction import SimpleTransaction
+from core.transaction_classifier import TransactionClassifier
+from core.transaction_columns import TransactionColumns
+
+
+class SqlJournalBackend:
+
+    def __init__(self, book: Book) -> None:
+        self.book = book
+
+    def get_recorded_columns(
+            self,
+            start_date: date,
+            end_date: date,
+            post_dates: list[date] = None,
+            fraction: int = None,
+            classifier: TransactionClassifier = None,
+            directory: AccountDirectory = None) -> tuple[TransactionColumns, dict[date, list[str]]]:
+        """
+        Gets the simplified recorded transactions of the period (only the ones posted at post_dates, if given)
+        as columns (sorted by date), and the guids of the scheduled transactions behind them per date
+        (with an entry for every recorded date). The values are minor units of the fraction, if given,
+        and the types come from the classifier, which also collects the transactions skipped as their splits
+        can't be paired. The accounts are resolved with the directory (loaded from the book if not given).
+        """
+        window = (Transaction.post_date >= start_date, Transaction.post_date <= end_date)
+        if post_dates is not None:
+            window = window + (Transaction.post_date.in_(post_dates),)
+        window_guids = select(Transaction.guid).where(*window)
+
+        transactions = self.book.session.execute(select(
+            Transaction.guid,
+            Transaction.post_date,
+            Transaction.description
+        ).where(*window)).all()
+
+        splits: dict[str, list[tuple[Decimal, str]]] = {}
+        for tx_guid, value_num, value_denom, account_guid in self.book.session.execute(select(
+            Split.transaction_guid,
+            Split._value_num,
+            Split._value_denom,
+            Split.account_guid
+        ).where(Split.transaction_guid.in_(window_guids))):
+            if fraction is None:
+                value = Decimal(value_num) / value_denom
+            else:
+                value = Money.from_ratio(value_num, value_denom, fraction)
+            if tx_guid in splits:
+                splits[tx_guid].append((value, account_guid))
+            else:
+                splits[tx_guid] = [(value, account_guid)]
+
+        slots = Slot.__table__
+        scheduled_guids = dict(self.book.session.execute(select(
+            slots.c.obj_guid,
+            slots.c.guid_val
+        ).where(
+            slots.c.name == "from-sched-xaction",
+            slots.c.obj_guid.in_(window_guids)
+        )).all())
+
+        accounts = directory if directory is not None else AccountDirectory.from_book(self.book)
+        classifier = classifier if classifier is not None else TransactionClassifier()
+
+        columns = TransactionColumns()
+        recorded_scheduled_guids: dict[date, list[str]] = {}
+        for tx_guid, post_date, description in sorted(transactions, key=lambda tr: tr[1]):
+            if post_date not in recorded_scheduled_guids:
+                recorded_scheduled_guids[post_date] = []
+            if tx_guid in scheduled_guids:
+                recorded_scheduled_guids[post_date].append(scheduled_guids[tx_guid])
+
+            try:
+                pairs = SimpleTransaction.get_split_pairs(
+                    splits=[(value, accounts[account_guid]) for value, account_guid in splits.get(tx_guid, [])],
+                    reference="{}-{} ({})".format(post_date, description, tx_guid),
+                    classifier=classifier)
+            except AttributeError as e:
+                classifier.skip(str(e))
+                continue
+
+            for value, from_account, to_account, transaction_type in pairs:
+                columns.append(
+                    date=post_date,
+                    value=value,
+                    description=description,
+                    from_account=from_account.fullname,
+                    from_account_guid=from_account.guid,
+                    to_account=to_account.fullname,
+                    to_account_guid=to_account.guid,
+                    transaction_type=transaction_type)
+
+        return columns, recorded_scheduled_guids
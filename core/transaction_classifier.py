@@ -0,0 +1,76 @@
+"""
+Transaction Classifier
+"""
+
+from piecash.core.account import ACCOUNT_TYPES
+
+from core.typings import TransactionType
+
+
+def _get_type(to_type: str, from_type: str) -> TransactionType:
+    """Classifies a transfer between account types (None if not classified)"""
+    if to_type == "LIABILITY":
+        return TransactionType.QUITTANCE
+    elif to_type == "EXPENSE":
+        if from_type == "LIABILITY":
+            return TransactionType.LIABILITY
+        return TransactionType.EXPENSE
+    elif to_type == "BANK" or to_type == "ASSET":
+        if from_type == "BANK" or from_type == "ASSET":
+            return TransactionType.TRANSFER
+        return TransactionType.INCOME
+    return None
+
+
+class TransactionClassifier:
+    """
+    Classifies the (to_account, from_account) pairs of simplified transactions with a table precomputed
+    for every pair of GnuCash account types.
+    The unclassified pairs fall back to expenses, and their transactions are collected (once each)
+    for a summary report, with the transactions skipped as their splits couldn't be paired.
+    """
+
+    # (to_account type, from_account type) -> TransactionType (None if not classified)
+    TYPES: dict[tuple[str, str], TransactionType] = {
+        (to_type, from_type): _get_type(to_type, from_type)
+        for to_type in sorted(ACCOUNT_TYPES) for from_type in sorted(ACCOUNT_TYPES)}
+
+    def __init__(self) -> None:
+        # (from_account full name, to_account full name) -> references of the transactions, in order
+        self.unclassified: dict[tuple[str, str], dict[str, None]] = {}
+        # Reasons the transactions were skipped, in order
+        self.skipped: dict[str, None] = {}
+
+    def classify(self, to_account, from_account, reference: str = None) -> TransactionType:
+        """
+        Returns the type of a transaction between the accounts (which only need the type and
+        fullname attributes), or EXPENSE for an unclassified pair, collecting the reference of the transaction:
+        simplifying it again (on a reload or a refresh) doesn't count it twice
+        """
+        transaction_type = self.TYPES.get((to_account.type, from_account.type))
+
+        if transaction_type is None:
+            names = (from_account.fullname, to_account.fullname)
+            self.unclassified.setdefault(names, {})[reference] = None
+            return TransactionType.EXPENSE
+        return transaction_type
+
+    def skip(self, reason: str) -> None:
+        """Collects the reason a transaction was skipped (e.g. its splits couldn't be paired), once"""
+        self.skipped[reason] = None
+
+    def get_report(self) -> str:
+        """
+        Returns a summary of the unclassified pairs of accounts, one line per pair,
+        then one line per skipped transaction (empty if none)
+        """
+        return "\n".join([
+            "{} -> {}: {} transaction(s) counted as expenses, first: {}".format(
+                from_name, to_name, len(references), next(iter(references)))
+            for (from_name, to_name), references in sorted(self.unclassified.items())
+        ] + ["Skipped: {}".format(reason) for reason in self.skipped])
+
+    def clear(self) -> None:
+        """Forgets the unclassified pairs and skipped transactions reported so far"""
+        self.unclassified.clear()
+        self.skipped.clear()
@@ -0,0 +1,136 @@
+import dataclasses
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from core.simple_transaction import SimpleTransaction
+from core.typings import TransactionType
+
+
+@dataclass
+class TransactionColumns:
+    """
+    Struct of arrays holding simplified transactions, one list per column
+    """
+    date: list[date] = dataclasses.field(default_factory=list)
+    value: list[Decimal] = dataclasses.field(default_factory=list)
+    description: list[str] = dataclasses.field(default_factory=list)
+    from_account: list[str] = dataclasses.field(default_factory=list)
+    from_account_guid: list[str] = dataclasses.field(default_factory=list)
+    to_account: list[str] = dataclasses.field(default_factory=list)
+    to_account_guid: list[str] = dataclasses.field(default_factory=list)
+    transaction_type: list[TransactionType] = dataclasses.field(default_factory=list)
+    is_scheduled: list[bool] = dataclasses.field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def append(self,
+               date: date,
+               value: Decimal,
+               description: str,
+               from_account: str,
+               from_account_guid: str,
+               to_account: str,
+               to_account_guid: str,
+               transaction_type: TransactionType,
+               is_scheduled: bool = False) -> None:
+        """Appends a row to the columns"""
+        self.date.append(date)
+        self.value.append(value)
+        self.description.append(description)
+        self.from_account.append(from_account)
+        self.from_account_guid.append(from_account_guid)
+        self.to_account.append(to_account)
+        self.to_account_guid.append(to_account_guid)
+        self.transaction_type.append(transaction_type)
+        self.is_scheduled.append(is_scheduled)
+
+    @classmethod
+    def from_items(cls, items: list) -> "TransactionColumns":
+        """Loads the columns from the transactions of TransactionDataItems"""
+        columns = cls()
+        for item in items:
+            for tr in item.transactions:
+                columns.append(
+                    date=item.date,
+                    value=tr.value,
+                    description=tr.description,
+                    from_account=tr.from_account,
+                    from_account_guid=tr.from_account_guid,
+                    to_account=tr.to_account,
+                    to_account_guid=tr.to_account_guid,
+                    transaction_type=tr.transaction_type,
+                    is_scheduled=tr.is_scheduled)
+        return columns
+
+    def get_dataframe(self, minor_units: bool = False, accounts: dict[str, str] = None) -> pd.DataFrame:
+        """
+        Returns a dataframe with a row per transaction, built in a single pass with explicit dtypes:
+        Decimal (or int64 minor units) values, datetime64 dates, and categoricals for the descriptions,
+        the accounts, their guids and the transaction type (by name). The account columns share their
+        categories: the accounts (guid -> full name) of the book if given, and the ones of the rows.
+        Opening balances only have a value, is_scheduled and date.
+        """
+        if len(self) == 0:
+            return pd.DataFrame()
+
+        is_opening = [tr_type == TransactionType.OPENING_BALANCE for tr_type in self.transaction_type]
+
+        def without_opening(values: list) -> list:
+            return [None if opening else value for value, opening in zip(values, is_opening)]
+
+        def get_categories(columns: list[list], known=()) -> list:
+            return sorted(set(known).union(*columns) - {None})
+
+        descriptions = without_opening(self.description)
+        from_accounts = without_opening(self.from_account)
+        to_accounts = without_opening(self.to_account)
+        from_account_guids = without_opening(self.from_account_guid)
+        to_account_guids = without_opening(self.to_account_guid)
+        account_categories = get_categories(
+            [from_accounts, to_accounts], accounts.values() if accounts is not None else ())
+        guid_categories = get_categories(
+            [from_account_guids, to_account_guids], accounts.keys() if accounts is not None else ())
+
+        return pd.DataFrame({
+            'value': pd.Series(self.value, dtype=np.int64 if minor_units else object),
+            'is_scheduled': pd.Series(self.is_scheduled, dtype=bool),
+            'description': pd.Categorical(descriptions, categories=get_categories([descriptions])),
+            'from_account': pd.Categorical(from_accounts, categories=account_categories),
+            'from_account_guid': pd.Categorical(from_account_guids, categories=guid_categories),
+            'to_account': pd.Categorical(to_accounts, categories=account_categories),
+            'to_account_guid': pd.Categorical(to_account_guids, categories=guid_categories),
+            'transaction_type': pd.Categorical(
+                [None if tr_type is None else tr_type.name for tr_type in without_opening(self.transaction_type)],
+                categories=[tr_type.name for tr_type in TransactionType]),
+            'date': pd.to_datetime(pd.Series(self.date, dtype=object))
+        })
+
+    def get_date_ranges(self) -> list[tuple[date, int, int]]:
+        """
+        Returns the (date, start, stop) row ranges of each date, assuming the rows are sorted by date
+        """
+        ranges = []
+        start = 0
+        for index in range(1, len(self.date) + 1):
+            if index == len(self.date) or self.date[index] != self.date[start]:
+                ranges.append((self.date[start], start, index))
+                start = index
+        return ranges
+
+    def get_transactions(self, start: int = 0, stop: int = None) -> list[SimpleTransaction]:
+        """Returns the rows in [start, stop[ as SimpleTransaction"""
+        rows = zip(
+            self.value[start:stop],
+            self.description[start:stop],
+            self.from_account[start:stop],
+            self.from_account_guid[start:stop],
+            self.to_account[start:stop],
+            self.to_account_guid[start:stop],
+            self.transaction_type[start:stop],
+            self.is_scheduled[start:stop])
+        return [SimpleTransaction(*row) for row in rows]
@@ -1,11 +1,19 @@
 import dataclasses
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 import json
 
+import numpy as np
 import pandas as pd
+from core.account_directory import AccountDirectory
+from core.balance_engine import BalanceEngine, ItemBalances
+from core.money import Money
+from core.scheduled_template import ScheduledTemplateCache
+from core.simple_transaction import SimpleTransaction
+from core.transaction_classifier import TransactionClassifier
+from core.transaction_columns import TransactionColumns
 from core.transaction_data_item import TransactionDataItem
-from core.typings import BalanceType, RawTransactionData
+from core.typings import BalanceType, RawTransactionData, ScheduledTransactionOccurences
 from dataclasses import dataclass
 
 
@@ -18,22 +26,46 @@ class TransactionDataConfig:
     opening_date: datetime
     checkings_parent: str = None
     opening_liability: Decimal = None
+    # Commodity fraction of the amounts when they are int minor units (Decimal amounts if None)
+    fraction: int = None
+    # guid -> full name of every account of the book, the categories of the account columns
+    accounts: dict[str, str] = None
+    # Guids of the checkings parent and its descendants (the checkings parent full name is matched if None)
+    checkings_accounts: list[str] = None
+
+    def _amount_to_json(self, amount):
+        if amount is None:
+            return None
+        return int(amount) if self.fraction is not None else float(amount)
 
     def to_json(self):
         return {
-            "opening_balance": float(self.opening_balance),
+            "opening_balance": self._amount_to_json(self.opening_balance),
             "opening_date": self.opening_date.__str__(),
             "checkings_parent": self.checkings_parent,
-            "opening_liability": float(self.opening_liability)
+            "opening_liability": self._amount_to_json(self.opening_liability),
+            "fraction": self.fraction,
+            "accounts": self.accounts,
+            "checkings_accounts": self.checkings_accounts
         }
 
     @classmethod
     def from_dict(cls, data: dict):
+        fraction = data.get("fraction")
+
+        def get_amount(amount):
+            if amount is None:
+                return None
+            return Money.check(int(amount)) if fraction is not None else Decimal(amount)
+
         return cls(
-            opening_balance=Decimal(data["opening_balance"]),
-            opening_liability=Decimal(data["opening_liability"]),
+            opening_balance=get_amount(data["opening_balance"]),
+            opening_liability=get_amount(data["opening_liability"]),
             checkings_parent=data["checkings_parent"],
-            opening_date=datetime.fromisoformat(data["opening_date"])
+            opening_date=datetime.fromisoformat(data["opening_date"]),
+            fraction=fraction,
+            accounts=data.get("accounts"),
+            checkings_accounts=data.get("checkings_accounts")
         )
 
 
@@ -44,114 +76,185 @@ class TransactionData(json.JSONEncoder):
     """
     items: list[TransactionDataItem] = dataclasses.field(default_factory=list)
     config: TransactionDataConfig = None
+    # Ids of the items, with their balances, from the last balance computation
+    _balance_cache: tuple[list[int], ItemBalances] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False)
 
     def get_dataframe(self) -> pd.DataFrame:
         """
         Returns the dataframe with the whole data
         """
-        if len(self.items) == 0:
-            return pd.DataFrame()
+        return TransactionColumns.from_items(self.items).get_dataframe(
+            minor_units=self._get_fraction() is not None,
+            accounts=self.config.accounts if self.config is not None else None)
+
+    def _get_fraction(self) -> int:
+        """Returns the commodity fraction of the amounts, if they are int minor units"""
+        return self.config.fraction if self.config is not None else None
+
+    def to_decimal(self, amounts: pd.Series) -> pd.Series:
+        """Converts amounts of this data (values, diffs or balances) to Decimal, for display"""
+        fraction = self._get_fraction()
+        if fraction is None:
+            return amounts
+        return amounts.map(lambda amount: Money.to_decimal(amount, fraction))
+
+    def _get_opening_state(self) -> tuple:
+        """Returns the running balances before the first item"""
+        if self.config is not None:
+            return (self.config.opening_balance, self.config.opening_balance, 0, 0)
+        return (0, 0, 0, 0)
+
+    def _get_item_balances(self, reused: ItemBalances = None) -> ItemBalances:
+        """
+        Returns the balances of the items, computing them unless cached for the same items.
+        The reused balances are taken for the first items, the others are computed after them.
+        """
+        item_ids = [id(tr) for tr in self.items]
+        if self._balance_cache is not None and self._balance_cache[0] == item_ids:
+            return self._balance_cache[1]
+
+        checkings_parent = self.config.checkings_parent if self.config is not None else None
+        checkings_accounts = None
+        if self.config is not None and self.config.checkings_accounts is not None:
+            checkings_accounts = frozenset(self.config.checkings_accounts)
+        minor_units = self._get_fraction() is not None
+        if reused is not None and len(reused) > 0:
+            balances = reused.concat(BalanceEngine.get_item_balances(
+                items=self.items[len(reused):],
+                state=reused.get_state(len(reused) - 1),
+                checkings_parent=checkings_parent,
+                minor_units=minor_units,
+                checkings_accounts=checkings_accounts))
         else:
-            return pd.concat(
-                [tr.get_dataframe() for tr in self.items],
-                ignore_index=True)
+            balances = BalanceEngine.get_item_balances(
+                items=self.items,
+                state=self._get_opening_state(),
+                checkings_parent=checkings_parent,
+                minor_units=minor_units,
+                checkings_accounts=checkings_accounts)
+
+        self._balance_cache = (item_ids, balances)
+        return balances
+
+    @staticmethod
+    def _get_balance_rows(
+            dates: np.ndarray,
+            has: np.ndarray,
+            recorded: np.ndarray,
+            scheduled: np.ndarray,
+            running: np.ndarray,
+            scheduled_running: np.ndarray) -> dict:
+        """
+        Returns the rows, as columns, of a balance type: one recorded row per item having the balance,
+        followed by a scheduled row when the scheduled balance diverges from the recorded one
+        """
+        recorded_index = np.flatnonzero(has)
+        scheduled_index = np.flatnonzero(has & (scheduled_running != running).astype(bool))
+        index = np.concatenate((recorded_index, scheduled_index))
+        is_scheduled = np.concatenate((
+            np.zeros(len(recorded_index), dtype=bool),
+            np.ones(len(scheduled_index), dtype=bool)))
+
+        order = np.argsort(index * 2 + is_scheduled, kind="stable")
+        index = index[order]
+        is_scheduled = is_scheduled[order]
+
+        return {
+            'date': dates[index],
+            'diff': np.where(is_scheduled, scheduled[index], recorded[index]),
+            'balance': np.where(is_scheduled, scheduled_running[index], running[index]),
+            'scheduled': is_scheduled
+        }
 
     def get_balance_data(self) -> pd.DataFrame:
         """
         Returns a dataframe containing the balance per dates
+        (with int64 diffs and balances if the amounts are minor units)
         """
-        checkings = 0
-        scheduled_checkings = 0
-        liability = 0
-        scheduled_liability = 0
-        checkings_list = []
-        liabilities_list = []
-        checkings_parent = None
-
-        def newline(
-            date: datetime,
-            balance: Decimal,
-            scheduled: bool = False,
-            diff: Decimal = Decimal(0),
-            type: BalanceType = BalanceType.CHECKINGS
-        ):
-
-            return {
-                'type': type,
-                'date': date,
-                'diff': diff,
-                'balance': balance,
-                'scheduled': scheduled
-            }
+        minor_units = self._get_fraction() is not None
+        balances = self._get_item_balances()
+        dates = np.fromiter((tr.date for tr in self.items), dtype=object, count=len(self.items))
+
+        checkings = self._get_balance_rows(
+            dates,
+            balances.has_checkings,
+            balances.checkings_recorded,
+            balances.checkings_scheduled,
+            balances.checkings,
+            balances.scheduled_checkings)
+        liabilities = self._get_balance_rows(
+            dates,
+            balances.has_liability,
+            balances.liability_recorded,
+            balances.liability_scheduled,
+            balances.liability,
+            balances.scheduled_liability)
 
+        openings = {BalanceType.CHECKINGS: [], BalanceType.LIABILITIES: []}
         if self.config is not None:
-            checkings_parent = self.config.checkings_parent
-            checkings = self.config.opening_balance
-            scheduled_checkings = self.config.opening_balance
-            checkings_list.append(newline(
-                date=self.config.opening_date,
-                balance=self.config.opening_balance
-            ))
+            openings[BalanceType.CHECKINGS].append(self.config.opening_balance)
             if self.config.opening_liability is not None:
-                liabilities_list.append(newline(
-                    date=self.config.opening_date,
-                    balance=self.config.opening_liability,
-                    type=BalanceType.LIABILITIES
-                ))
-
-        for tr in self.items:
-            balance_data = tr.get_balance(checkings_parent=checkings_parent)
-            checkings_data = balance_data.checkings
-            liabilities_data = balance_data.liability
-
-            if checkings_data is not None:
-
-                checkings = checkings + checkings_data.recorded
-                scheduled_checkings = scheduled_checkings + checkings_data.recorded
-                checkings_list.append(newline(
-                    date=tr.date,
-                    balance=checkings,
-                    diff=checkings_data.recorded
-                ))
-
-                if checkings_data.scheduled != checkings_data.recorded:
-                    scheduled_checkings = scheduled_checkings + checkings_data.scheduled
-
-                if scheduled_checkings != checkings:
-                    checkings_list.append(newline(
-                        date=tr.date,
-                        balance=scheduled_checkings,
-                        diff=checkings_data.scheduled,
-                        scheduled=True
-                    ))
-
-            if liabilities_data is not None:
-
-                liability = liability + liabilities_data.recorded
-                scheduled_liability = scheduled_liability + liabilities_data.recorded
-                liabilities_list.append(newline(
-                    date=tr.date,
-                    balance=liability,
-                    diff=liabilities_data.recorded,
-                    type=BalanceType.LIABILITIES
-                ))
-
-                if liabilities_data.scheduled != liabilities_data.recorded:
-                    scheduled_liability = scheduled_liability + liabilities_data.scheduled
-
-                if scheduled_liability != liability:
-                    liabilities_list.append(newline(
-                        date=tr.date,
-                        balance=scheduled_liability,
-                        diff=liabilities_data.scheduled,
-                        scheduled=True,
-                        type=BalanceType.LIABILITIES
-                    ))
-
-        return pd.DataFrame(checkings_list + liabilities_list)
+                openings[BalanceType.LIABILITIES].append(self.config.opening_liability)
+
+        columns = {'type': [], 'date': [], 'diff': [], 'balance': [], 'scheduled': []}
+        for balance_type, rows in [(BalanceType.CHECKINGS, checkings), (BalanceType.LIABILITIES, liabilities)]:
+            for opening_balance in openings[balance_type]:
+                columns['type'].append(np.array([balance_type], dtype=object))
+                columns['date'].append(np.array([self.config.opening_date], dtype=object))
+                columns['diff'].append(np.array([0 if minor_units else Decimal(0)], dtype=object))
+                columns['balance'].append(np.array([opening_balance], dtype=object))
+                columns['scheduled'].append(np.zeros(1, dtype=bool))
+
+            type_column = np.empty(len(rows['date']), dtype=object)
+            type_column[:] = balance_type
+            columns['type'].append(type_column)
+            for name in ['date', 'diff', 'balance', 'scheduled']:
+                columns[name].append(rows[name])
+
+        if sum(len(values) for values in columns['type']) == 0:
+            return pd.DataFrame()
+        df = pd.DataFrame({name: np.concatenate(values) for name, values in columns.items()})
+        if minor_units:
+            df = df.astype({'diff': np.int64, 'balance': np.int64})
+        return df
+
+    def patch(self,
+              items: list[TransactionDataItem],
+              from_date: datetime,
+              config: TransactionDataConfig = None):
+        """
+        Returns a new TransactionData with the given items (and config, if changed),
+        where the items before from_date are the same objects as in this one.
+        Their already computed balances are reused: only the balances from from_date onward are computed.
+        """
+        config = config if config is not None else self.config
+        patched = TransactionData(items=items, config=config)
+
+        if self._balance_cache is not None and config == self.config:
+            balances = self._get_item_balances()
+            reused = 0
+            for old, new in zip(self.items, items):
+                if old is not new or old.date >= from_date:
+                    break
+                reused = reused + 1
+            patched._get_item_balances(reused=balances.head(reused))
+
+        return patched
 
     @classmethod
-    def from_rawdata(cls, data: RawTransactionData, config: TransactionDataConfig = None):
+    def from_rawdata(cls,
+                     data: RawTransactionData,
+                     config: TransactionDataConfig = None,
+                     fraction: int = None,
+                     classifier: TransactionClassifier = None,
+                     directory: AccountDirectory = None,
+                     templates: ScheduledTemplateCache = None):
+        """
+        Loads a TransactionData using the GnuCash transactions per date (simplified with values in minor
+        units of the fraction, if given, types from the classifier, accounts from the directory
+        and scheduled transactions from the cached templates)
+        """
         sorted_keys = sorted(data)
         items = []
         for key in sorted_keys:
@@ -159,7 +262,59 @@ class TransactionData(json.JSONEncoder):
             items.append(TransactionDataItem.from_transactions(
                 date=key,
                 recorded=item[0],
-                scheduled=item[1]
+                scheduled=item[1],
+                fraction=fraction,
+                classifier=classifier,
+                directory=directory,
+                templates=templates
+            ))
+
+        return cls(
+            items=items,
+            config=config
+        )
+
+    @classmethod
+    def from_columns(cls,
+                     columns: TransactionColumns,
+                     recorded_scheduled_guids: dict[date, list[str]] = {},
+                     scheduled: list[ScheduledTransactionOccurences] = [],
+                     config: TransactionDataConfig = None,
+                     fraction: int = None,
+                     classifier: TransactionClassifier = None,
+                     directory: AccountDirectory = None,
+                     templates: ScheduledTemplateCache = None):
+        """
+        Loads a TransactionData using simplified recorded transactions in columns (sorted by date),
+        the guids of the scheduled transactions recorded per date (one entry for every recorded date)
+        and the scheduled transactions with their occurences (simplified with values in minor units
+        of the fraction, if given, types from the classifier, accounts from the directory and
+        scheduled transactions from the cached templates)
+        """
+        ranges = {}
+        for key, start, stop in columns.get_date_ranges():
+            ranges[key] = (start, stop)
+
+        scheduled_by_date: dict[date, list] = {}
+        for tr, dates in scheduled:
+            for tr_date in dates:
+                if tr_date in scheduled_by_date:
+                    scheduled_by_date[tr_date].append(tr)
+                else:
+                    scheduled_by_date[tr_date] = [tr]
+
+        items = []
+        for key in sorted(set(ranges) | set(recorded_scheduled_guids) | set(scheduled_by_date)):
+            start, stop = ranges.get(key, (0, 0))
+            items.append(TransactionDataItem.from_simplified(
+                date=key,
+                recorded=columns.get_transactions(start, stop),
+                recorded_scheduled_guids=recorded_scheduled_guids.get(key, []),
+                scheduled=scheduled_by_date.get(key, []),
+                fraction=fraction,
+                classifier=classifier,
+                directory=directory,
+                templates=templates
             ))
 
         return cls(
@@ -169,13 +324,22 @@ class TransactionData(json.JSONEncoder):
 
     @classmethod
     def from_dataframe(cls, df: pd.DataFrame, config: TransactionDataConfig = None):
+        """
+        Loads a TransactionData using a dataframe: the rows are sorted by date once (keeping
+        their order inside a date), decoded at once and split into one item per date.
+        The values are minor units if the config has a fraction.
+        """
         items = []
 
-        unique_dates = df["date"].unique()
-        if unique_dates is not None and len(unique_dates) > 0:
-            unique_dates.sort()
-            for date in unique_dates:
-                items.append(TransactionDataItem.from_dataframe(date=date, df=df[df["date"] == date]))
+        if len(df) > 0:
+            dates = df["date"].to_numpy()
+            order = np.argsort(dates, kind="stable")
+            unique_dates, starts = np.unique(dates[order], return_index=True)
+            transactions = SimpleTransaction.from_dataframe(
+                df.iloc[order], fraction=config.fraction if config is not None else None)
+            stops = list(starts[1:]) + [len(transactions)]
+            for item_date, start, stop in zip(unique_dates, starts, stops):
+                items.append(TransactionDataItem(date=item_date, transactions=transactions[start:stop]))
 
         return cls(
             items=items,
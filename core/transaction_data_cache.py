@@ -0,0 +1,161 @@
+"""
+Transaction Data Cache
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from datetime import date, timedelta
+import sys
+
+from core.transaction_data_item import TransactionDataItem
+
+
+@dataclass
+class CacheStats:
+    """
+    Statistics of a TransactionDataCache
+    """
+    # Requests fully answered by cached intervals
+    hits: int = 0
+    # Requests answered partly by cached intervals, partly by queries
+    partial_hits: int = 0
+    # Requests without any cached interval
+    misses: int = 0
+    # Intervals removed to stay under the size limit
+    evictions: int = 0
+    # Intervals removed as the splits they were built from changed
+    invalidations: int = 0
+
+
+class TransactionDataCache:
+    """
+    In-process cache of TransactionDataItems by date interval, for a given version of the book.
+
+    The cached intervals never overlap: a request is answered by stitching the cached intervals
+    inside it, and only the missing ranges need to be queried (and then cached).
+    The least recently used intervals are evicted when the estimated size exceeds max_size (in bytes).
+    Each interval may keep the state of the splits it was built from (a checksum by post date), up to margin
+    around it (e.g. the recorded instances its occurences are matched with), to be validated when requested.
+    """
+
+    def __init__(self, max_size: int, margin: timedelta = timedelta(days=0)) -> None:
+        self.max_size = max_size
+        self.margin = margin
+        self.size = 0
+        self.version = None
+        self.stats = CacheStats()
+        # (start, end) -> (items, size, state), from the least to the most recently used
+        self._intervals: OrderedDict[
+            tuple[date, date], tuple[list[TransactionDataItem], int, dict[date, frozenset]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def clear(self) -> None:
+        self._intervals.clear()
+        self.size = 0
+
+    def set_version(self, version) -> None:
+        """Sets the version of the book, dropping every interval cached for another version"""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def get(
+            self,
+            start_date: date,
+            end_date: date,
+            state: dict[date, frozenset] = None) -> tuple[list[TransactionDataItem], list[tuple[date, date]]]:
+        """
+        Returns copies of the cached items inside [start_date, end_date] (unsorted),
+        so the caller can't alter the cache, and the (start, end) ranges of the period not cached yet.
+        With the current state of the splits (covering the period and the margin around it), the intervals
+        whose splits changed inside the period are removed, and their ranges returned as missing.
+        """
+        items = []
+        covered = []
+        for interval in list(self._intervals):
+            interval_start, interval_end = interval
+            if interval_end < start_date or interval_start > end_date:
+                continue
+            interval_items, _size, interval_state = self._intervals[interval]
+            covered_start, covered_end = max(interval_start, start_date), min(interval_end, end_date)
+            if state is not None and interval_state is not None and self.get_state_between(
+                    state, covered_start - self.margin, covered_end + self.margin) != self.get_state_between(
+                    interval_state, covered_start - self.margin, covered_end + self.margin):
+                self.remove(interval)
+                self.stats.invalidations = self.stats.invalidations + 1
+                continue
+            self._intervals.move_to_end(interval)
+            covered.append((covered_start, covered_end))
+            items.extend(self.copy_items(
+                item for item in interval_items
+                if item.date >= start_date and item.date <= end_date))
+
+        missing = []
+        missing_start = start_date
+        for covered_start, covered_end in sorted(covered):
+            if covered_start > missing_start:
+                missing.append((missing_start, covered_start - timedelta(days=1)))
+            missing_start = max(missing_start, covered_end + timedelta(days=1))
+        if missing_start <= end_date:
+            missing.append((missing_start, end_date))
+
+        if len(missing) == 0:
+            self.stats.hits = self.stats.hits + 1
+        elif len(covered) > 0:
+            self.stats.partial_hits = self.stats.partial_hits + 1
+        else:
+            self.stats.misses = self.stats.misses + 1
+
+        return items, missing
+
+    def put(
+            self,
+            start_date: date,
+            end_date: date,
+            items: list[TransactionDataItem],
+            state: dict[date, frozenset] = None) -> None:
+        """
+        Caches copies of the items of an interval (not overlapping the cached ones), so the caller can't alter
+        the cache, with the state of the splits they were built from (kept up to the margin around the interval),
+        evicting the least recently used
+        """
+        items = self.copy_items(items)
+        if state is not None:
+            state = self.get_state_between(state, start_date - self.margin, end_date + self.margin)
+        size = self.get_size(items) + sys.getsizeof(state)
+        self._intervals[(start_date, end_date)] = (items, size, state)
+        self.size = self.size + size
+
+        while self.size > self.max_size and len(self._intervals) > 0:
+            _interval, (_items, evicted_size, _state) = self._intervals.popitem(last=False)
+            self.size = self.size - evicted_size
+            self.stats.evictions = self.stats.evictions + 1
+
+    def remove(self, interval: tuple[date, date]) -> None:
+        """Removes a cached interval"""
+        _items, size, _state = self._intervals.pop(interval)
+        self.size = self.size - size
+
+    @classmethod
+    def get_state_between(cls, state: dict[date, frozenset], start_date: date, end_date: date) -> dict[date, frozenset]:
+        """Returns the part of a state of the splits posted in [start_date, end_date]"""
+        return {post_date: splits for post_date, splits in state.items()
+                if post_date >= start_date and post_date <= end_date}
+
+    @classmethod
+    def copy_items(cls, items) -> list[TransactionDataItem]:
+        """Copies the items and their transactions"""
+        return [replace(item, transactions=[replace(tr) for tr in item.transactions]) for item in items]
+
+    @classmethod
+    def get_size(cls, items: list[TransactionDataItem]) -> int:
+        """Estimates the memory used by the items, in bytes"""
+        size = sys.getsizeof(items)
+        for item in items:
+            size = size + sys.getsizeof(item) + sys.getsizeof(item.transactions)
+            for tr in item.transactions:
+                size = size + sys.getsizeof(tr) + sum(
+                    sys.getsizeof(getattr(tr, field.name)) for field in fields(tr))
+        return size
@@ -1,6 +1,12 @@
+from collections import Counter
 import dataclasses
 import pandas as pd
+from core.account_hierarchy import AccountHierarchy
+from core.account_directory import AccountDirectory
+from core.scheduled_template import ScheduledTemplateCache
 from core.simple_transaction import SimpleTransaction
+from core.transaction_classifier import TransactionClassifier
+from core.transaction_columns import TransactionColumns
 from core.typings import TransactionType, Balance, BalanceData
 from dataclasses import dataclass
 from datetime import datetime
@@ -16,9 +22,10 @@ class TransactionDataItem:
     date: datetime
     transactions: list[SimpleTransaction] = dataclasses.field(default_factory=list)
 
-    def get_balance(self, checkings_parent: str = None) -> BalanceData:
+    def get_balance(self, checkings_parent: str = None, checkings_accounts: frozenset[str] = None) -> BalanceData:
         """
-        Returns the balance information for the date
+        Returns the balance information for the date. The transfers count for the checkings when they come
+        from or go to the checkings accounts (by guid), or the checkings parent and its descendants if not given.
         """
         checkings_balance = None
         liability_balance = None
@@ -27,7 +34,8 @@ class TransactionDataItem:
             nonlocal checkings_balance
 
             if checkings_balance is None:
-                checkings_balance = Balance(Decimal(0), Decimal(0))
+                # Zeros of the value type (Decimal, or int minor units)
+                checkings_balance = Balance(val - val, val - val)
             checkings_balance.scheduled = checkings_balance.scheduled + val
             if not scheduled:
                 checkings_balance.recorded = checkings_balance.recorded + val
@@ -36,7 +44,7 @@ class TransactionDataItem:
             nonlocal liability_balance
 
             if liability_balance is None:
-                liability_balance = Balance(Decimal(0), Decimal(0))
+                liability_balance = Balance(val - val, val - val)
             liability_balance.scheduled = liability_balance.scheduled + val
             if not scheduled:
                 liability_balance.recorded = liability_balance.recorded + val
@@ -51,10 +59,18 @@ class TransactionDataItem:
                 add_checkings(-tr.value, tr.is_scheduled)
             elif tr.transaction_type == TransactionType.INCOME:
                 add_checkings(tr.value, tr.is_scheduled)
+            elif (tr.transaction_type == TransactionType.TRANSFER
+                    and checkings_accounts is not None):
+                relevant_from = tr.from_account_guid in checkings_accounts
+                relevant_to = tr.to_account_guid in checkings_accounts
+                if relevant_from and not relevant_to:
+                    add_checkings(-tr.value, tr.is_scheduled)
+                elif relevant_to and not relevant_from:
+                    add_checkings(tr.value, tr.is_scheduled)
             elif (tr.transaction_type == TransactionType.TRANSFER
                     and checkings_parent is not None):
-                relevant_from = tr.from_account.startswith(checkings_parent)
-                relevant_to = tr.to_account.startswith(checkings_parent)
+                relevant_from = AccountHierarchy.is_descendant_name(tr.from_account, checkings_parent)
+                relevant_to = AccountHierarchy.is_descendant_name(tr.to_account, checkings_parent)
                 if relevant_from and not relevant_to:
                     add_checkings(-tr.value, tr.is_scheduled)
                 elif relevant_to and not relevant_from:
@@ -68,22 +84,39 @@ class TransactionDataItem:
         """
         Returns a dataframe containing all the information present
         """
-        if len(self.transactions) == 0:
-            return pd.DataFrame()
-        else:
-            temp_dfs = [tr.get_dataframe() for tr in self.transactions]
-            df = pd.concat(temp_dfs, ignore_index=True).assign(
-                date=lambda _: self.date)
-            return df
+        return TransactionColumns.from_items([self]).get_dataframe()
 
     @classmethod
-    def from_dataframe(cls, date: datetime, df: pd.DataFrame) -> None:
+    def from_dataframe(cls, date: datetime, df: pd.DataFrame, fraction: int = None) -> None:
         """
-        Loads a TransactionDataItem using a dataframe
+        Loads a TransactionDataItem using a dataframe (with values in minor units of the fraction, if given)
         """
-        transactions = []
-        for index, row in df.iterrows():
-            transactions.append(SimpleTransaction.from_series(row))
+        return cls(date=date, transactions=SimpleTransaction.from_dataframe(df, fraction=fraction))
+
+    @classmethod
+    def from_simplified(cls,
+                        date: datetime,
+                        recorded: list[SimpleTransaction] = [],
+                        recorded_scheduled_guids: list[str] = [],
+                        scheduled: list[ScheduledTransaction] = [],
+                        fraction: int = None,
+                        classifier: TransactionClassifier = None,
+                        directory: AccountDirectory = None,
+                        templates: ScheduledTemplateCache = None):
+        """
+        Loads a TransactionDataItem using already simplified recorded transactions,
+        the guids of the scheduled transactions behind them and the GnuCash scheduled transactions
+        (simplified with values in minor units of the fraction, if given, from the cached templates, if given).
+        Each recorded guid cancels one occurence of its scheduled transaction, counted in a multiset.
+        """
+        transactions = list(recorded)
+        sch_guids = Counter(recorded_scheduled_guids)
+        for sch in scheduled:
+            if sch_guids[sch.guid] > 0:
+                sch_guids[sch.guid] = sch_guids[sch.guid] - 1
+            else:
+                transactions.extend(SimpleTransaction.simplify_scheduled_record(
+                    sch, fraction=fraction, classifier=classifier, directory=directory, templates=templates))
 
         return cls(date=date, transactions=transactions)
 
@@ -91,27 +124,37 @@ class TransactionDataItem:
     def from_transactions(cls,
                           date: datetime,
                           recorded: list[Transaction] = [],
-                          scheduled: list[ScheduledTransaction] = []):
+                          scheduled: list[ScheduledTransaction] = [],
+                          fraction: int = None,
+                          classifier: TransactionClassifier = None,
+                          directory: AccountDirectory = None,
+                          templates: ScheduledTemplateCache = None):
         """
         Loads a TransactionDataItem using a GnuCash transaction objects
+        (with values in minor units of the fraction, if given)
         """
         transactions = []
         # Get all the guids from scheduled recorded
         sch_guids = []
         for rec in recorded:
-            if rec.scheduled_transaction is not None:
-                sch_guids.append(rec.scheduled_transaction.guid)
+            sch_guid = SimpleTransaction.get_scheduled_guid(rec)
+            if sch_guid is not None:
+                sch_guids.append(sch_guid)
             try:
-                records = SimpleTransaction.simplify_record(rec)
-                transactions = transactions + records
+                transactions.extend(SimpleTransaction.simplify_record(
+                    rec, fraction=fraction, classifier=classifier, directory=directory))
             except AttributeError as e:
-                print(e)
+                if classifier is None:
+                    print(e)
+                else:
+                    classifier.skip(str(e))
 
-        for sch in scheduled:
-            if sch.guid in sch_guids:
-                sch_guids.remove(sch.guid)
-            else:
-                records = SimpleTransaction.simplify_scheduled_record(sch)
-                transactions = transactions + records
-
-        return cls(date=date, transactions=transactions)
+        return cls.from_simplified(
+            date=date,
+            recorded=transactions,
+            recorded_scheduled_guids=sch_guids,
+            scheduled=scheduled,
+            fraction=fraction,
+            classifier=classifier,
+            directory=directory,
+            templates=templates)
@@ -2,18 +2,35 @@
 Transaction Journal
 """
 
+import bisect
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
 from dataclasses import dataclass
 from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterator
+import piecash
 from piecash.core.account import Account
 from piecash.core.book import Book
-from piecash.core.transaction import ScheduledTransaction, Transaction
-from sqlalchemy import or_
+from piecash.core.commodity import Commodity
+from piecash.core.transaction import ScheduledTransaction, Split, Transaction
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload, subqueryload, with_polymorphic
 from piecash._common import Recurrence
-import calendar
+from piecash.kvp import Slot
+from core.account_balance import AccountBalance
+from core.account_directory import AccountDirectory
+from core.balance_checkpoint import BalanceCheckpointStore
+from core.money import Money
+from core.recurrence import RecurrenceBatchExpander, RecurrenceExpander
+from core.scheduled_matcher import ScheduledMatcher
+from core.scheduled_template import CompiledTemplate, ScheduledTemplateCache
+from core.sql_journal_backend import SqlJournalBackend
+from core.transaction_classifier import TransactionClassifier
 from core.transaction_data import TransactionData, TransactionDataConfig
-from core.typings import RawTransactionData
-
-ScheduledTransactionOccurences = tuple[ScheduledTransaction, list[date]]
+from core.transaction_data_cache import TransactionDataCache
+from core.transaction_data_item import TransactionDataItem
+from core.typings import RawTransactionData, ScheduledTransactionOccurences
 
 
 @dataclass
@@ -23,6 +40,81 @@ class TransactionJournalConfig:
     """
     checkings_parent_guid: str
     liabilities_parent_guid: str = None
+    # Bulk loads splits and slots of recorded transactions in a fixed number of queries
+    eager_load: bool = False
+    # Path of the sidecar SQLite file keeping month-end balance checkpoints (disabled if None),
+    # validated against the whole book by the first load and by each refresh
+    checkpoint_path: str = None
+    # How recorded transactions are read: "orm" (piecash objects) or "sql" (SQLAlchemy Core, read-only)
+    backend: str = "orm"
+    # Maximum memory (in bytes) of the cache of loaded intervals, reused by overlapping requests (disabled if None)
+    cache_size: int = None
+    # Number of processes simplifying the partitions of the period in parallel (serial if None)
+    workers: int = None
+    # Amounts as exact int minor units of the checkings commodity (e.g. cents), instead of Decimal
+    minor_units: bool = False
+    # Days between a recorded scheduled transaction and the occurence it cancels (same date only if 0)
+    match_tolerance_days: int = 0
+    # Values of the variables of the scheduled transaction formulas (the numeric slots are used if unbound)
+    formula_variables: dict[str, Decimal] = None
+    # Keeps the state of the book behind the last loaded TransactionData, so refresh can update it
+    # (one more query over the period per load)
+    refreshable: bool = False
+
+
+@dataclass
+class JournalSnapshot:
+    """
+    State of the book behind the last loaded TransactionData, used to detect what changed since
+    """
+    start_date: date
+    end_date: date
+    data: TransactionData
+    # post date -> checksum of the splits of the recorded transactions, inside the period
+    transactions: dict[date, frozenset]
+    # guid -> fields of every scheduled transaction of the book, with its recurrence
+    scheduled: dict[str, tuple]
+    # guid -> occurence dates, inside the period, of every expanded scheduled transaction
+    occurences: dict[str, list[date]]
+    # guid -> compiled template of every expanded scheduled transaction
+    templates: dict[str, CompiledTemplate]
+    # guid -> full name of every account of the book
+    accounts: dict[str, str]
+
+
+# Journal of the current pool worker, with its own read-only connection to the book
+_worker_journal: "TransactionJournal" = None
+
+
+def _init_worker(uri_conn: str, config: TransactionJournalConfig) -> None:
+    """Opens the book in a pool worker"""
+    global _worker_journal
+    book = piecash.open_book(uri_conn=uri_conn, readonly=True, open_if_lock=True, do_backup=False)
+    _worker_journal = TransactionJournal(book=book, config=config)
+
+
+def _build_partition(
+        start_date: date,
+        end_date: date,
+        occurences: list[tuple[str, list[date]]]) -> list[TransactionDataItem]:
+    """
+    Builds the items of a partition of the period in a pool worker, with the occurences (by scheduled
+    transaction guid) inside the partition, expanded once by the parent journal
+    """
+    _worker_journal._reload()
+    guids = [guid for guid, _dates in occurences]
+    scheduled_transactions = {}
+    if len(guids) > 0:
+        scheduled_transactions = {tr.guid: tr for tr in _worker_journal.book.query(
+            ScheduledTransaction
+        ).filter(
+            ScheduledTransaction.guid.in_(guids)
+        )}
+    return _worker_journal._build_transaction_data(
+        start_date=start_date,
+        end_date=end_date,
+        scheduled=[(scheduled_transactions[guid], dates) for guid, dates in occurences],
+        config=None).items
 
 
 class TransactionJournal:
@@ -30,7 +122,41 @@ class TransactionJournal:
     def __init__(self, book: Book, config: TransactionJournalConfig = None) -> None:
         self.book = book
         self.config = config
-        pass
+        self._checkpoints: BalanceCheckpointStore = None
+        if config is not None and config.checkpoint_path is not None:
+            self._checkpoints = BalanceCheckpointStore(config.checkpoint_path)
+        self._account_balance = AccountBalance(book, checkpoints=self._checkpoints)
+        self._sql_backend = SqlJournalBackend(book)
+        self._snapshot: JournalSnapshot = None
+        self._fraction: int = None
+        self._directory: AccountDirectory = None
+        # Shared by the recorded and scheduled simplifications, collecting the unclassified pairs
+        self._classifier = TransactionClassifier()
+        self._templates = ScheduledTemplateCache(
+            variables=config.formula_variables if config is not None else None)
+        self._cache = None
+        if config is not None and config.cache_size is not None:
+            # The recorded instances matched with the occurences of an interval are read one tolerance around it
+            self._cache = TransactionDataCache(
+                max_size=config.cache_size, margin=timedelta(days=config.match_tolerance_days))
+        # Pool of the parallel builds, started on the first one
+        self._executor: ProcessPoolExecutor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the balance checkpoint store and shuts the pool of workers down (the book is left open)"""
+        if self._checkpoints is not None:
+            self._account_balance.close()
+            self._checkpoints.close()
+            self._checkpoints = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
     def _get_monthly_recursive_occurences(
             self,
@@ -101,45 +227,11 @@ class TransactionJournal:
     def _get_next_recursive_occurence(self, recurrence: Recurrence, previous_date: date = None):
         if previous_date is None:
             return recurrence.recurrence_period_start
-
-        month = month = previous_date.month
-        year = previous_date.year
-        day = previous_date.day
-        if "month" in recurrence.recurrence_period_type:
-            month = month + recurrence.recurrence_mult
-            if month > 12:
-                month = month - 12
-                year = year + 1
-            if recurrence.recurrence_period_type == "end_of_month":
-                # Get the last day
-                range = calendar.monthrange(year, month)
-                day = range[1]
-        elif "year" == recurrence.recurrence_period_type:
-            year = year + recurrence.recurrence_mult
-        else:
-            raise AttributeError("Unknown '{}' as period of recurrence".format(recurrence.recurrence_period_type))
-
-        try:
-            new_date = date(year, month, day)
-        except Exception:
-            range = calendar.monthrange(year, month)
-            new_date = date(year, month, range[1])
-
-        return new_date
+        return RecurrenceExpander.get_next_occurence(recurrence, previous_date)
 
     def _get_recursive_occurences(self, recurrence: Recurrence, start_date: date, end_date: date) -> list[date]:
         """Get the list of dates based on the recurrence patterns"""
-        occurences = list()
-
-        recursive_it = self._get_next_recursive_occurence(recurrence)
-        keep_searching = True
-        while keep_searching:
-            if recursive_it >= start_date and recursive_it <= end_date:
-                occurences.append(recursive_it)
-            recursive_it = self._get_next_recursive_occurence(recurrence, recursive_it)
-            keep_searching = recursive_it <= end_date
-
-        return occurences
+        return RecurrenceExpander.get_occurences(recurrence, start_date, end_date)
 
     def _get_raw_transaction_data(
             self,
@@ -166,57 +258,733 @@ class TransactionJournal:
     def _get_account(self, guid: str) -> Account:
         return self.book.query(Account).filter(Account.guid == guid).first()
 
-    def _get_recorded_transactions(self, start_date: date, end_date: date) -> list[Transaction]:
-        """Get all the recorded sessions for the period"""
-        return self.book.query(Transaction).filter(
+    def _get_fraction(self) -> int:
+        """
+        Gets the fraction of the commodity of the checkings account if the amounts are minor units
+        (None for Decimal amounts). Every amount must be a whole number of them: raises ValueError, before
+        anything is converted, if a transaction currency or a commodity of the checkings or liabilities
+        accounts has a finer fraction
+        """
+        if self.config is None or not self.config.minor_units:
+            return None
+        if self._fraction is None:
+            directory = self._get_directory()
+            fraction = directory[self.config.checkings_parent_guid].fraction
+
+            fractions = [("Currency {}".format(mnemonic), currency_fraction)
+                         for mnemonic, currency_fraction in self.book.session.execute(select(
+                             Commodity.mnemonic,
+                             Commodity.fraction
+                         ).where(
+                             Commodity.guid.in_(select(Transaction.currency_guid))
+                         ))]
+            for parent_guid in [self.config.checkings_parent_guid, self.config.liabilities_parent_guid]:
+                if parent_guid is not None:
+                    fractions.extend(
+                        ("Account {}".format(directory[guid].fullname), directory[guid].fraction)
+                        for guid in sorted(directory.get_hierarchy().get_subtree(parent_guid)))
+
+            for name, finer_fraction in fractions:
+                if finer_fraction is not None and fraction % finer_fraction != 0:
+                    raise ValueError(
+                        "{} has a fraction of 1/{}: its amounts can't be minor units of 1/{} (the checkings "
+                        "commodity fraction), disable minor_units for this book".format(
+                            name, finer_fraction, fraction))
+            self._fraction = fraction
+        return self._fraction
+
+    def _to_amount(self, value: Decimal):
+        """Converts a Decimal amount to the configured representation"""
+        fraction = self._get_fraction()
+        if value is None or fraction is None:
+            return value
+        return Money.to_minor(value, fraction)
+
+    def get_classification_report(self) -> str:
+        """
+        Returns the summary of the pairs of accounts that couldn't be classified (counted as expenses)
+        in the transactions simplified so far by this journal (not by the pool workers),
+        each transaction counted once however many times it was loaded again,
+        and of the transactions skipped as their splits couldn't be paired
+        """
+        return self._classifier.get_report()
+
+    def get_formula_report(self) -> str:
+        """
+        Returns the summary of the scheduled transaction formulas that couldn't be evaluated
+        (unsupported, or with variables missing from formula_variables), so their numeric slots were used
+        """
+        return self._templates.get_report()
+
+    def _get_directory(self) -> AccountDirectory:
+        """Gets the directory of the accounts of the book, loaded again by each load or refresh"""
+        if self._directory is None:
+            self._directory = AccountDirectory.from_book(self.book)
+        return self._directory
+
+    def _reload(self) -> None:
+        """Drops the objects loaded from the book, as it may have been changed by another session"""
+        self.book.session.expire_all()
+        self._update_templates()
+
+    def _update_templates(self) -> None:
+        """
+        Loads the directory of the accounts again, and drops the compiled templates of the scheduled transactions
+        when the template slots or the account names of the book changed since they were compiled
+        (two queries, once per load or refresh)
+        """
+        self._directory = None
+        slots = Slot.__table__
+        rows = self.book.session.execute(select(slots).where(slots.c.name.like("sched-xaction%")))
+        self._templates.set_version(hash((
+            frozenset(tuple(row) for row in rows),
+            frozenset(self._get_directory().get_fullnames().items()))))
+
+    def _get_checkings_accounts(self) -> list[str]:
+        """Gets the guids of the checkings parent and its descendants"""
+        return sorted(self._get_directory().get_hierarchy().get_subtree(self.config.checkings_parent_guid))
+
+    def _get_account_names(self) -> dict[str, str]:
+        """Gets the full name of every account of the book, by guid"""
+        return self._get_directory().get_fullnames()
+
+    def _get_opening_balance(self, account: Account, at_date: date) -> Decimal:
+        """Gets the balance of the account (and its children) at the given date"""
+        return self._account_balance.get_balance(account=account, at_date=at_date)
+
+    def _get_recorded_transactions(
+            self,
+            start_date: date,
+            end_date: date,
+            post_dates: list[date] = None) -> list[Transaction]:
+        """Get all the recorded sessions for the period (only the ones posted at post_dates, if given)"""
+        query = self.book.query(Transaction).filter(
             Transaction.post_date >= start_date,
-            Transaction.post_date <= end_date).all()
-
-    def _get_scheduled_transactions(self, start_date: date, end_date: date) -> list[ScheduledTransactionOccurences]:
-        """Get a list of ScheduledTransactions with their lists of occurence dates"""
-        raw_transactions: list[ScheduledTransaction] = self.book.query(
+            Transaction.post_date <= end_date)
+        if post_dates is not None:
+            query = query.filter(Transaction.post_date.in_(post_dates))
+
+        if self.config is not None and self.config.eager_load:
+            # The split accounts are resolved through the directory, by guid
+            query = query.options(
+                subqueryload(Transaction.splits),
+                subqueryload(Transaction.slots.of_type(with_polymorphic(Slot, "*"))))
+
+        return query.all()
+
+    def _get_scheduled_candidates(self, start_date: date = None, end_date: date = None) -> list[ScheduledTransaction]:
+        """
+        Get the ScheduledTransactions that may have occurences (inside the period, if given), with their recurrence:
+        the disabled, exhausted and out of the period ones are filtered out by the query
+        """
+        tolerance_days = self.config.match_tolerance_days if self.config is not None else 0
+        # As far as the occurences are expanded for the matching
+        margin = timedelta(days=2 * tolerance_days)
+        conditions = [
+            ScheduledTransaction.enabled == True,  # noqa: E712
+            # Limited to a number of occurences, all of them already created
+            or_(ScheduledTransaction.num_occur == 0, ScheduledTransaction.rem_occur > 0),
+            # Ended before or at the last created occurence
+            or_(ScheduledTransaction.end_date == None,  # noqa: E711
+                ScheduledTransaction.last_occur == None,  # noqa: E711
+                ScheduledTransaction.end_date > ScheduledTransaction.last_occur)
+        ]
+        if start_date is not None:
+            conditions.append(or_(
+                ScheduledTransaction.end_date == None,  # noqa: E711
+                ScheduledTransaction.end_date >= start_date - margin))
+        if end_date is not None:
+            conditions.append(or_(
+                ScheduledTransaction.start_date == None,  # noqa: E711
+                ScheduledTransaction.start_date <= end_date + margin))
+
+        return self.book.query(
             ScheduledTransaction
         ).filter(
-            ScheduledTransaction.enabled == True  # noqa: E712
+            *conditions
+        ).options(
+            joinedload(ScheduledTransaction.recurrence)
         ).all()
 
-        transactions: list[ScheduledTransactionOccurences] = []
+    def _get_scheduled_window(
+            self,
+            raw_tr: ScheduledTransaction,
+            start_date: date,
+            end_date: date,
+            created: bool = False) -> tuple[date, date]:
+        """
+        Get the part of the period where the ScheduledTransaction may still have occurences
+        (None if there is none): after its start and its last created occurence (unless created),
+        until its end and its last remaining occurence
+        """
+        first_date = start_date
+        if raw_tr.start_date is not None:
+            first_date = max(first_date, raw_tr.start_date)
+        if raw_tr.last_occur is not None and not created:
+            first_date = max(first_date, raw_tr.last_occur + timedelta(days=1))
+
+        last_date = end_date
+        if raw_tr.end_date is not None:
+            last_date = min(last_date, raw_tr.end_date)
+        if raw_tr.num_occur > 0:
+            if raw_tr.rem_occur <= 0:
+                return None
+            # The remaining occurences follow the last created one (or the start)
+            next_date = raw_tr.recurrence.recurrence_period_start
+            if raw_tr.start_date is not None:
+                next_date = max(next_date, raw_tr.start_date)
+            if raw_tr.last_occur is not None:
+                next_date = max(next_date, raw_tr.last_occur + timedelta(days=1))
+            index = RecurrenceExpander.get_first_index(raw_tr.recurrence, next_date) + raw_tr.rem_occur - 1
+            last_occurence = RecurrenceExpander.get_occurence(raw_tr.recurrence, index)
+            if last_occurence is not None:
+                last_date = min(last_date, RecurrenceExpander.adjust_weekend(raw_tr.recurrence, last_occurence))
+
+        return (first_date, last_date) if first_date <= last_date else None
+
+    def _expand_scheduled_transactions(
+            self,
+            raw_transactions: list[ScheduledTransaction],
+            start_date: date,
+            end_date: date) -> list[ScheduledTransactionOccurences]:
+        """
+        Get the occurence dates, inside the period, of each ScheduledTransaction.
+        With a match tolerance, the occurences paired with a recorded instance posted on another date
+        are moved to that date (where the recorded one cancels them).
+        The already created occurences (up to last_occur) are matched too, so their instances pair with
+        them and not with the next forecast occurences, then dropped unless moved after last_occur.
+        """
+        tolerance_days = self.config.match_tolerance_days if self.config is not None else 0
+        if tolerance_days > 0:
+            # Instances around the period may be paired with occurences inside it, and the opposite:
+            # the occurences are expanded one more margin away, for the instances at the borders
+            margin = timedelta(days=tolerance_days)
+            matched = ScheduledMatcher.match(
+                occurences=self._expand_scheduled_transactions_between(
+                    raw_transactions, start_date - 2 * margin, end_date + 2 * margin, created=True),
+                recorded=self._get_recorded_instances(start_date - margin, end_date + margin),
+                tolerance_days=tolerance_days)
+
+            transactions: list[ScheduledTransactionOccurences] = []
+            for raw_tr, dates in matched:
+                first_date = start_date
+                if raw_tr.last_occur is not None:
+                    first_date = max(first_date, raw_tr.last_occur + timedelta(days=1))
+                occurences = [tr_date for tr_date in dates if tr_date >= first_date and tr_date <= end_date]
+                if len(occurences) > 0:
+                    transactions.append((raw_tr, occurences))
+            return transactions
+
+        return self._expand_scheduled_transactions_between(raw_transactions, start_date, end_date)
+
+    def _expand_scheduled_transactions_between(
+            self,
+            raw_transactions: list[ScheduledTransaction],
+            start_date: date,
+            end_date: date,
+            created: bool = False) -> list[ScheduledTransactionOccurences]:
+        """
+        Get the occurence dates, inside the period, of each ScheduledTransaction with any
+        (only the ones not created yet, unless created, within its start, end and number of occurences)
+        """
+        windows = []
         for raw_tr in raw_transactions:
-            occurences = self._get_recursive_occurences(
-                raw_tr.recurrence, start_date, end_date)
-            if len(occurences) > 0:
-                transactions.append((raw_tr, occurences))
+            window = self._get_scheduled_window(raw_tr, start_date, end_date, created=created)
+            if window is not None:
+                windows.append((raw_tr, window[0], window[1]))
+
+        # All the recurrences are expanded at once
+        occurences = RecurrenceBatchExpander.get_occurences(
+            [raw_tr.recurrence for raw_tr, _, _ in windows],
+            [window_start for _, window_start, _ in windows],
+            [window_end for _, _, window_end in windows])
+
+        transactions: list[ScheduledTransactionOccurences] = []
+        for (raw_tr, _, _), dates in zip(windows, occurences):
+            if len(dates) > 0:
+                transactions.append((raw_tr, dates))
         return transactions
 
-    def get_transaction_data(self, start_date: date, end_date: date) -> TransactionData:
-        """Gets the transaction data for a given period"""
+    def _get_recorded_instances(self, start_date: date, end_date: date) -> list[tuple[str, date]]:
+        """Get the (scheduled guid, post_date) of the recorded transactions created from a scheduled one"""
+        slots = Slot.__table__
+        return [tuple(row) for row in self.book.session.execute(select(
+            slots.c.guid_val,
+            Transaction.post_date
+        ).join_from(
+            Transaction, slots, slots.c.obj_guid == Transaction.guid
+        ).where(
+            slots.c.name == "from-sched-xaction",
+            Transaction.post_date >= start_date,
+            Transaction.post_date <= end_date
+        ))]
+
+    def _get_scheduled_transactions(self, start_date: date, end_date: date) -> list[ScheduledTransactionOccurences]:
+        """Get a list of ScheduledTransactions with their lists of occurence dates"""
+        return self._expand_scheduled_transactions(
+            self._get_scheduled_candidates(start_date, end_date), start_date, end_date)
+
+    def _get_transaction_data_config(self, start_date: date) -> TransactionDataConfig:
+        """Gets the configuration (opening balances) of a TransactionData starting at the given date"""
+        if self.config is None:
+            return None
+
+        checkings_account = self._get_account(
+            guid=self.config.checkings_parent_guid)
+        previous_date = start_date - timedelta(days=1)
+        opening_balance = self._get_opening_balance(
+            account=checkings_account, at_date=previous_date)
+
+        opening_liability = None
+        if self.config.liabilities_parent_guid is not None:
+            liability = self._get_account(
+                guid=self.config.liabilities_parent_guid)
+            opening_liability = self._get_opening_balance(
+                account=liability, at_date=previous_date)
+
+        return TransactionDataConfig(
+            opening_balance=self._to_amount(opening_balance),
+            opening_date=previous_date,
+            checkings_parent=checkings_account.fullname,
+            opening_liability=self._to_amount(opening_liability),
+            fraction=self._get_fraction(),
+            accounts=self._get_account_names(),
+            checkings_accounts=self._get_checkings_accounts())
+
+    def _get_next_transaction_data_config(
+            self,
+            previous: TransactionDataConfig,
+            start_date: date) -> TransactionDataConfig:
+        """
+        Gets the configuration of a TransactionData starting at the given date, from the
+        configuration of a previous one: only the splits posted in between are summed
+        """
+        previous_date = start_date - timedelta(days=1)
+        checkings_account = self._get_account(
+            guid=self.config.checkings_parent_guid)
+        opening_balance = previous.opening_balance + self._to_amount(self._account_balance.get_balance(
+            account=checkings_account, at_date=previous_date, from_date=previous.opening_date))
+
+        opening_liability = None
+        if self.config.liabilities_parent_guid is not None:
+            liability = self._get_account(
+                guid=self.config.liabilities_parent_guid)
+            opening_liability = previous.opening_liability + self._to_amount(self._account_balance.get_balance(
+                account=liability, at_date=previous_date, from_date=previous.opening_date))
+
+        return TransactionDataConfig(
+            opening_balance=opening_balance,
+            opening_date=previous_date,
+            checkings_parent=checkings_account.fullname,
+            opening_liability=opening_liability,
+            fraction=previous.fraction,
+            accounts=previous.accounts,
+            checkings_accounts=previous.checkings_accounts)
+
+    def _build_transaction_data(
+            self,
+            start_date: date,
+            end_date: date,
+            scheduled: list[ScheduledTransactionOccurences],
+            config: TransactionDataConfig,
+            post_dates: list[date] = None) -> TransactionData:
+        """
+        Builds the transaction data of a period (only the dates in post_dates, if given),
+        reading the recorded transactions with the configured backend
+        """
+        if self.config is not None and self.config.backend == "sql":
+            columns, recorded_scheduled_guids = self._sql_backend.get_recorded_columns(
+                start_date=start_date,
+                end_date=end_date,
+                post_dates=post_dates,
+                fraction=self._get_fraction(),
+                classifier=self._classifier,
+                directory=self._get_directory())
+
+            return TransactionData.from_columns(
+                columns=columns,
+                recorded_scheduled_guids=recorded_scheduled_guids,
+                scheduled=scheduled,
+                config=config,
+                fraction=self._get_fraction(),
+                classifier=self._classifier,
+                directory=self._get_directory(),
+                templates=self._templates)
+
         recorded = self._get_recorded_transactions(
-            start_date=start_date, end_date=end_date)
-        scheduled = self._get_scheduled_transactions(
-            start_date=start_date, end_date=end_date)
+            start_date=start_date, end_date=end_date, post_dates=post_dates)
 
         raw_data = self._get_raw_transaction_data(
             recorded=recorded, scheduled=scheduled)
 
-        config = None
-        if self.config is not None:
-            checkings_account = self._get_account(
-                guid=self.config.checkings_parent_guid)
-            previous_date = start_date - timedelta(days=1)
-            opening_balance = checkings_account.get_balance(
-                at_date=previous_date)
-
-            opening_liability = None
-            if self.config.liabilities_parent_guid is not None:
-                liability = self._get_account(
-                    guid=self.config.liabilities_parent_guid)
-                opening_liability = liability.get_balance(
-                    at_date=previous_date)
-
-            config = TransactionDataConfig(
-                opening_balance=opening_balance,
+        return TransactionData.from_rawdata(
+            data=raw_data,
+            config=config,
+            fraction=self._get_fraction(),
+            classifier=self._classifier,
+            directory=self._get_directory(),
+            templates=self._templates)
+
+    def _get_transaction_data_configs(self, start_dates: list[date]) -> dict[date, TransactionDataConfig]:
+        """Gets the configurations of TransactionData starting at each of the dates, with one query per account"""
+        if self.config is None:
+            return {start_date: None for start_date in start_dates}
+
+        previous_dates = sorted(set(start_date - timedelta(days=1) for start_date in start_dates))
+        checkings_account = self._get_account(
+            guid=self.config.checkings_parent_guid)
+        opening_balances = self._account_balance.get_balances(
+            account=checkings_account, at_dates=previous_dates)
+
+        opening_liabilities = [None] * len(previous_dates)
+        if self.config.liabilities_parent_guid is not None:
+            liability = self._get_account(
+                guid=self.config.liabilities_parent_guid)
+            opening_liabilities = self._account_balance.get_balances(
+                account=liability, at_dates=previous_dates)
+
+        accounts = self._get_account_names()
+        checkings_accounts = self._get_checkings_accounts()
+        configs = {}
+        for previous_date, opening_balance, opening_liability in zip(
+                previous_dates, opening_balances, opening_liabilities):
+            configs[previous_date + timedelta(days=1)] = TransactionDataConfig(
+                opening_balance=self._to_amount(opening_balance),
                 opening_date=previous_date,
                 checkings_parent=checkings_account.fullname,
-                opening_liability=opening_liability)
+                opening_liability=self._to_amount(opening_liability),
+                fraction=self._get_fraction(),
+                accounts=accounts,
+                checkings_accounts=checkings_accounts)
+        return configs
+
+    def _get_chunks(self, start_date: date, end_date: date, chunk_days: int = None) -> list[tuple[date, date]]:
+        """Splits the period by month (or by chunk_days days) into a list of (start, end)"""
+        chunks = []
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            if chunk_days is None:
+                next_month = date(chunk_start.year + chunk_start.month // 12, chunk_start.month % 12 + 1, 1)
+                chunk_end = next_month - timedelta(days=1)
+            else:
+                chunk_end = chunk_start + timedelta(days=chunk_days - 1)
+            chunk_end = min(chunk_end, end_date)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+        return chunks
+
+    def _get_splits_query(self, *keys):
+        """
+        Gets an aggregate query of the splits by the given keys and account: the number of splits,
+        the sums of their values and quantities, and the last enter date of their transactions
+        """
+        return select(
+            *keys,
+            Split.account_guid,
+            func.count(Split.guid),
+            func.sum(Split._value_num),
+            func.sum(Split._quantity_num),
+            func.max(Transaction.enter_date)
+        ).select_from(Split).join(
+            Transaction, Split.transaction_guid == Transaction.guid
+        ).group_by(
+            *keys,
+            Split.account_guid
+        )
+
+    def _get_splits_state(self, start_date: date = None, end_date: date = None) -> dict[date, frozenset]:
+        """Gets a checksum of the splits posted in [start_date, end_date] by post date, with a single query"""
+        query = self._get_splits_query(Transaction.post_date)
+        if start_date is not None:
+            query = query.where(Transaction.post_date >= start_date)
+        if end_date is not None:
+            query = query.where(Transaction.post_date <= end_date)
+
+        state: dict[date, set] = {}
+        for post_date, *accounts in self.book.session.execute(query):
+            state.setdefault(post_date, set()).add(tuple(accounts))
+        return {post_date: frozenset(accounts) for post_date, accounts in state.items()}
+
+    def _get_scheduled_snapshot(self) -> dict[str, tuple]:
+        """Gets the fields of every scheduled transaction, with its recurrence, by guid"""
+        rows = self.book.session.execute(select(
+            ScheduledTransaction.__table__,
+            Recurrence.recurrence_mult,
+            Recurrence.recurrence_period_type,
+            Recurrence.recurrence_period_start,
+            Recurrence.recurrence_weekend_adjust
+        ).outerjoin(
+            Recurrence, Recurrence.obj_guid == ScheduledTransaction.guid
+        ))
+        return {row[0]: tuple(row) for row in rows}
+
+    def _take_snapshot(
+            self,
+            start_date: date,
+            end_date: date,
+            data: TransactionData,
+            scheduled: list[ScheduledTransactionOccurences],
+            transactions: dict[date, frozenset] = None,
+            scheduled_snapshot: dict[str, tuple] = None,
+            templates: dict[str, CompiledTemplate] = None) -> None:
+        """Keeps the loaded data with the state of the book, for the next refresh"""
+        self._snapshot = JournalSnapshot(
+            start_date=start_date,
+            end_date=end_date,
+            data=data,
+            transactions=transactions if transactions is not None else self._get_splits_state(start_date, end_date),
+            scheduled=scheduled_snapshot if scheduled_snapshot is not None else self._get_scheduled_snapshot(),
+            occurences={tr.guid: dates for tr, dates in scheduled},
+            templates=templates if templates is not None else self._get_templates(scheduled),
+            accounts=self._get_account_names())
+
+    def _is_refreshable(self) -> bool:
+        """Whether the loads keep a snapshot of the book for refresh"""
+        return self.config is not None and self.config.refreshable
+
+    def _get_templates(self, scheduled: list[ScheduledTransactionOccurences]) -> dict[str, CompiledTemplate]:
+        """Gets the compiled template of each scheduled transaction, by guid (compiled once, see _update_templates)"""
+        return {tr.guid: self._templates.get(tr, classifier=self._classifier, directory=self._get_directory())
+                for tr, _dates in scheduled}
+
+    def _get_book_version(self, scheduled: dict[str, tuple]) -> int:
+        """
+        Gets a version of the book behind every cached interval, changing with the template slots, the account
+        names or any scheduled transaction (the splits are validated by interval, only around the requested period)
+        """
+        return hash((
+            self._templates.version,
+            frozenset(self._get_account_names().items()),
+            frozenset(scheduled.items())))
+
+    def _get_cached_transaction_data(self, start_date: date, end_date: date) -> TransactionData:
+        """
+        Gets the transaction data for a given period by stitching the cached intervals inside it:
+        only the missing ranges are read from the book (and cached)
+        """
+        scheduled_snapshot = self._get_scheduled_snapshot()
+        self._cache.set_version(self._get_book_version(scheduled_snapshot))
+        state = self._get_splits_state(start_date - self._cache.margin, end_date + self._cache.margin)
+
+        items, missing = self._cache.get(start_date=start_date, end_date=end_date, state=state)
+
+        candidates = self._get_scheduled_candidates(start_date, end_date)
+        for missing_start, missing_end in missing:
+            missing_items = self._build_transaction_data(
+                start_date=missing_start,
+                end_date=missing_end,
+                scheduled=self._expand_scheduled_transactions(candidates, missing_start, missing_end),
+                config=None).items
+            self._cache.put(start_date=missing_start, end_date=missing_end, items=missing_items, state=state)
+            items.extend(missing_items)
+
+        data = TransactionData(
+            items=sorted(items, key=lambda item: item.date),
+            config=self._get_transaction_data_config(start_date=start_date))
+
+        if self._is_refreshable():
+            self._take_snapshot(
+                start_date=start_date,
+                end_date=end_date,
+                data=data,
+                scheduled=self._expand_scheduled_transactions(candidates, start_date, end_date),
+                transactions=TransactionDataCache.get_state_between(state, start_date, end_date),
+                scheduled_snapshot=scheduled_snapshot)
+        return data
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Gets the pool of workers, each with its own read-only connection to the book, started once"""
+        if self._executor is None:
+            worker_config = dataclasses.replace(self.config, workers=None, cache_size=None, checkpoint_path=None)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.workers,
+                initializer=_init_worker,
+                initargs=(self.book.session.bind.url.render_as_string(hide_password=False), worker_config))
+        return self._executor
+
+    def _build_transaction_data_parallel(
+            self,
+            start_date: date,
+            end_date: date,
+            scheduled: list[ScheduledTransactionOccurences],
+            config: TransactionDataConfig) -> TransactionData:
+        """
+        Builds the transaction data of a period split in one partition per worker, each simplified by
+        a pool process with the occurences of the scheduled transactions inside it, and merged back in date order
+        """
+        days = (end_date - start_date).days + 1
+        partitions = self._get_chunks(start_date, end_date, chunk_days=-(-days // self.config.workers))
+        # Scheduled transactions are passed by guid, as the workers have their own session
+        partition_occurences = [[
+            (tr.guid, [tr_date for tr_date in dates if tr_date >= partition_start and tr_date <= partition_end])
+            for tr, dates in scheduled
+            if any(tr_date >= partition_start and tr_date <= partition_end for tr_date in dates)
+        ] for partition_start, partition_end in partitions]
+
+        partition_items = self._get_executor().map(
+            _build_partition,
+            [partition_start for partition_start, _partition_end in partitions],
+            [partition_end for _partition_start, partition_end in partitions],
+            partition_occurences)
+        items = [item for items in partition_items for item in items]
+
+        return TransactionData(items=items, config=config)
+
+    def get_transaction_data(self, start_date: date, end_date: date) -> TransactionData:
+        """Gets the transaction data for a given period"""
+        self._update_templates()
+        if self._cache is not None:
+            return self._get_cached_transaction_data(start_date=start_date, end_date=end_date)
+
+        scheduled = self._get_scheduled_transactions(
+            start_date=start_date, end_date=end_date)
+        config = self._get_transaction_data_config(start_date=start_date)
+
+        if self.config is not None and self.config.workers is not None and self.config.workers > 1:
+            data = self._build_transaction_data_parallel(
+                start_date=start_date,
+                end_date=end_date,
+                scheduled=scheduled,
+                config=config)
+        else:
+            data = self._build_transaction_data(
+                start_date=start_date,
+                end_date=end_date,
+                scheduled=scheduled,
+                config=config)
+
+        if self._is_refreshable():
+            self._take_snapshot(start_date=start_date, end_date=end_date, data=data, scheduled=scheduled)
+        return data
+
+    def refresh(self) -> TransactionData:
+        """
+        Updates the transaction data last loaded by get_transaction_data (with a refreshable config)
+        with the changes made to the book since.
+        Only the dates whose splits changed inside the period (new, deleted, edited or moved transactions,
+        compared by aggregate), and the occurences of the scheduled transactions whose fields, template or
+        occurences changed, are read again, and the balances are only recomputed from the earliest of them
+        (or from the start, if the opening balances changed).
+        The whole period is read again when an account was renamed or moved, as every item holds full names.
+        """
+        last = self._snapshot
+        if last is None:
+            raise AttributeError("Nothing to refresh: no transaction data was loaded yet with a refreshable config")
+
+        self._reload()
+        self._account_balance.expire()
+        if self._get_account_names() != last.accounts:
+            return self.get_transaction_data(start_date=last.start_date, end_date=last.end_date)
+
+        transactions = self._get_splits_state(last.start_date, last.end_date)
+        changed_dates = set(
+            post_date for post_date in set(transactions) | set(last.transactions)
+            if transactions.get(post_date) != last.transactions.get(post_date))
+
+        scheduled_snapshot = self._get_scheduled_snapshot()
+        scheduled = self._get_scheduled_transactions(
+            start_date=last.start_date, end_date=last.end_date)
+        occurences = {tr.guid: dates for tr, dates in scheduled}
+        templates = self._get_templates(scheduled)
+        for guid in set(scheduled_snapshot) | set(last.scheduled):
+            # The occurences also move when their pairing with recorded instances changes
+            if (scheduled_snapshot.get(guid) != last.scheduled.get(guid)
+                    or occurences.get(guid) != last.occurences.get(guid)
+                    or templates.get(guid) != last.templates.get(guid)):
+                changed_dates.update(last.occurences.get(guid, []))
+                changed_dates.update(occurences.get(guid, []))
+
+        # Computed again (from the checkpoints, if any) rather than comparing every split posted before the period
+        config = self._get_transaction_data_config(start_date=last.start_date)
+
+        post_dates = sorted(changed_dates)
+
+        data = last.data
+        if len(post_dates) > 0 or config != last.data.config:
+            items = []
+            if len(post_dates) > 0:
+                changed = set(post_dates)
+                changed_scheduled = []
+                for tr, dates in scheduled:
+                    changed_occurences = [tr_date for tr_date in dates if tr_date in changed]
+                    if len(changed_occurences) > 0:
+                        changed_scheduled.append((tr, changed_occurences))
+
+                items = self._build_transaction_data(
+                    start_date=post_dates[0],
+                    end_date=post_dates[-1],
+                    scheduled=changed_scheduled,
+                    config=config,
+                    post_dates=post_dates).items
+
+            items = sorted(
+                [item for item in last.data.items if item.date not in changed_dates] + items,
+                key=lambda item: item.date)
+            data = last.data.patch(
+                items=items,
+                from_date=post_dates[0] if len(post_dates) > 0 else last.start_date,
+                config=config)
+
+        self._take_snapshot(
+            start_date=last.start_date,
+            end_date=last.end_date,
+            data=data,
+            scheduled=scheduled,
+            transactions=transactions,
+            scheduled_snapshot=scheduled_snapshot,
+            templates=templates)
+        return data
+
+    def get_transaction_data_many(self, windows: list[tuple[date, date]]) -> list[TransactionData]:
+        """
+        Gets the transaction data for each of the (start_date, end_date) windows, in the same order.
+        The transactions of the whole range are read (and the recurrences expanded) once,
+        then split by window, and all the opening balances are computed together.
+        """
+        if len(windows) == 0:
+            return []
+
+        self._update_templates()
+        range_start = min(start_date for start_date, _end_date in windows)
+        range_end = max(end_date for _start_date, end_date in windows)
+        scheduled = self._get_scheduled_transactions(
+            start_date=range_start, end_date=range_end)
+        items = self._build_transaction_data(
+            start_date=range_start,
+            end_date=range_end,
+            scheduled=scheduled,
+            config=None).items
+        dates = [item.date for item in items]
+
+        configs = self._get_transaction_data_configs(
+            start_dates=[start_date for start_date, _end_date in windows])
+
+        return [TransactionData(
+            items=items[bisect.bisect_left(dates, start_date):bisect.bisect_right(dates, end_date)],
+            config=configs[start_date]) for start_date, end_date in windows]
+
+    def get_transaction_data_iter(
+            self,
+            start_date: date,
+            end_date: date,
+            chunk_days: int = None) -> Iterator[TransactionData]:
+        """
+        Yields the transaction data for a given period in chunks, by month or by chunk_days days.
+        Each chunk carries its own opening balances, so it can be consumed (and released)
+        before the next one is loaded.
+        """
+        self._update_templates()
+        candidates = self._get_scheduled_candidates(start_date, end_date)
+
+        config = None
+        for chunk_start, chunk_end in self._get_chunks(start_date, end_date, chunk_days):
+            if config is None:
+                config = self._get_transaction_data_config(start_date=chunk_start)
+            else:
+                config = self._get_next_transaction_data_config(previous=config, start_date=chunk_start)
 
-        return TransactionData.from_rawdata(data=raw_data, config=config)
+            yield self._build_transaction_data(
+                start_date=chunk_start,
+                end_date=chunk_end,
+                scheduled=self._expand_scheduled_transactions(candidates, chunk_start, chunk_end),
+                config=config)
@@ -15,6 +15,11 @@ Describes the raw data needed to create a TransactionData
 RawTransactionData = dict[date,
                           tuple[list[Transaction], list[ScheduledTransaction]]]
 
+"""
+Describes a ScheduledTransaction with the list of its occurence dates
+"""
+ScheduledTransactionOccurences = tuple[ScheduledTransaction, list[date]]
+
 
 class BalanceType(Enum):
     """
@@ -20,7 +20,8 @@ def dash_test():
         "/Users/guilherme.vieiraschwade/Documents/Personal/Gnucash/personal-sqlite.gnucash", open_if_lock=True)
     config = TransactionJournalConfig(
         checkings_parent_guid="3838edd7804247868ebed2d2404d4c26",
-        liabilities_parent_guid="44a238b52fdd44c6bad26b9eb5efc219"
+        liabilities_parent_guid="44a238b52fdd44c6bad26b9eb5efc219",
+        eager_load=True
     )
     journal = TransactionJournal(book=book, config=config)
 
@@ -0,0 +1,199 @@
+from datetime import date
+from decimal import Decimal
+import shutil
+
+import piecash
+from piecash.core.transaction import Split, Transaction
+import pytest
+from unittest.mock import patch
+
+from core.account_balance import AccountBalance
+from core.balance_checkpoint import BalanceCheckpointStore
+from tests.test_piecash_helper import sample_data_path
+
+
+class TestAccountBalance:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self, tmp_path):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, self.book_path)
+        self.book = piecash.open_book(self.book_path, open_if_lock=True, readonly=False)
+        self.checkpoints = BalanceCheckpointStore.for_book(self.book_path)
+        yield  # this is where the testing happens
+        # Teardown
+        self.checkpoints.close()
+        self.book.close()
+
+    def add_transaction(self, post_date: date, value: Decimal):
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+        food = self.book.accounts(fullname="Expenses:Food")
+        Transaction(
+            currency=checkings.commodity,
+            description="Backdated",
+            post_date=post_date,
+            splits=[
+                Split(account=checkings, value=-value),
+                Split(account=food, value=value)
+            ])
+        self.book.save()
+
+    def test_get_raw_balances(self):
+        """should return the cumulative balance at each date with a single query"""
+        balance = AccountBalance(self.book)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_raw_balances(
+            checkings, [date(2021, 9, 9), date(2021, 9, 15), date(2022, 1, 2)]
+        ) == [Decimal(0), Decimal(950), Decimal(514)]
+        assert balance.get_raw_balances(
+            checkings, [date(2021, 9, 21), date(2022, 1, 2)], from_date=date(2021, 9, 15)
+        ) == [Decimal(-316), Decimal(-436)]
+
+    def test_get_balance_with_checkpoints(self):
+        """should return the same balances as piecash, storing month-end checkpoints"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+
+        for fullname in ["Assets:Checkings", "Liabilities"]:
+            account = self.book.accounts(fullname=fullname)
+            for at_date in [date(2021, 9, 15), date(2021, 10, 10), date(2022, 1, 2), date(2022, 3, 1)]:
+                assert balance.get_balance(account, at_date) == account.get_balance(at_date=at_date)
+
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+        assert self.checkpoints.get_checkpoint(checkings.guid, date(2022, 3, 1)) == (
+            date(2022, 2, 28), Decimal(514))
+
+    def test_get_balance_invalidates_checkpoints(self):
+        """should invalidate the checkpoints after a transaction posted before them"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_balance(checkings, date(2021, 9, 30)) == Decimal(634)
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+        self.add_transaction(post_date=date(2021, 10, 15), value=Decimal(14))
+
+        assert self.checkpoints.get_checkpoint(checkings.guid, date(2022, 3, 1)) is not None
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(500)
+        # The checkpoint before the new transaction is kept
+        assert self.checkpoints.get_checkpoint(checkings.guid, date(2021, 10, 31)) == (
+            date(2021, 9, 30), Decimal(634))
+        assert balance.get_balance(checkings, date(2021, 9, 30)) == Decimal(634)
+
+    def test_get_balance_clears_checkpoints_on_deletion(self):
+        """should clear every checkpoint when transactions are deleted"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+        transaction = self.book.transactions(description="SplitTransferName1")
+        self.book.delete(transaction)
+        self.book.save()
+
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(624)
+
+    def test_get_balance_invalidates_checkpoints_on_edit(self):
+        """should invalidate the checkpoints from the month of an edited split amount"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_balance(checkings, date(2021, 8, 31)) == Decimal(0)
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+        transaction = self.book.transactions(description="CheckingsExpenseFood1")
+        for split in transaction.splits:
+            split.value = split.value * 2
+            split.quantity = split.quantity * 2
+        self.book.save()
+
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(464)
+        # The checkpoint before the edited month is kept
+        assert self.checkpoints.get_checkpoint(checkings.guid, date(2022, 1, 10)) == (
+            date(2021, 8, 31), Decimal(0))
+        assert balance.get_balance(checkings, date(2021, 9, 30)) == Decimal(584)
+
+    def test_get_balance_clears_checkpoints_on_move(self):
+        """should clear every checkpoint when an account is moved to another subtree"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_balance(checkings, date(2021, 12, 31)) == Decimal(624)
+
+        self.book.accounts(fullname="Assets:Savings").parent = checkings
+        self.book.save()
+
+        assert balance.get_balance(checkings, date(2021, 12, 31)) == Decimal(1290)
+
+    def test_get_balance_clears_checkpoints_on_external_move(self):
+        """should clear every checkpoint when an account was moved by another session, once expired"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        assert balance.get_balance(checkings, date(2021, 12, 31)) == Decimal(624)
+
+        other_book = piecash.open_book(self.book_path, open_if_lock=True, readonly=False)
+        other_book.accounts(fullname="Assets:Savings").parent = other_book.accounts(fullname="Assets:Checkings")
+        other_book.save()
+        other_book.close()
+        balance.expire()
+
+        assert balance.get_balance(checkings, date(2021, 12, 31)) == Decimal(1290)
+
+    def test_get_balance_invalidates_checkpoints_on_rollback(self):
+        """should invalidate the checkpoints stored with flushed changes that are then rolled back"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+        food = self.book.accounts(fullname="Expenses:Food")
+
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+        Transaction(
+            currency=checkings.commodity,
+            description="Rolled back",
+            post_date=date(2021, 10, 15),
+            splits=[
+                Split(account=checkings, value=Decimal(-14)),
+                Split(account=food, value=Decimal(14))
+            ])
+        self.book.flush()
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(500)
+        self.book.cancel()
+
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+    def test_close(self):
+        """should stop tracking the changes of the session and using the checkpoints"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(514)
+
+        balance.close()
+        self.checkpoints.close()
+        self.add_transaction(post_date=date(2021, 10, 15), value=Decimal(14))
+
+        assert balance.checkpoints is None
+        assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(500)
+
+    def test_get_balance_syncs_once(self):
+        """should validate the checkpoints against the book on the first lookup and after expire only"""
+        balance = AccountBalance(self.book, checkpoints=self.checkpoints)
+        checkings = self.book.accounts(fullname="Assets:Checkings")
+
+        with patch.object(AccountBalance, "get_book_state", autospec=True,
+                          side_effect=AccountBalance.get_book_state) as mock_get_book_state:
+            for at_date in [date(2021, 9, 15), date(2021, 10, 10), date(2022, 3, 1)]:
+                balance.get_balance(checkings, at_date)
+            assert mock_get_book_state.call_count == 1
+
+            # The commits of the session are tracked instead
+            self.add_transaction(post_date=date(2021, 10, 15), value=Decimal(14))
+            assert balance.get_balance(checkings, date(2022, 3, 1)) == Decimal(500)
+            balance.get_balance(checkings, date(2022, 3, 1))
+            assert mock_get_book_state.call_count == 1
+
+            balance.expire()
+            balance.get_balance(checkings, date(2022, 3, 1))
+            assert mock_get_book_state.call_count == 2
@@ -0,0 +1,71 @@
+from datetime import date
+
+from piecash.core.account import Account
+from piecash.core.transaction import ScheduledTransaction, Transaction
+import pytest
+
+from core import AccountDirectory, SimpleTransaction
+from core.query_counter import QueryCounter
+from tests.test_piecash_helper import TestPiecashHelper
+
+
+class TestAccountDirectory:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.book = TestPiecashHelper.open_book()
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_from_book(self):
+        """should load every account of the book in a single query, as piecash resolves them"""
+        with QueryCounter(self.book) as counter:
+            directory = AccountDirectory.from_book(self.book)
+        assert counter.count == 1
+
+        accounts = self.book.query(Account).all()
+        assert len(directory) == len(accounts)
+        for account in accounts:
+            entry = directory[account.guid]
+            assert entry.fullname == (account.fullname if account.parent is not None else "")
+            assert entry.type == account.type
+            assert entry.parent_guid == (account.parent.guid if account.parent is not None else None)
+            if account.commodity is not None:
+                assert entry.commodity_guid == account.commodity.guid
+                assert entry.fraction == account.commodity.fraction
+
+        hierarchy = directory.get_hierarchy()
+        assert hierarchy is directory.get_hierarchy()
+        assert "24b92fc00a9440c2856281f6eb093536" in hierarchy.get_subtree("24b92fc00a9440c2856281f6eb093536")
+
+    def test_simplify(self):
+        """should simplify the same transactions with the directory, without loading the accounts"""
+        directory = AccountDirectory.from_book(self.book)
+        recorded = self.book.query(Transaction).filter(Transaction.post_date <= date(2022, 6, 30)).all()
+        scheduled = self.book.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+
+        with QueryCounter(self.book) as counter:
+            for tr in recorded:
+                tr.splits
+            count = counter.count
+            simplified = []
+            for tr in recorded:
+                try:
+                    simplified.extend(SimpleTransaction.simplify_record(tr, directory=directory))
+                except AttributeError:
+                    pass
+        assert counter.count == count
+
+        expected = []
+        for tr in recorded:
+            try:
+                expected.extend(SimpleTransaction.simplify_record(tr))
+            except AttributeError:
+                pass
+        assert len(simplified) > 0
+        assert simplified == expected
+        assert SimpleTransaction.simplify_scheduled_record(scheduled, directory=directory) == \
+            SimpleTransaction.simplify_scheduled_record(scheduled)
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from core import AccountDirectory, AccountHierarchy
+from tests.test_piecash_helper import TestPiecashHelper
+
+
+class TestAccountHierarchy:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.hierarchy = AccountHierarchy({
+            "root": None,
+            "assets": "root",
+            "checkings": "assets",
+            "checkings-sub": "checkings",
+            "checkings-2": "assets",
+            "expenses": "root"
+        })
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_get_subtree(self):
+        """should return the account with all its descendants"""
+        assert self.hierarchy.get_subtree("checkings") == {"checkings", "checkings-sub"}
+        assert self.hierarchy.get_subtree("assets") == {"assets", "checkings", "checkings-sub", "checkings-2"}
+        assert self.hierarchy.get_subtree("unknown") == set()
+
+    def test_is_descendant_name(self):
+        """should not consider the siblings sharing a prefix as descendants"""
+        assert AccountHierarchy.is_descendant_name("Assets:Checkings", "Assets:Checkings")
+        assert AccountHierarchy.is_descendant_name("Assets:Checkings:Sub", "Assets:Checkings")
+        assert not AccountHierarchy.is_descendant_name("Assets:Checkings 2", "Assets:Checkings")
+        assert not AccountHierarchy.is_descendant_name(None, "Assets:Checkings")
+
+    def test_is_in_subtree(self):
+        """should test a whole guid column at once"""
+        guids = pd.Series(["checkings-sub", "checkings-2", None, "checkings"], dtype="category")
+        subtree = self.hierarchy.get_subtree("checkings")
+
+        assert list(AccountHierarchy.is_in_subtree(guids, subtree)) == [True, False, False, True]
+        assert list(AccountHierarchy.is_in_subtree(guids.to_numpy(), subtree)) == [True, False, False, True]
+
+    def test_are_descendant_names(self):
+        """should test a whole full name column at once, as is_descendant_name"""
+        names = ["Assets:Checkings", "Assets:Checkings:Sub", "Assets:Checkings 2", None, "Expenses"]
+
+        assert list(AccountHierarchy.are_descendant_names(names, "Assets:Checkings")) == [
+            AccountHierarchy.is_descendant_name(name, "Assets:Checkings") for name in names]
+
+    def test_from_directory(self):
+        """should index the accounts of the book"""
+        hierarchy = AccountDirectory.from_book(TestPiecashHelper.open_book()).get_hierarchy()
+
+        subtree = hierarchy.get_subtree("24b92fc00a9440c2856281f6eb093536")
+        assert "24b92fc00a9440c2856281f6eb093536" in subtree
+        assert all(subtree.issuperset(hierarchy.get_subtree(guid)) for guid in subtree)
+        assert len(hierarchy.descendants) > len(subtree)
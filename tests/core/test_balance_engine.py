@@ -0,0 +1,106 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from core import BalanceEngine, SimpleTransaction, TransactionDataItem, TransactionType
+from core import TransactionJournal, TransactionJournalConfig
+from tests.test_piecash_helper import TestPiecashHelper
+import pytest
+
+
+class TestBalanceEngine:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_get_item_balances(self):
+        """should return the same balances as each TransactionDataItem"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536"))
+        items = journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30)).items
+
+        balances = BalanceEngine.get_item_balances(items=items, checkings_parent="Assets:Checkings")
+
+        assert len(balances) == len(items)
+        for index, item in enumerate(items):
+            expected = item.get_balance(checkings_parent="Assets:Checkings")
+            assert balances.has_checkings[index] == (expected.checkings is not None)
+            if expected.checkings is not None:
+                assert balances.checkings_recorded[index] == expected.checkings.recorded
+                assert balances.checkings_scheduled[index] == expected.checkings.scheduled
+            assert balances.has_liability[index] == (expected.liability is not None)
+            if expected.liability is not None:
+                assert balances.liability_recorded[index] == expected.liability.recorded
+                assert balances.liability_scheduled[index] == expected.liability.scheduled
+
+    def test_get_item_balances_running(self):
+        """should accumulate the running balances from the given state, skipping empty items"""
+        items = [
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=Decimal(100), transaction_type=TransactionType.INCOME),
+                SimpleTransaction(value=Decimal(30), transaction_type=TransactionType.QUITTANCE)
+            ]),
+            TransactionDataItem(date=date(2000, 10, 11)),
+            TransactionDataItem(date=date(2000, 10, 12), transactions=[
+                SimpleTransaction(value=Decimal(20), transaction_type=TransactionType.EXPENSE, is_scheduled=True)
+            ])
+        ]
+
+        balances = BalanceEngine.get_item_balances(items=items, state=(Decimal(1000), Decimal(1000), 0, 0))
+
+        assert list(balances.has_checkings) == [True, False, True]
+        assert list(balances.checkings) == [Decimal(1070), Decimal(1070), Decimal(1070)]
+        assert list(balances.scheduled_checkings) == [Decimal(1070), Decimal(1070), Decimal(1050)]
+        assert list(balances.has_liability) == [True, False, False]
+        assert list(balances.liability) == [Decimal(-30), Decimal(-30), Decimal(-30)]
+        assert balances.get_state(1) == (Decimal(1070), Decimal(1070), Decimal(-30), Decimal(-30))
+
+    def test_get_item_balances_minor_units(self):
+        """should compute int64 balances from minor units, raising OverflowError if they may not fit"""
+        items = [
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=10050, transaction_type=TransactionType.INCOME),
+                SimpleTransaction(value=3025, transaction_type=TransactionType.QUITTANCE)
+            ]),
+            TransactionDataItem(date=date(2000, 10, 12), transactions=[
+                SimpleTransaction(value=2000, transaction_type=TransactionType.EXPENSE, is_scheduled=True)
+            ])
+        ]
+
+        balances = BalanceEngine.get_item_balances(items=items, state=(100000, 100000, 0, 0), minor_units=True)
+
+        assert balances.checkings.dtype == np.int64
+        assert list(balances.checkings) == [107025, 107025]
+        assert list(balances.scheduled_checkings) == [107025, 105025]
+        assert list(balances.liability) == [-3025, -3025]
+        with pytest.raises(OverflowError):
+            BalanceEngine.get_item_balances(items=items, state=(2 ** 63 - 1, 0, 0, 0), minor_units=True)
+
+    def test_get_item_balances_checkings_accounts(self):
+        """should only count the transfers of the checkings subtree, by guid or by full name"""
+        items = [
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=Decimal(300), from_account="Checkings:Sub", from_account_guid="sub",
+                                  to_account="Savings", to_account_guid="savings",
+                                  transaction_type=TransactionType.TRANSFER),
+                SimpleTransaction(value=Decimal(50), from_account="Checkings 2", from_account_guid="checkings-2",
+                                  to_account="Checkings", to_account_guid="checkings",
+                                  transaction_type=TransactionType.TRANSFER)
+            ])
+        ]
+
+        by_name = BalanceEngine.get_item_balances(items=items, checkings_parent="Checkings")
+        by_guid = BalanceEngine.get_item_balances(
+            items=items, checkings_parent="Checkings", checkings_accounts=frozenset(["checkings", "sub"]))
+
+        assert list(by_name.checkings_recorded) == [Decimal(-250)]
+        assert list(by_guid.checkings_recorded) == [Decimal(-250)]
+        assert items[0].get_balance(checkings_parent="Checkings").checkings.recorded == Decimal(-250)
+        assert items[0].get_balance(
+            checkings_accounts=frozenset(["checkings", "sub"])).checkings.recorded == Decimal(-250)
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from core import Money
+
+
+class TestMoney:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_to_minor(self):
+        """should convert exact amounts to minor units, and reject the other ones"""
+        assert Money.to_minor(Decimal("12.34"), 100) == 1234
+        assert Money.to_minor(Decimal("-0.5"), 100) == -50
+        assert Money.to_minor(Decimal(7), 1) == 7
+        with pytest.raises(ValueError):
+            Money.to_minor(Decimal("0.125"), 100)
+        with pytest.raises(OverflowError):
+            Money.to_minor(Decimal(2 ** 62), 100)
+
+    def test_from_ratio(self):
+        """should convert GnuCash num/denom amounts to minor units"""
+        assert Money.from_ratio(1234, 100, 100) == 1234
+        assert Money.from_ratio(-5, 10, 100) == -50
+        with pytest.raises(ValueError):
+            Money.from_ratio(1, 1000, 100)
+
+    def test_to_decimal(self):
+        """should convert minor units back to the exact Decimal amount"""
+        assert Money.to_decimal(1234, 100) == Decimal("12.34")
+        assert Money.to_decimal(np.int64(-50), 100) == Decimal("-0.5")
+
+    def test_check_sums(self):
+        """should raise OverflowError only when the sums may exceed the int64 bounds"""
+        Money.check_sums(np.array([2 ** 60, -2 ** 60], dtype=np.int64), (2 ** 61,))
+        Money.check_sums(np.array([], dtype=np.int64))
+        with pytest.raises(OverflowError):
+            Money.check_sums(np.array([2 ** 62, 2 ** 62], dtype=np.int64))
+        with pytest.raises(OverflowError):
+            Money.check_sums(np.array([2 ** 62], dtype=np.int64), (2 ** 62,))
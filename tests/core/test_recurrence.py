@@ -0,0 +1,204 @@
+from datetime import date, timedelta
+import random
+from unittest.mock import patch
+
+import pytest
+
+from core.recurrence import RecurrenceBatchExpander, RecurrenceExpander
+from mock_recurrence import MockRecurrence
+
+
+def get_recurrence(period_type: str, start: date, mult: int = 1, weekend_adjust: str = "none") -> MockRecurrence:
+    recurrence = MockRecurrence()
+    recurrence.recurrence_mult = mult
+    recurrence.recurrence_period_type = period_type
+    recurrence.recurrence_period_start = start
+    recurrence.recurrence_weekend_adjust = weekend_adjust
+    return recurrence
+
+
+class TestRecurrenceExpander:
+
+    def test_get_occurences_once(self):
+        """should return the start date only once, if inside the window"""
+        recurrence = get_recurrence("once", date(2021, 9, 21))
+
+        assert RecurrenceExpander.get_occurences(
+            recurrence, date(2021, 9, 1), date(2021, 12, 31)) == [date(2021, 9, 21)]
+        assert RecurrenceExpander.get_occurences(
+            recurrence, date(2021, 10, 1), date(2021, 12, 31)) == []
+
+    def test_get_occurences_daily(self):
+        """should return every mult days since the start"""
+        recurrence = get_recurrence("day", date(2021, 9, 1), mult=3)
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 9, 5), date(2021, 9, 15)) == [
+            date(2021, 9, 7),
+            date(2021, 9, 10),
+            date(2021, 9, 13)
+        ]
+
+    def test_get_occurences_weekly(self):
+        """should return every mult weeks since the start"""
+        recurrence = get_recurrence("week", date(2021, 9, 1), mult=2)
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 9, 2), date(2021, 10, 31)) == [
+            date(2021, 9, 15),
+            date(2021, 9, 29),
+            date(2021, 10, 13),
+            date(2021, 10, 27)
+        ]
+
+    def test_get_occurences_monthly_clamped(self):
+        """should clamp to the month length without losing the start day"""
+        recurrence = get_recurrence("month", date(2021, 1, 30))
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 2, 1), date(2021, 4, 30)) == [
+            date(2021, 2, 28),
+            date(2021, 3, 30),
+            date(2021, 4, 30)
+        ]
+
+    def test_get_occurences_monthly_last_day(self):
+        """should behave as end of month when starting on the last day of a month"""
+        recurrence = get_recurrence("month", date(2021, 4, 30))
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 5, 1), date(2021, 6, 30)) == [
+            date(2021, 5, 31),
+            date(2021, 6, 30)
+        ]
+
+    def test_get_occurences_end_of_month(self):
+        """should accept both spellings of the end of month period"""
+        for period_type in ["end of month", "end_of_month"]:
+            recurrence = get_recurrence(period_type, date(2021, 9, 15))
+
+            assert RecurrenceExpander.get_occurences(recurrence, date(2021, 11, 20), date(2022, 2, 28)) == [
+                date(2021, 11, 30),
+                date(2021, 12, 31),
+                date(2022, 1, 31),
+                date(2022, 2, 28)
+            ]
+
+    def test_get_occurences_nth_weekday(self):
+        """should return the same nth weekday of each month"""
+        # Third tuesday
+        recurrence = get_recurrence("nth weekday", date(2021, 9, 21))
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 10, 1), date(2021, 12, 31)) == [
+            date(2021, 10, 19),
+            date(2021, 11, 16),
+            date(2021, 12, 21)
+        ]
+
+    def test_get_occurences_last_weekday(self):
+        """should return the last weekday of each month"""
+        # Last friday
+        recurrence = get_recurrence("last weekday", date(2021, 9, 24))
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 10, 1), date(2021, 12, 31)) == [
+            date(2021, 10, 29),
+            date(2021, 11, 26),
+            date(2021, 12, 31)
+        ]
+
+    def test_get_occurences_yearly(self):
+        """should return the yearly occurences, clamping leap days"""
+        recurrence = get_recurrence("year", date(2020, 2, 29))
+
+        assert RecurrenceExpander.get_occurences(recurrence, date(2021, 1, 1), date(2024, 12, 31)) == [
+            date(2021, 2, 28),
+            date(2022, 2, 28),
+            date(2023, 2, 28),
+            date(2024, 2, 29)
+        ]
+
+    def test_get_occurences_weekend_adjust(self):
+        """should move weekend occurences back or forward"""
+        # 2021-10-02 is a saturday and 2021-10-03 a sunday
+        back = get_recurrence("day", date(2021, 10, 2), weekend_adjust="back")
+        forward = get_recurrence("day", date(2021, 10, 2), weekend_adjust="forward")
+
+        assert RecurrenceExpander.get_occurences(back, date(2021, 10, 1), date(2021, 10, 3)) == [
+            date(2021, 10, 1),
+            date(2021, 10, 1)
+        ]
+        assert RecurrenceExpander.get_occurences(forward, date(2021, 10, 4), date(2021, 10, 4)) == [
+            date(2021, 10, 4),
+            date(2021, 10, 4),
+            date(2021, 10, 4)
+        ]
+        # Occurences moved outside of the window are dropped
+        assert RecurrenceExpander.get_occurences(forward, date(2021, 10, 2), date(2021, 10, 3)) == []
+
+    def test_get_occurences_jumps_to_window(self):
+        """should only compute the occurences around the window, no matter how old the start is"""
+        recurrence = get_recurrence("month", date(1912, 10, 15))
+
+        with patch.object(RecurrenceExpander, "get_occurence", wraps=RecurrenceExpander.get_occurence) as mock:
+            occurences = RecurrenceExpander.get_occurences(recurrence, date(2023, 1, 1), date(2023, 12, 31))
+
+        assert len(occurences) == 12
+        assert mock.call_count <= len(occurences) + 3
+
+    def test_get_next_occurence(self):
+        """should step to the next occurence, keeping the start day"""
+        recurrence = get_recurrence("month", date(2021, 1, 30))
+
+        assert RecurrenceExpander.get_next_occurence(recurrence, date(2021, 1, 30)) == date(2021, 2, 28)
+        assert RecurrenceExpander.get_next_occurence(recurrence, date(2021, 2, 28)) == date(2021, 3, 30)
+
+
+class TestRecurrenceBatchExpander:
+
+    def test_get_occurences(self):
+        """should return the same occurences as RecurrenceExpander, for each recurrence and its window"""
+        rng = random.Random(42)
+        period_types = ["day", "week", "month", "end of month", "end_of_month", "year",
+                        "once", "nth weekday", "last weekday"]
+        # Month ends and leap days, plus random days
+        starts = [date(2020, 1, 31), date(2020, 2, 29), date(2021, 2, 28), date(2021, 4, 30), date(2021, 8, 31),
+                  date(2021, 1, 30), date(2021, 10, 2), date(2021, 10, 3)]
+        starts = starts + [date(2018, 1, 1) + timedelta(days=rng.randrange(2500)) for _ in range(40)]
+
+        recurrences, start_dates, end_dates = [], [], []
+        for start in starts:
+            for period_type in period_types:
+                for weekend_adjust in ["none", "back", "forward"]:
+                    recurrences.append(get_recurrence(
+                        period_type, start, mult=rng.choice([1, 1, 2, 3, 6]), weekend_adjust=weekend_adjust))
+                    start_date = date(2017, 6, 1) + timedelta(days=rng.randrange(3000))
+                    start_dates.append(start_date)
+                    end_dates.append(start_date + timedelta(days=rng.randrange(800)))
+
+        occurences = RecurrenceBatchExpander.get_occurences(recurrences, start_dates, end_dates)
+
+        assert len(occurences) == len(recurrences)
+        for recurrence, start_date, end_date, dates in zip(recurrences, start_dates, end_dates, occurences):
+            assert dates == RecurrenceExpander.get_occurences(recurrence, start_date, end_date)
+            assert all(isinstance(occurence, date) for occurence in dates)
+        assert sum(len(dates) for dates in occurences) > 0
+
+    def test_get_occurences_month_end(self):
+        """should clamp the monthly occurences to the month length, as RecurrenceExpander"""
+        recurrences = [get_recurrence("month", date(2021, 1, 30)), get_recurrence("month", date(2021, 4, 30))]
+
+        assert RecurrenceBatchExpander.get_occurences(
+            recurrences, [date(2021, 2, 1)] * 2, [date(2021, 5, 31)] * 2) == [
+            [date(2021, 2, 28), date(2021, 3, 30), date(2021, 4, 30), date(2021, 5, 30)],
+            [date(2021, 4, 30), date(2021, 5, 31)]
+        ]
+
+    def test_get_occurences_empty(self):
+        """should return an empty list for recurrences without occurences in their window"""
+        recurrences = [get_recurrence("month", date(2022, 1, 15)), get_recurrence("day", date(2022, 1, 15))]
+
+        assert RecurrenceBatchExpander.get_occurences(
+            recurrences, [date(2021, 1, 1)] * 2, [date(2021, 12, 31)] * 2) == [[], []]
+        assert RecurrenceBatchExpander.get_occurences([], [], []) == []
+
+    def test_get_occurences_unknown(self):
+        """should raise an AttributeError for an unknown period of recurrence"""
+        with pytest.raises(AttributeError):
+            RecurrenceBatchExpander.get_occurences(
+                [get_recurrence("fortnight", date(2021, 1, 1))], [date(2021, 1, 1)], [date(2021, 12, 31)])
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from piecash.core.transaction import ScheduledTransaction
+import pytest
+
+from core import CompiledTemplate, ScheduledFormula, ScheduledTemplateCache, SimpleTransaction
+from tests.test_piecash_helper import TestPiecashHelper
+
+
+class TestScheduledFormula:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_evaluate(self):
+        """should evaluate arithmetic formulas exactly, with the usual precedence"""
+        assert ScheduledFormula.compile("830.04").evaluate() == Decimal("830.04")
+        assert ScheduledFormula.compile("0.1 + 0.2").evaluate() == Decimal("0.3")
+        assert ScheduledFormula.compile("2 + 3 * 4").evaluate() == Decimal(14)
+        assert ScheduledFormula.compile("(2 + 3) * 4").evaluate() == Decimal(20)
+        assert ScheduledFormula.compile("-10 / 4").evaluate() == Decimal("-2.5")
+        assert ScheduledFormula.compile(" 12 ").evaluate() == Decimal(12)
+
+    def test_evaluate_variables(self):
+        """should evaluate formulas with the values of their variables"""
+        formula = ScheduledFormula.compile("rent * 1.02 + fees")
+        assert formula.variables == frozenset(["rent", "fees"])
+        assert formula.evaluate({"rent": Decimal("800"), "fees": "14.04"}) == Decimal("830.04")
+        assert formula.evaluate({"rent": 800.5, "fees": 0}) == Decimal("816.510")
+
+        with pytest.raises(ValueError):
+            formula.evaluate({"rent": Decimal("800")})
+
+    def test_compile_cached(self):
+        """should compile a formula once per text"""
+        assert ScheduledFormula.compile("a + 1") is ScheduledFormula.compile("a + 1")
+
+    def test_compile_unsupported(self):
+        """should reject anything other than arithmetic"""
+        for text in ["__import__('os')", "a.b", "2 ** 8", "[1]", "a if b else c", "'1'", "1 +", "True", "a < b"]:
+            with pytest.raises(ValueError):
+                ScheduledFormula.compile(text)
+
+    def test_evaluate_division_by_zero(self):
+        """should raise a ValueError when dividing by zero"""
+        with pytest.raises(ValueError):
+            ScheduledFormula.compile("1 / (a - a)").evaluate({"a": 1})
+
+    def test_template_formula(self):
+        """should evaluate the formulas with variables of a template at each occurence"""
+        book = TestPiecashHelper.open_book()
+        scheduled = book.query(ScheduledTransaction).filter(ScheduledTransaction.name == "SampledScheduled").one()
+        expected = SimpleTransaction.simplify_scheduled_record(scheduled)
+
+        with book.session.no_autoflush:
+            for split in scheduled.template_account.splits:
+                slots = split["sched-xaction"]
+                for side in ["debit", "credit"]:
+                    if slots["{}-numeric".format(side)].value > 0:
+                        slots["{}-formula".format(side)].value = "base + extra"
+            template = CompiledTemplate.compile(scheduled)
+
+        assert len(template.formulas) == 1
+        assert template.fractions == (100,)
+        assert template.get_values() == [expected[0].value]
+        assert template.get_values({"base": Decimal("820"), "extra": Decimal("10.04")}) == [Decimal("830.04")]
+        # Rounded half up to the fraction of the commodity
+        assert template.get_values({"base": Decimal(100) / 3, "extra": Decimal(0)}) == [Decimal("33.33")]
+        assert template.get_values({"base": Decimal("0.125"), "extra": Decimal(0)}) == [Decimal("0.13")]
+
+        cache = ScheduledTemplateCache(variables={"base": Decimal("820"), "extra": Decimal("10.04")})
+        cache._templates[scheduled.guid] = (cache.get_fingerprint(scheduled), template)
+        result = SimpleTransaction.simplify_scheduled_record(scheduled, fraction=100, templates=cache)
+        assert [tr.value for tr in result] == [83004]
+        assert result[0].to_account == expected[0].to_account
+        assert result[0].from_account == expected[0].from_account
+
+    def test_template_formula_unbound(self):
+        """should report the formulas without value for their variables, or that can't be compiled"""
+        book = TestPiecashHelper.open_book()
+        scheduled = book.query(ScheduledTransaction).filter(ScheduledTransaction.name == "SampledScheduled").one()
+        cache = ScheduledTemplateCache()
+        assert cache.get(scheduled) is not None
+        assert cache.get_report() == ""
+
+        with book.session.no_autoflush:
+            for split in scheduled.template_account.splits:
+                slots = split["sched-xaction"]
+                for side in ["debit", "credit"]:
+                    if slots["{}-numeric".format(side)].value > 0:
+                        # As GnuCash saves a formula with variables
+                        slots["{}-numeric".format(side)].value = Decimal(0)
+                        slots["{}-formula".format(side)].value = "rent"
+            template = CompiledTemplate.compile(scheduled)
+            cache._templates[scheduled.guid] = (cache.get_fingerprint(scheduled), template)
+
+            assert SimpleTransaction.simplify_scheduled_record(scheduled, templates=cache)[0].value == Decimal(0)
+            assert cache.get_report() == \
+                "SampledScheduled ({}): No value for rent in formula 'rent': 0 is used".format(scheduled.guid)
+
+            cache.variables = {"rent": Decimal("830.04")}
+            assert SimpleTransaction.simplify_scheduled_record(scheduled, templates=cache)[0].value == \
+                Decimal("830.04")
+            assert cache.get_report() == ""
+
+            for split in scheduled.template_account.splits:
+                slots = split["sched-xaction"]
+                for side in ["debit", "credit"]:
+                    if slots["{}-formula".format(side)].value == "rent":
+                        slots["{}-formula".format(side)].value = "rent ** 2"
+            template = CompiledTemplate.compile(scheduled)
+            cache._templates[scheduled.guid] = (cache.get_fingerprint(scheduled), template)
+
+        assert len(template.unsupported) == 2
+        assert cache.get_report().splitlines() == [
+            "SampledScheduled ({}): Unsupported 'rent ** 2' in formula 'rent ** 2'".format(scheduled.guid)] * 2
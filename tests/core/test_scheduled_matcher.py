@@ -0,0 +1,57 @@
+from datetime import date
+from types import SimpleNamespace
+
+from core import ScheduledMatcher
+import pytest
+
+
+class TestScheduledMatcher:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.monthly = SimpleNamespace(guid="monthly")
+        self.weekly = SimpleNamespace(guid="weekly")
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_match(self):
+        """should move each occurence paired with a recorded instance to its post date"""
+        occurences = [
+            (self.monthly, [date(2022, 1, 1), date(2022, 2, 1), date(2022, 3, 1)]),
+            (self.weekly, [date(2022, 1, 7), date(2022, 1, 14)])
+        ]
+        recorded = [
+            ("monthly", date(2022, 2, 3)),
+            ("monthly", date(2021, 12, 30)),
+            ("weekly", date(2022, 1, 14)),
+            ("other", date(2022, 1, 14))
+        ]
+
+        result = ScheduledMatcher.match(occurences, recorded, tolerance_days=3)
+
+        assert result == [
+            (self.monthly, [date(2021, 12, 30), date(2022, 2, 3), date(2022, 3, 1)]),
+            (self.weekly, [date(2022, 1, 7), date(2022, 1, 14)])
+        ]
+
+    def test_match_outside_tolerance(self):
+        """should keep the occurences without a recorded instance close enough"""
+        occurences = [(self.monthly, [date(2022, 1, 1), date(2022, 2, 1)])]
+
+        assert ScheduledMatcher.match(occurences, [("monthly", date(2022, 1, 5))], tolerance_days=3) == occurences
+        assert ScheduledMatcher.match(occurences, [("monthly", date(2022, 1, 5))], tolerance_days=0) == occurences
+
+    def test_match_once(self):
+        """should pair each occurence with a single recorded instance, the earliest first"""
+        occurences = [(self.weekly, [date(2022, 1, 7), date(2022, 1, 14), date(2022, 1, 21)])]
+        recorded = [
+            ("weekly", date(2022, 1, 8)),
+            ("weekly", date(2022, 1, 8)),
+            ("weekly", date(2022, 1, 8))
+        ]
+
+        result = ScheduledMatcher.match(occurences, recorded, tolerance_days=6)
+
+        assert result == [(self.weekly, [date(2022, 1, 8), date(2022, 1, 8), date(2022, 1, 21)])]
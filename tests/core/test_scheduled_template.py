@@ -0,0 +1,83 @@
+from piecash.core.transaction import ScheduledTransaction
+import pytest
+
+from core import AccountDirectory, CompiledTemplate, ScheduledTemplateCache, SimpleTransaction
+from core.query_counter import QueryCounter
+from core.typings import TransactionType
+from tests.test_piecash_helper import TestPiecashHelper
+
+
+class TestScheduledTemplate:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.book = TestPiecashHelper.open_book()
+        self.scheduled = self.book.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_compile(self):
+        """should parse the template splits into pairs of accounts by amount"""
+        template = CompiledTemplate.compile(self.scheduled)
+
+        assert template.guid == self.scheduled.guid
+        assert template.name == "SampledScheduled"
+        assert len(template.pairs) == 1
+        value, from_account, _from_guid, to_account, _to_guid, transaction_type = template.pairs[0]
+        result = SimpleTransaction.simplify_scheduled_record(self.scheduled)[0]
+        assert value == result.value
+        assert from_account == result.from_account
+        assert to_account == result.to_account
+        assert transaction_type == TransactionType.EXPENSE
+
+    def test_get_cached(self):
+        """should compile a template once per guid, and reuse it without queries"""
+        cache = ScheduledTemplateCache()
+        directory = AccountDirectory.from_book(self.book)
+        template = cache.get(self.scheduled, directory=directory)
+
+        with QueryCounter(self.book) as counter:
+            for _ in range(10):
+                assert cache.get(self.scheduled, directory=directory) is template
+        assert counter.count == 0
+        assert len(cache) == 1
+
+    def test_get_changed(self):
+        """should compile a template again when its scheduled transaction changes"""
+        cache = ScheduledTemplateCache()
+        template = cache.get(self.scheduled)
+
+        self.scheduled.name = "RenamedScheduled"
+        changed = cache.get(self.scheduled)
+        assert changed is not template
+        assert changed.name == "RenamedScheduled"
+        assert len(cache) == 1
+
+    def test_set_version(self):
+        """should drop the compiled templates when the version changes, and only then"""
+        cache = ScheduledTemplateCache()
+        cache.set_version(1)
+        template = cache.get(self.scheduled)
+
+        cache.set_version(1)
+        assert cache.get(self.scheduled) is template
+
+        cache.set_version(2)
+        assert len(cache) == 0
+        assert cache.get(self.scheduled) is not template
+
+    def test_simplify_scheduled_record(self):
+        """should simplify every scheduled transaction as without templates"""
+        cache = ScheduledTemplateCache()
+        directory = AccountDirectory.from_book(self.book)
+        for tr in self.book.query(ScheduledTransaction).all():
+            try:
+                expected = SimpleTransaction.simplify_scheduled_record(tr, fraction=100)
+            except AttributeError:
+                continue
+            for _ in range(2):
+                assert SimpleTransaction.simplify_scheduled_record(
+                    tr, fraction=100, directory=directory, templates=cache) == expected
@@ -212,3 +212,14 @@ class TestSimpleTransaction:
         assert transaction.transaction_type == TransactionType.EXPENSE
         assert transaction.value == Decimal(432)
         assert transaction.is_scheduled == True  # noqa E712
+
+    def test_compact(self):
+        """
+        should not hold a __dict__ and share a single copy of the account names and guids
+        """
+        first = SimpleTransaction(value=1, from_account="".join(["Assets:", "Checkings"]), to_account_guid="ab" * 16)
+        second = SimpleTransaction(value=2, from_account="".join(["Assets:", "Checkings"]), to_account_guid="ab" * 16)
+
+        assert not hasattr(first, "__dict__")
+        assert first.from_account is second.from_account
+        assert first.to_account_guid is second.to_account_guid
@@ -0,0 +1,78 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from core import SimpleTransaction, TransactionClassifier, TransactionType
+import pytest
+
+
+class TestTransactionClassifier:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.classifier = TransactionClassifier()
+        self.checkings = SimpleNamespace(guid="checkings", type="BANK", fullname="Assets:Checkings")
+        self.savings = SimpleNamespace(guid="savings", type="ASSET", fullname="Assets:Savings")
+        self.food = SimpleNamespace(guid="food", type="EXPENSE", fullname="Expenses:Food")
+        self.salary = SimpleNamespace(guid="salary", type="INCOME", fullname="Income:Salary")
+        self.card = SimpleNamespace(guid="card", type="LIABILITY", fullname="Liabilities:Card")
+        self.equity = SimpleNamespace(guid="equity", type="EQUITY", fullname="Equity:Opening")
+        yield  # this is where the testing happens
+        # Teardown
+
+    def test_classify(self):
+        """should classify the pairs of accounts by their types"""
+        assert self.classifier.classify(to_account=self.food, from_account=self.checkings) == TransactionType.EXPENSE
+        assert self.classifier.classify(to_account=self.food, from_account=self.card) == TransactionType.LIABILITY
+        assert self.classifier.classify(to_account=self.card, from_account=self.checkings) == TransactionType.QUITTANCE
+        assert self.classifier.classify(to_account=self.checkings, from_account=self.salary) == TransactionType.INCOME
+        assert self.classifier.classify(to_account=self.savings, from_account=self.checkings) == \
+            TransactionType.TRANSFER
+        assert self.classifier.unclassified == {}
+        assert self.classifier.get_report() == ""
+
+    def test_classify_unclassified(self):
+        """should count the unclassified pairs as expenses, and report them once per pair"""
+        for reference in ["first", "second"]:
+            assert self.classifier.classify(
+                to_account=self.equity, from_account=self.checkings, reference=reference) == TransactionType.EXPENSE
+
+        assert list(self.classifier.unclassified) == [("Assets:Checkings", "Equity:Opening")]
+        assert self.classifier.get_report() == \
+            "Assets:Checkings -> Equity:Opening: 2 transaction(s) counted as expenses, first: first"
+
+        self.classifier.clear()
+        assert self.classifier.get_report() == ""
+
+    def test_classify_unclassified_again(self):
+        """should count a transaction simplified again only once"""
+        for reference in ["first", "second", "first", "second"]:
+            self.classifier.classify(to_account=self.equity, from_account=self.checkings, reference=reference)
+
+        assert self.classifier.get_report() == \
+            "Assets:Checkings -> Equity:Opening: 2 transaction(s) counted as expenses, first: first"
+
+    def test_get_split_pairs(self):
+        """should collect the unclassified pairs of the split pairs in the given classifier"""
+        pairs = SimpleTransaction.get_split_pairs(
+            splits=[(Decimal(10), self.equity), (Decimal(-10), self.checkings)],
+            reference="reference",
+            classifier=self.classifier)
+
+        assert pairs == [(Decimal(10), self.checkings, self.equity, TransactionType.EXPENSE)]
+        assert self.classifier.unclassified == {("Assets:Checkings", "Equity:Opening"): {"reference": None}}
+
+    def test_skip(self):
+        """should report the skipped transactions once each, after the unclassified pairs"""
+        self.classifier.classify(to_account=self.equity, from_account=self.checkings, reference="first")
+        for reason in ["Missing to_account for first", "Missing from_account for second"] * 2:
+            self.classifier.skip(reason)
+
+        assert self.classifier.get_report().splitlines() == [
+            "Assets:Checkings -> Equity:Opening: 1 transaction(s) counted as expenses, first: first",
+            "Skipped: Missing to_account for first",
+            "Skipped: Missing from_account for second"]
+
+        self.classifier.clear()
+        assert self.classifier.get_report() == ""
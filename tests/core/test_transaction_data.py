@@ -1,9 +1,12 @@
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
+import json
 from unittest.mock import MagicMock, patch
 
+import pandas as pd
+
 from core import (
-    Balance, BalanceData, TransactionDataItem,
+    BalanceEngine, SimpleTransaction, TransactionDataItem, TransactionType,
     BalanceType, RawTransactionData, TransactionData,
     TransactionDataConfig)
 from tests.test_piecash_helper import TestPiecashHelper
@@ -52,6 +55,108 @@ class TestTransactionData:
 
         assert len(result.get_dataframe()) == 0
 
+    def test_get_dataframe_dtypes(self):
+        """should return a row per transaction, with explicit dtypes"""
+        result = TransactionData(items=[
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=Decimal(12)),
+                SimpleTransaction(value=Decimal("10.5"), description="Food", transaction_type=TransactionType.EXPENSE)
+            ]),
+            TransactionDataItem(date=date(2000, 10, 11), transactions=[
+                SimpleTransaction(value=Decimal(20), transaction_type=TransactionType.INCOME, is_scheduled=True)
+            ])
+        ])
+
+        df = result.get_dataframe()
+
+        assert len(df) == 3
+        assert list(df.columns) == [
+            'value', 'is_scheduled', 'description', 'from_account', 'from_account_guid',
+            'to_account', 'to_account_guid', 'transaction_type', 'date']
+        assert str(df['date'].dtype) == 'datetime64[ns]'
+        assert str(df['transaction_type'].dtype) == 'category'
+        assert df['value'][1] == Decimal("10.5")
+        assert list(df['date']) == [pd.Timestamp(2000, 10, 10), pd.Timestamp(2000, 10, 10), pd.Timestamp(2000, 10, 11)]
+        assert list(df['is_scheduled']) == [False, False, True]
+        assert pd.isna(df['description'][0])
+        assert pd.isna(df['transaction_type'][0])
+        assert df['transaction_type'][2] == TransactionType.INCOME.name
+        assert list(df['transaction_type'].cat.categories) == [tr_type.name for tr_type in TransactionType]
+
+    def test_get_dataframe_account_categories(self):
+        """should share the accounts of the book and of the rows as categories of both account columns"""
+        config = TransactionDataConfig(
+            opening_balance=Decimal(0), opening_date=date(2000, 10, 9), accounts={"c": "C", "a": "A"})
+        result = TransactionData(config=config, items=[
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=Decimal(10), description="Rent", from_account="A", from_account_guid="a",
+                                  to_account="B", to_account_guid="b", transaction_type=TransactionType.EXPENSE)
+            ])
+        ])
+
+        df = result.get_dataframe()
+
+        for column in ['description', 'from_account', 'from_account_guid', 'to_account', 'to_account_guid']:
+            assert str(df[column].dtype) == 'category'
+        assert list(df['from_account'].cat.categories) == ["A", "B", "C"]
+        assert list(df['to_account'].cat.categories) == ["A", "B", "C"]
+        assert list(df['to_account_guid'].cat.categories) == ["a", "b", "c"]
+        assert df['to_account'][0] == "B"
+
+        loaded = TransactionData.from_dataframe(
+            df=pd.read_json(df.to_json(orient="split"), orient="split"), config=config)
+        assert loaded.items[0].transactions == result.items[0].transactions
+
+    def test_from_dataframe(self):
+        """should load one item per date, keeping the order of the rows inside a date"""
+        df = pd.DataFrame({
+            'value': [10.5, 20, 30],
+            'is_scheduled': [False, True, False],
+            'description': ["Second", "Third", "First"],
+            'from_account': ["A", "A", "B"],
+            'from_account_guid': ["a", "a", "b"],
+            'to_account': ["B", "B", "A"],
+            'to_account_guid': ["b", "b", "a"],
+            'transaction_type': [
+                {"name": "EXPENSE", "value": "expense"},
+                TransactionType.INCOME,
+                {"name": "TRANSFER", "value": "transfer"}
+            ],
+            'date': pd.to_datetime([date(2000, 10, 11), date(2000, 10, 11), date(2000, 10, 10)])
+        })
+
+        result = TransactionData.from_dataframe(df=df)
+
+        assert [item.date for item in result.items] == [pd.Timestamp(2000, 10, 10), pd.Timestamp(2000, 10, 11)]
+        assert [tr.description for tr in result.items[1].transactions] == ["Second", "Third"]
+        assert result.items[0].transactions[0] == SimpleTransaction(
+            value=Decimal(30), description="First", from_account="B", from_account_guid="b",
+            to_account="A", to_account_guid="a", transaction_type=TransactionType.TRANSFER)
+        assert result.items[1].transactions[0].value == Decimal(10.5)
+        assert result.items[1].transactions[0].transaction_type == TransactionType.EXPENSE
+        assert result.items[1].transactions[1].is_scheduled
+        assert TransactionData.from_dataframe(df=pd.DataFrame()).items == []
+
+    def test_minor_units_json(self):
+        """should keep int minor units through the json serialization and convert them to Decimal for display"""
+        config = TransactionDataConfig(
+            opening_balance=230000, opening_date=datetime(2000, 10, 9), opening_liability=-5050, fraction=100)
+        data = TransactionData(config=config, items=[
+            TransactionDataItem(date=date(2000, 10, 10), transactions=[
+                SimpleTransaction(value=12345, description="Rent", from_account="A", from_account_guid="a",
+                                  to_account="B", to_account_guid="b", transaction_type=TransactionType.EXPENSE)])])
+
+        loaded_config = TransactionDataConfig.from_dict(json.loads(json.dumps(config.to_json())))
+        loaded = TransactionData.from_dataframe(
+            df=pd.read_json(data.get_dataframe().to_json(orient="split"), orient="split"), config=loaded_config)
+
+        assert loaded_config == config
+        assert loaded.items[0].transactions == data.items[0].transactions
+        assert isinstance(loaded.items[0].transactions[0].value, int)
+        df = loaded.get_balance_data()
+        assert list(df['balance']) == [230000, 217655, -5050]
+        assert list(loaded.to_decimal(df['balance'])) == [Decimal("2300"), Decimal("2176.55"), Decimal("-50.5")]
+
     def test_get_balance_data_with_config_empty(self):
         """should return the correct balance data for empty object with config"""
         dic: RawTransactionData = dict([])
@@ -67,17 +172,15 @@ class TestTransactionData:
         assert df['diff'][0] == Decimal(0)
         assert df['balance'][0] == Decimal(400)
 
-    @patch.object(TransactionDataItem, 'get_balance')
-    def test_get_balance_data_with_no_scheduled(self, mock_get_balance: MagicMock):
+    def test_get_balance_data_with_no_scheduled(self):
         """should return the balance data when we have only the open config"""
-        checkings = Balance(recorded=Decimal(-1000), scheduled=Decimal(-1000))
-        mock_get_balance.return_value = BalanceData(checkings=checkings)
-
         dic: RawTransactionData = dict([])
         result = TransactionData.from_rawdata(data=dic)
 
         result.items = [
-            TransactionDataItem.from_transactions(date(2000, 10, 10), [], [])
+            TransactionDataItem(date(2000, 10, 10), [
+                SimpleTransaction(value=Decimal(1000), transaction_type=TransactionType.EXPENSE)
+            ])
         ]
 
         df = result.get_balance_data()
@@ -91,19 +194,17 @@ class TestTransactionData:
         assert df['balance'][0] == Decimal(-1000)
         assert not df['scheduled'][0]
 
-    @patch.object(TransactionDataItem, 'get_balance')
-    def test_get_balance_data_with_config(self, mock_get_balance: MagicMock):
+    def test_get_balance_data_with_config(self):
         """should return the balance data for recorded tx + config"""
-        checkings = Balance(recorded=Decimal(-1000), scheduled=Decimal(-1000))
-        mock_get_balance.return_value = BalanceData(checkings=checkings)
-
         dic: RawTransactionData = dict([])
         config = TransactionDataConfig(opening_balance=Decimal(
             2300), opening_date=date(2000, 11, 10))
         result = TransactionData.from_rawdata(data=dic, config=config)
 
         result.items = [
-            TransactionDataItem.from_transactions(date(2000, 10, 10), [], [])
+            TransactionDataItem(date(2000, 10, 10), [
+                SimpleTransaction(value=Decimal(1000), transaction_type=TransactionType.EXPENSE)
+            ])
         ]
 
         df = result.get_balance_data()
@@ -120,33 +221,38 @@ class TestTransactionData:
         assert df['balance'][1] == Decimal(1300)
         assert not df['scheduled'][1]
 
-    @patch.object(TransactionDataItem, 'get_balance')
-    def test_get_balance_data_with_checkings_config(self, mock_get_balance: MagicMock):
-        """should indicate to the transaction items the checkings parent account"""
+    def test_get_balance_data_with_checkings_config(self):
+        """should use the checkings parent account for the transfers"""
         dic: RawTransactionData = dict([])
         config = TransactionDataConfig(opening_balance=Decimal(
             2300), opening_date=date(2000, 11, 10), checkings_parent="MY_CHECKINGS")
         result = TransactionData.from_rawdata(data=dic, config=config)
 
         result.items = [
-            TransactionDataItem.from_transactions(date(2000, 10, 10), [], [])
+            TransactionDataItem(date(2000, 10, 10), [
+                SimpleTransaction(value=Decimal(300), from_account="MY_CHECKINGS:Sub", to_account="SAVINGS",
+                                  transaction_type=TransactionType.TRANSFER),
+                SimpleTransaction(value=Decimal(50), from_account="MY_CHECKINGS", to_account="MY_CHECKINGS:Sub",
+                                  transaction_type=TransactionType.TRANSFER)
+            ])
         ]
 
-        result.get_balance_data()
+        df = result.get_balance_data()
 
-        mock_get_balance.assert_called_with(checkings_parent="MY_CHECKINGS")
+        assert len(df) == 2
+        assert df['diff'][1] == Decimal(-300)
+        assert df['balance'][1] == Decimal(2000)
 
-    @patch.object(TransactionDataItem, 'get_balance')
-    def test_get_balance_data_with_scheduled(self, mock_get_balance: MagicMock):
+    def test_get_balance_data_with_scheduled(self):
         """should return correct balance data when having scheduled data"""
-        checkings = Balance(recorded=Decimal(-1000), scheduled=Decimal(-5000))
-        mock_get_balance.return_value = BalanceData(checkings=checkings)
-
         dic: RawTransactionData = dict([])
         result = TransactionData.from_rawdata(data=dic)
 
         result.items = [
-            TransactionDataItem.from_transactions(date(2000, 10, 10), [], [])
+            TransactionDataItem(date(2000, 10, 10), [
+                SimpleTransaction(value=Decimal(1000), transaction_type=TransactionType.EXPENSE),
+                SimpleTransaction(value=Decimal(4000), transaction_type=TransactionType.EXPENSE, is_scheduled=True)
+            ])
         ]
 
         df = result.get_balance_data()
@@ -163,17 +269,16 @@ class TestTransactionData:
         assert df['balance'][1] == Decimal(-6000)
         assert df['scheduled'][1]
 
-    @patch.object(TransactionDataItem, 'get_balance')
-    def test_get_balance_data_with_liability(self, mock_get_balance: MagicMock):
+    def test_get_balance_data_with_liability(self):
         """should return the correct balance for liability"""
-        liability = Balance(recorded=Decimal(1000), scheduled=Decimal(5000))
-        mock_get_balance.return_value = BalanceData(liability=liability)
-
         dic: RawTransactionData = dict([])
         result = TransactionData.from_rawdata(data=dic)
 
         result.items = [
-            TransactionDataItem.from_transactions(date(2000, 10, 10), [], [])
+            TransactionDataItem(date(2000, 10, 10), [
+                SimpleTransaction(value=Decimal(1000), transaction_type=TransactionType.LIABILITY),
+                SimpleTransaction(value=Decimal(4000), transaction_type=TransactionType.LIABILITY, is_scheduled=True)
+            ])
         ]
 
         df = result.get_balance_data()
@@ -206,4 +311,30 @@ class TestTransactionData:
         assert df['diff'][1] == Decimal(0)
         assert df['balance'][1] == Decimal(5000)
         assert not df['scheduled'][1]
-        assert df['type'][1] == BalanceType.LIABILITIES
\ No newline at end of file
+        assert df['type'][1] == BalanceType.LIABILITIES
+
+    @patch.object(BalanceEngine, 'get_item_balances', side_effect=BalanceEngine.get_item_balances)
+    def test_patch(self, mock_get_item_balances: MagicMock):
+        """should only compute the balances of the items from the patched date onward"""
+        config = TransactionDataConfig(opening_balance=Decimal(5000), opening_date=date(2000, 10, 9))
+
+        def get_item(item_date: date):
+            return TransactionDataItem(date=item_date, transactions=[
+                SimpleTransaction(value=Decimal(1000), transaction_type=TransactionType.EXPENSE)])
+
+        first = get_item(date(2000, 10, 10))
+        second = get_item(date(2000, 10, 11))
+        result = TransactionData(items=[first, second], config=config)
+        result.get_balance_data()
+        mock_get_item_balances.reset_mock()
+
+        third = get_item(date(2000, 10, 12))
+        patched = result.patch(items=[first, third], from_date=date(2000, 10, 11))
+
+        mock_get_item_balances.assert_called_once()
+        assert mock_get_item_balances.call_args.kwargs["items"] == [third]
+        assert patched.config == config
+        df = patched.get_balance_data()
+        mock_get_item_balances.assert_called_once()
+        assert list(df['date']) == [date(2000, 10, 9), date(2000, 10, 10), date(2000, 10, 12)]
+        assert list(df['balance']) == [Decimal(5000), Decimal(4000), Decimal(3000)]
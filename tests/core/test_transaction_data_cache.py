@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from core import CacheStats, SimpleTransaction, TransactionDataCache, TransactionDataItem
+import pytest
+
+
+class TestTransactionDataCache:
+
+    @pytest.fixture(autouse=True)
+    def before_each(self):
+        """Fixture to execute asserts before and after a test is run"""
+        # Setup
+        self.cache = TransactionDataCache(max_size=10 ** 6)
+        self.cache.set_version(1)
+        yield  # this is where the testing happens
+        # Teardown
+
+    def get_items(self, dates: list[date]) -> list[TransactionDataItem]:
+        return [TransactionDataItem(date=item_date, transactions=[SimpleTransaction(value=Decimal(10))])
+                for item_date in dates]
+
+    def test_get_missing(self):
+        """should return the whole period as missing when nothing is cached"""
+        items, missing = self.cache.get(date(2021, 1, 1), date(2021, 8, 31))
+
+        assert items == []
+        assert missing == [(date(2021, 1, 1), date(2021, 8, 31))]
+        assert self.cache.stats == CacheStats(misses=1)
+
+    def test_get_stitched(self):
+        """should stitch the cached intervals and return only the uncovered ranges as missing"""
+        self.cache.put(date(2021, 1, 1), date(2021, 8, 31), self.get_items([date(2021, 1, 5), date(2021, 8, 31)]))
+        self.cache.put(date(2021, 10, 1), date(2021, 10, 31), self.get_items([date(2021, 10, 2)]))
+
+        items, missing = self.cache.get(date(2021, 3, 1), date(2021, 12, 31))
+
+        assert [item.date for item in items] == [date(2021, 8, 31), date(2021, 10, 2)]
+        assert missing == [
+            (date(2021, 9, 1), date(2021, 9, 30)),
+            (date(2021, 11, 1), date(2021, 12, 31))
+        ]
+
+        items, missing = self.cache.get(date(2021, 1, 1), date(2021, 8, 31))
+
+        assert len(items) == 2
+        assert missing == []
+        assert self.cache.stats == CacheStats(hits=1, partial_hits=1)
+
+    def test_get_invalidated(self):
+        """should drop the cached intervals whose splits changed inside the requested period (or the margin)"""
+        self.cache = TransactionDataCache(max_size=10 ** 6, margin=timedelta(days=2))
+        state = {date(2021, 1, 5): frozenset({("a", 1)}), date(2021, 1, 30): frozenset({("b", 2)})}
+        self.cache.put(date(2021, 1, 1), date(2021, 1, 25), self.get_items([date(2021, 1, 5)]), state=state)
+        self.cache.put(date(2021, 2, 1), date(2021, 2, 28), self.get_items([date(2021, 2, 3)]), state=state)
+
+        changed = {**state, date(2021, 1, 30): frozenset({("b", 3)})}
+        items, missing = self.cache.get(date(2021, 1, 1), date(2021, 2, 28), state=changed)
+
+        assert [item.date for item in items] == [date(2021, 1, 5)]
+        assert missing == [(date(2021, 1, 26), date(2021, 2, 28))]
+        assert len(self.cache) == 1
+        assert self.cache.stats.invalidations == 1
+
+    def test_set_version(self):
+        """should drop the cached intervals of another version of the book"""
+        self.cache.put(date(2021, 1, 1), date(2021, 8, 31), self.get_items([date(2021, 1, 5)]))
+        self.cache.set_version(1)
+        assert len(self.cache) == 1
+
+        self.cache.set_version(2)
+        assert len(self.cache) == 0
+        assert self.cache.size == 0
+
+    def test_put_evicts_least_recently_used(self):
+        """should evict the least recently used intervals when over the size limit"""
+        january = self.get_items([date(2021, 1, day) for day in range(1, 11)])
+        size = TransactionDataCache.get_size(january)
+        self.cache = TransactionDataCache(max_size=int(size * 2.5))
+
+        self.cache.put(date(2021, 1, 1), date(2021, 1, 31), january)
+        february = self.get_items([date(2021, 2, day) for day in range(1, 11)])
+        self.cache.put(date(2021, 2, 1), date(2021, 2, 28), february)
+        self.cache.get(date(2021, 1, 1), date(2021, 1, 31))
+        march = self.get_items([date(2021, 3, day) for day in range(1, 11)])
+        self.cache.put(date(2021, 3, 1), date(2021, 3, 31), march)
+
+        assert len(self.cache) == 2
+        assert self.cache.size <= self.cache.max_size
+        assert self.cache.stats.evictions == 1
+        assert self.cache.get(date(2021, 2, 1), date(2021, 2, 28))[1] == [(date(2021, 2, 1), date(2021, 2, 28))]
+        assert self.cache.get(date(2021, 1, 1), date(2021, 1, 31))[1] == []
@@ -1,7 +1,7 @@
 from datetime import date
 from decimal import Decimal
 
-from core import TransactionDataItem
+from core import SimpleTransaction, TransactionDataItem
 import pytest
 
 from tests.test_piecash_helper import TestPiecashHelper
@@ -34,6 +34,19 @@ class TestTransactionDataItem:
 
         assert len(data_item.transactions) == 5
 
+    def test_remove_scheduled_guid_repeated(self, piecash_helper: TestPiecashHelper):
+        """should cancel one scheduled occurence per recorded instance of the scheduled transaction"""
+        scheduled = piecash_helper.get_scheduled_already_recorded()
+        simplified = SimpleTransaction.simplify_scheduled_record(scheduled)
+
+        data_item = TransactionDataItem.from_simplified(
+            date(2000, 10, 10),
+            recorded=[],
+            recorded_scheduled_guids=[scheduled.guid, scheduled.guid],
+            scheduled=[scheduled, scheduled, scheduled])
+
+        assert data_item.transactions == simplified
+
     def test_get_balance_with_expenses(self, piecash_helper: TestPiecashHelper):
         """should return negative balances for expenses (scheduled and or recorded)"""
         scheduled = []
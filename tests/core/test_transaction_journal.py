@@ -1,13 +1,21 @@
+import dataclasses
 from datetime import date
 from decimal import Decimal
+import shutil
+import sqlite3
+
+import numpy as np
+import piecash
 
 from piecash.core.account import Account
+from piecash.core.commodity import Commodity
 from core import TransactionJournalConfig, RawTransactionData
-from tests.test_piecash_helper import TestPiecashHelper
-from piecash.core.transaction import ScheduledTransaction, Transaction
+from tests.test_piecash_helper import TestPiecashHelper, sample_data_path
+from piecash.core.transaction import ScheduledTransaction, Split, Transaction
 import pytest
 from sqlalchemy.sql.expression import or_
-from core import TransactionJournal
+from core import BalanceEngine, TransactionData, TransactionJournal, TransactionDataItem
+from core.query_counter import QueryCounter
 from piecash.core.book import Book
 from mock_alchemy.mocking import AlchemyMagicMock
 from mock_recurrence import MockRecurrence
@@ -41,13 +49,19 @@ class TestTransactionJournal:
             Transaction.post_date >= start_date, Transaction.post_date <= end_date)
 
     def test__get_scheduled_transactions_filter_candidates(self):
-        """should return scheduled transactions enabled inside a date range"""
+        """should return scheduled transactions enabled, not exhausted and not out of a date range"""
         start_date = date(2021, 9, 10)
         end_date = date(2021, 9, 20)
         self.testClass._get_scheduled_transactions(start_date, end_date)
 
         self.mockBook.session.query.return_value.filter.assert_called_once_with(
-            ScheduledTransaction.enabled == True  # noqa: E712
+            ScheduledTransaction.enabled == True,  # noqa: E712
+            or_(ScheduledTransaction.num_occur == 0, ScheduledTransaction.rem_occur > 0),
+            or_(ScheduledTransaction.end_date == None,  # noqa: E711
+                ScheduledTransaction.last_occur == None,  # noqa: E711
+                ScheduledTransaction.end_date > ScheduledTransaction.last_occur),
+            or_(ScheduledTransaction.end_date == None, ScheduledTransaction.end_date >= start_date),  # noqa: E711
+            or_(ScheduledTransaction.start_date == None, ScheduledTransaction.start_date <= end_date)  # noqa: E711
         )
 
     def test__get_recursive_occurences_monthly_in(self):
@@ -249,7 +263,7 @@ class TestTransactionJournal:
             Account.guid == "ThisAccountGuid"
         )
 
-    @patch.object(Account, 'get_balance')
+    @patch.object(TransactionJournal, '_get_opening_balance')
     @patch.object(TransactionJournal, '_get_account')
     @patch.object(TransactionJournal, '_get_raw_transaction_data')
     @patch.object(TransactionJournal, '_get_scheduled_transactions')
@@ -259,7 +273,7 @@ class TestTransactionJournal:
                                   mock__get_scheduled_transactions: MagicMock,
                                   mock__get_raw_transaction_data: MagicMock,
                                   mock__get_account: MagicMock,
-                                  mock_get_balance: MagicMock,
+                                  mock__get_opening_balance: MagicMock,
                                   piecash_helper: TestPiecashHelper):
         """should call the correct internal methods to generate the data"""
         # Arrange
@@ -270,14 +284,13 @@ class TestTransactionJournal:
         assert cls._get_scheduled_transactions is mock__get_scheduled_transactions
         assert cls._get_raw_transaction_data is mock__get_raw_transaction_data
         assert cls._get_account is mock__get_account
+        assert cls._get_opening_balance is mock__get_opening_balance
 
         checkings_account: Account = piecash_helper.get_checkings_account()
-        assert checkings_account.get_balance == mock_get_balance
-
         mock__get_recorded_transactions.return_value = 6666
         mock__get_scheduled_transactions.return_value = 7777
         mock__get_account.return_value = checkings_account
-        mock_get_balance.return_value = Decimal(1234560)
+        mock__get_opening_balance.return_value = Decimal(1234560)
 
         # Act
         data = cls.get_transaction_data(start_date=date(
@@ -285,18 +298,19 @@ class TestTransactionJournal:
 
         # Test
         mock__get_recorded_transactions.assert_called_once_with(
-            start_date=date(2000, 10, 10), end_date=date(2000, 11, 20))
+            start_date=date(2000, 10, 10), end_date=date(2000, 11, 20), post_dates=None)
         mock__get_scheduled_transactions.assert_called_once_with(
             start_date=date(2000, 10, 10), end_date=date(2000, 11, 20))
         mock__get_raw_transaction_data.assert_called_once_with(
             recorded=6666, scheduled=7777)
         mock__get_account.assert_called_once_with(guid="abcdefsdfs")
+        mock__get_opening_balance.assert_called_once_with(account=checkings_account, at_date=date(2000, 10, 9))
 
         assert data.config.opening_date == date(2000, 10, 9)
         assert data.config.opening_balance == Decimal(1234560)
         assert data.config.checkings_parent == "Assets:Checkings"
 
-    @patch.object(Account, 'get_balance')
+    @patch.object(TransactionJournal, '_get_opening_balance')
     @patch.object(TransactionJournal, '_get_account')
     @patch.object(TransactionJournal, '_get_raw_transaction_data')
     @patch.object(TransactionJournal, '_get_scheduled_transactions')
@@ -306,7 +320,7 @@ class TestTransactionJournal:
                                               mock__get_scheduled_transactions: MagicMock,
                                               mock__get_raw_transaction_data: MagicMock,
                                               mock__get_account: MagicMock,
-                                              mock_get_balance: MagicMock,
+                                              mock__get_opening_balance: MagicMock,
                                               piecash_helper: TestPiecashHelper):
         """should work correctly with configs"""
         # Arrange
@@ -314,11 +328,11 @@ class TestTransactionJournal:
             checkings_parent_guid="abcdefsdfs", liabilities_parent_guid="11111111")
         cls = TransactionJournal(book=self.mockBook, config=config)
 
-        checkings_account: Account = piecash_helper.get_checkings_account()
-        assert checkings_account.get_balance == mock_get_balance
+        assert cls._get_opening_balance is mock__get_opening_balance
 
+        checkings_account: Account = piecash_helper.get_checkings_account()
         mock__get_account.return_value = checkings_account
-        mock_get_balance.return_value = Decimal(11223)
+        mock__get_opening_balance.return_value = Decimal(11223)
 
         # Act
         data = cls.get_transaction_data(start_date=date(
@@ -329,3 +343,704 @@ class TestTransactionJournal:
 
         assert data.config.opening_date == date(2000, 10, 9)
         assert data.config.opening_liability == Decimal(11223)
+
+    def test__get_opening_balance(self):
+        """should compute the same balance as piecash, with a single query"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book)
+
+        for fullname in ["Assets", "Assets:Checkings", "Liabilities", "Incomes", "Expenses:Food"]:
+            account = book.accounts(fullname=fullname)
+            for at_date in [date(2021, 9, 9), date(2021, 9, 15), date(2021, 9, 21), date(2022, 1, 2)]:
+                with QueryCounter(book) as counter:
+                    balance = journal._get_opening_balance(account=account, at_date=at_date)
+                assert balance == account.get_balance(at_date=at_date)
+                assert counter.count == 1
+
+    def test__get_recorded_transactions_eager_load(self):
+        """should load recorded transactions with a number of queries independent of their count"""
+        def count_queries(end_date: date) -> tuple[int, int]:
+            book = TestPiecashHelper.open_book()
+            config = TransactionJournalConfig(checkings_parent_guid="abcdefsdfs", eager_load=True)
+            journal = TransactionJournal(book=book, config=config)
+            with QueryCounter(book) as counter:
+                recorded = journal._get_recorded_transactions(date(2021, 9, 1), end_date)
+                for tr in recorded:
+                    TransactionDataItem.from_transactions(tr.post_date, [tr], [], directory=journal._get_directory())
+            return len(recorded), counter.count
+
+        few_transactions, few_queries = count_queries(date(2021, 9, 16))
+        many_transactions, many_queries = count_queries(date(2022, 12, 31))
+
+        assert few_transactions < many_transactions
+        assert few_queries == many_queries
+        # Transactions, splits, slots and the directory, without loading the Account objects
+        assert many_queries == 4
+
+    def test_get_transaction_data_sql_backend(self, capsys):
+        """should return the same data with the sql backend as with the orm one, reporting the same skipped ones"""
+        book = TestPiecashHelper.open_book()
+        orm_journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62"))
+        sql_journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            backend="sql"))
+
+        for start_date, end_date in [
+            (date(2021, 9, 1), date(2021, 9, 30)),
+            (date(2021, 9, 15), date(2022, 3, 31)),
+            (date(2022, 6, 1), date(2022, 6, 30))
+        ]:
+            orm_data = orm_journal.get_transaction_data(start_date, end_date)
+            sql_data = sql_journal.get_transaction_data(start_date, end_date)
+
+            assert sql_data == orm_data
+
+        assert len(sql_data.items) > 0
+        # The transactions of the scheduled transaction templates can't be paired
+        assert sql_journal.get_classification_report() == orm_journal.get_classification_report()
+        assert "Skipped: Missing to_account for 2021-09-18-ScheduledSplit" in sql_journal.get_classification_report()
+        assert capsys.readouterr().out == ""
+
+    def test__get_chunks(self):
+        """should split a period by month or by number of days"""
+        assert self.testClass._get_chunks(date(2021, 11, 20), date(2022, 1, 10)) == [
+            (date(2021, 11, 20), date(2021, 11, 30)),
+            (date(2021, 12, 1), date(2021, 12, 31)),
+            (date(2022, 1, 1), date(2022, 1, 10))
+        ]
+        assert self.testClass._get_chunks(date(2021, 11, 20), date(2021, 12, 5), chunk_days=7) == [
+            (date(2021, 11, 20), date(2021, 11, 26)),
+            (date(2021, 11, 27), date(2021, 12, 3)),
+            (date(2021, 12, 4), date(2021, 12, 5))
+        ]
+
+    def test_get_transaction_data_iter(self):
+        """should yield chunks equal to the transaction data of each chunk period"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62"))
+
+        for chunk_days in [None, 10]:
+            chunks = list(journal.get_transaction_data_iter(date(2021, 9, 1), date(2022, 2, 28), chunk_days=chunk_days))
+            periods = journal._get_chunks(date(2021, 9, 1), date(2022, 2, 28), chunk_days=chunk_days)
+
+            assert len(chunks) == len(periods)
+            for chunk, (chunk_start, chunk_end) in zip(chunks, periods):
+                assert chunk == journal.get_transaction_data(chunk_start, chunk_end)
+
+            whole = journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+            assert [item for chunk in chunks for item in chunk.items] == whole.items
+
+    def test_refresh(self, tmp_path):
+        """should only rebuild the dates changed since the last load, as a full load would"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            refreshable=True))
+
+        with pytest.raises(AttributeError):
+            journal.refresh()
+
+        # Without refreshable, a load doesn't keep the state of the book
+        plain_journal = TransactionJournal(book=book, config=dataclasses.replace(journal.config, refreshable=False))
+        with patch.object(TransactionJournal, "_get_splits_state") as mock_state:
+            plain_journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+        mock_state.assert_not_called()
+        with pytest.raises(AttributeError):
+            plain_journal.refresh()
+
+        data = journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+        data.get_balance_data()
+        assert journal.refresh() is data
+
+        checkings = book.accounts(fullname="Assets:Checkings")
+        food = book.accounts(fullname="Expenses:Food")
+        Transaction(
+            currency=checkings.commodity,
+            description="Added",
+            post_date=date(2021, 12, 3),
+            splits=[
+                Split(account=checkings, value=Decimal(-14)),
+                Split(account=food, value=Decimal(14))
+            ])
+        book.save()
+
+        with patch.object(BalanceEngine, "get_item_balances",
+                          side_effect=BalanceEngine.get_item_balances) as mock_get_item_balances:
+            refreshed = journal.refresh()
+            refreshed.get_balance_data()
+            computed = [item.date for call in mock_get_item_balances.call_args_list for item in call.kwargs["items"]]
+
+        expected = TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 2, 28))
+        assert refreshed == expected
+        assert refreshed.get_balance_data().equals(expected.get_balance_data())
+        assert min(computed) == date(2021, 12, 3)
+        assert [item for item in refreshed.items if item.date < date(2021, 12, 3)] == [
+            item for item in data.items if item.date < date(2021, 12, 3)]
+
+        # Edited amounts keep the enter date of their transaction
+        later = TransactionJournal(book=book, config=journal.config)
+        later.get_transaction_data(date(2021, 10, 1), date(2022, 2, 28))
+        transaction = book.transactions(description="CheckingsExpenseFood1")
+        for split in transaction.splits:
+            split.value = split.value * 2
+            split.quantity = split.quantity * 2
+        book.save()
+
+        with patch.object(BalanceEngine, "get_item_balances",
+                          side_effect=BalanceEngine.get_item_balances) as mock_get_item_balances:
+            refreshed = journal.refresh()
+            refreshed.get_balance_data()
+            computed = [item.date for call in mock_get_item_balances.call_args_list for item in call.kwargs["items"]]
+
+        expected = TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 2, 28))
+        assert refreshed == expected
+        assert refreshed.get_balance_data().equals(expected.get_balance_data())
+        assert min(computed) == date(2021, 9, 15)
+
+        # Before the period, only the opening balances change
+        refreshed = later.refresh()
+        expected = TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 10, 1), date(2022, 2, 28))
+        assert refreshed == expected
+        assert refreshed.config.opening_balance == Decimal(584)
+
+        book.close()
+
+    def test_refresh_scheduled(self, tmp_path):
+        """should rebuild the occurences of an edited scheduled transaction"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            refreshable=True))
+        journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "ScheduledNeverCreated").one()
+        scheduled.enabled = False
+        book.save()
+
+        refreshed = journal.refresh()
+        expected = TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 2, 28))
+        assert refreshed == expected
+        assert "ScheduledNeverCreated" not in [
+            tr.description for item in refreshed.items for tr in item.transactions]
+
+        book.close()
+
+    def test_refresh_templates(self, tmp_path):
+        """should rebuild the occurences of an edited template, and everything after an account rename"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            refreshable=True))
+        journal.get_transaction_data(date(2021, 9, 1), date(2021, 12, 31))
+
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        for split in scheduled.template_account.splits:
+            slots = split["sched-xaction"]
+            for side in ["debit", "credit"]:
+                if slots["{}-numeric".format(side)].value > 0:
+                    slots["{}-numeric".format(side)].value = Decimal(30)
+                    slots["{}-formula".format(side)].value = "30"
+        book.save()
+
+        refreshed = journal.refresh()
+        assert refreshed == TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 9, 1), date(2021, 12, 31))
+        assert [tr.value for item in refreshed.items for tr in item.transactions
+                if tr.description == "SampledScheduled"] == [Decimal(30)] * 2
+
+        book.accounts(fullname="Expenses:Food").name = "Groceries"
+        book.accounts(fullname="Assets:Checkings").name = "Current"
+        book.save()
+
+        refreshed = journal.refresh()
+        assert refreshed == TransactionJournal(book=book, config=journal.config).get_transaction_data(
+            date(2021, 9, 1), date(2021, 12, 31))
+        assert refreshed.config.checkings_parent == "Assets:Current"
+        assert "Expenses:Groceries" in refreshed.config.accounts.values()
+        assert "Expenses:Food" not in [tr.to_account for item in refreshed.items for tr in item.transactions]
+
+        book.close()
+
+    def test_get_transaction_data_checkpoints(self, tmp_path):
+        """should return the same data with balance checkpoints, and close their store with the journal"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62")
+
+        with TransactionJournal(book=book, config=dataclasses.replace(
+                config, checkpoint_path=book_path + ".checkpoints", refreshable=True)) as journal:
+            checkpoints = journal._checkpoints
+            for start_date in [date(2021, 10, 1), date(2022, 1, 1)]:
+                assert journal.get_transaction_data(start_date, date(2022, 2, 28)) == TransactionJournal(
+                    book=book, config=config).get_transaction_data(start_date, date(2022, 2, 28))
+
+            transaction = book.transactions(description="CheckingsExpenseFood1")
+            for split in transaction.splits:
+                split.value = split.value * 2
+                split.quantity = split.quantity * 2
+            book.save()
+
+            assert journal.refresh() == TransactionJournal(book=book, config=config).get_transaction_data(
+                date(2022, 1, 1), date(2022, 2, 28))
+
+            # Moved under the checkings account, the savings are in the opening balance
+            book.accounts(fullname="Assets:Savings").parent = book.accounts(fullname="Assets:Checkings")
+            book.save()
+            moved = journal.get_transaction_data(date(2022, 1, 1), date(2022, 2, 28))
+            assert moved == TransactionJournal(book=book, config=config).get_transaction_data(
+                date(2022, 1, 1), date(2022, 2, 28))
+            assert moved.config.opening_balance == Decimal(1240)
+
+        assert journal._checkpoints is None
+        assert journal._account_balance.checkpoints is None
+        with pytest.raises(sqlite3.ProgrammingError):
+            checkpoints.get_state()
+        # The closed store isn't used by the commits of the session anymore
+        book.transactions(description="CheckingsExpenseFood1").description = "Closed"
+        book.save()
+        book.close()
+
+    def test_get_transaction_data_cached(self):
+        """should return the same data from the cache, only querying the missing ranges"""
+        book = TestPiecashHelper.open_book()
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62")
+        journal = TransactionJournal(book=book, config=config)
+        cached_journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            cache_size=10 ** 7))
+
+        built = []
+        with patch.object(TransactionJournal, "_build_transaction_data", autospec=True,
+                          side_effect=TransactionJournal._build_transaction_data) as mock_build:
+            for start_date, end_date in [
+                (date(2021, 9, 1), date(2021, 12, 31)),
+                (date(2021, 11, 1), date(2022, 3, 31)),
+                (date(2021, 9, 1), date(2022, 3, 31)),
+            ]:
+                mock_build.reset_mock()
+                data = cached_journal.get_transaction_data(start_date, end_date)
+                built.append([(call.kwargs["start_date"], call.kwargs["end_date"])
+                              for call in mock_build.call_args_list])
+                assert data == journal.get_transaction_data(start_date, end_date)
+
+        assert built == [
+            [(date(2021, 9, 1), date(2021, 12, 31))],
+            [(date(2022, 1, 1), date(2022, 3, 31))],
+            []
+        ]
+        assert cached_journal._cache.stats.misses == 1
+        assert cached_journal._cache.stats.partial_hits == 1
+        assert cached_journal._cache.stats.hits == 1
+
+    def test_get_transaction_data_cached_changed(self, tmp_path):
+        """should return fresh data from the cache when a split value changes, and copies of the cached items"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            cache_size=10 ** 7)
+        journal = TransactionJournal(book=book, config=config)
+
+        data = journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+        data.items[0].transactions[0].value = Decimal(-1)
+        data.items[1].transactions.clear()
+        uncached_config = dataclasses.replace(config, cache_size=None)
+        expected = TransactionJournal(book=book, config=uncached_config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 2, 28))
+        assert journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28)) == expected
+
+        transaction = book.transactions(description="SplitTransferName1")
+        for split in transaction.splits:
+            split.value = split.value * 2
+            split.quantity = split.quantity * 2
+        book.save()
+
+        changed = journal.get_transaction_data(date(2021, 9, 1), date(2022, 2, 28))
+        assert changed == TransactionJournal(book=book, config=uncached_config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 2, 28))
+        assert changed != expected
+        assert journal._cache.stats.invalidations == 1
+
+        book.close()
+
+    def test_get_transaction_data_cached_templates(self, tmp_path):
+        """should return fresh data from the cache when a template or an account name changes"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            cache_size=10 ** 7)
+        journal = TransactionJournal(book=book, config=config)
+        uncached_config = dataclasses.replace(config, cache_size=None)
+
+        def assert_fresh() -> TransactionData:
+            data = journal.get_transaction_data(date(2021, 9, 1), date(2021, 12, 31))
+            assert data == TransactionJournal(book=book, config=uncached_config).get_transaction_data(
+                date(2021, 9, 1), date(2021, 12, 31))
+            return data
+
+        assert_fresh()
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        for split in scheduled.template_account.splits:
+            slots = split["sched-xaction"]
+            for side in ["debit", "credit"]:
+                if slots["{}-numeric".format(side)].value > 0:
+                    slots["{}-numeric".format(side)].value = Decimal(30)
+                    slots["{}-formula".format(side)].value = "30"
+        book.save()
+        assert [tr.value for item in assert_fresh().items for tr in item.transactions
+                if tr.description == "SampledScheduled"] == [Decimal(30)] * 2
+
+        book.accounts(fullname="Expenses:Food").name = "Groceries"
+        book.save()
+        assert "Expenses:Groceries" in [tr.to_account for item in assert_fresh().items for tr in item.transactions]
+
+        # A hit only validates the splits of the requested period
+        with patch.object(TransactionJournal, "_get_splits_state", autospec=True,
+                          side_effect=TransactionJournal._get_splits_state) as mock_state, \
+                patch.object(TransactionJournal, "_build_transaction_data") as mock_build:
+            journal.get_transaction_data(date(2021, 10, 1), date(2021, 11, 30))
+        mock_state.assert_called_once_with(journal, date(2021, 10, 1), date(2021, 11, 30))
+        mock_build.assert_not_called()
+
+        book.close()
+
+    def test_get_transaction_data_many(self):
+        """should return the same data as one call per window, with fewer queries"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            eager_load=True))
+        windows = [
+            (date(2021, 9, 1), date(2021, 9, 30)),
+            (date(2021, 10, 1), date(2021, 10, 31)),
+            (date(2021, 9, 1), date(2021, 12, 31)),
+            (date(2021, 9, 15), date(2022, 3, 31)),
+            (date(2022, 1, 1), date(2022, 3, 31))
+        ]
+
+        with QueryCounter(book) as single_counter:
+            expected = [journal.get_transaction_data(start_date, end_date) for start_date, end_date in windows]
+        with QueryCounter(book) as many_counter:
+            many = journal.get_transaction_data_many(windows)
+
+        assert many == expected
+        assert many_counter.count < single_counter.count
+        assert journal.get_transaction_data_many([]) == []
+
+    def test_get_transaction_data_parallel(self):
+        """should return the same data in parallel as in the serial path"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62"))
+        with TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+                liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+                workers=3)) as parallel_journal:
+            with patch.object(TransactionJournal, "_get_scheduled_transactions", autospec=True,
+                              side_effect=TransactionJournal._get_scheduled_transactions) as mock_scheduled:
+                data = parallel_journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+            assert mock_scheduled.call_count == 1
+            executor = parallel_journal._executor
+
+            assert data == journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+            assert len(data.items) > 0
+            assert parallel_journal.get_transaction_data(date(2021, 10, 1), date(2022, 3, 31)) == \
+                journal.get_transaction_data(date(2021, 10, 1), date(2022, 3, 31))
+            assert parallel_journal._executor is executor
+
+        assert parallel_journal._executor is None
+
+    def test_get_transaction_data_parallel_changed(self, tmp_path):
+        """should return fresh data from the workers of the pool when the book changes between calls"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62")
+
+        with TransactionJournal(book=book, config=dataclasses.replace(config, workers=2)) as parallel_journal:
+            parallel_journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+
+            transaction = book.transactions(description="SplitTransferName1")
+            for split in transaction.splits:
+                split.value = split.value * 2
+                split.quantity = split.quantity * 2
+            book.accounts(fullname="Expenses:Food").name = "Groceries"
+            book.save()
+
+            assert parallel_journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30)).items == \
+                TransactionJournal(book=book, config=config).get_transaction_data(
+                    date(2021, 9, 1), date(2022, 6, 30)).items
+
+        book.close()
+
+    def test_get_transaction_data_minor_units(self):
+        """should return the same amounts and balances as int minor units, with both backends"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62"))
+        data = journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+        balance_data = data.get_balance_data()
+
+        for backend in ["orm", "sql"]:
+            minor_journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+                liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+                backend=backend,
+                minor_units=True))
+            minor_data = minor_journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+
+            assert minor_data.config.fraction == 100
+            assert minor_data.config.opening_balance == data.config.opening_balance * 100
+            assert [[tr.value for tr in item.transactions] for item in minor_data.items] == [
+                [tr.value * 100 for tr in item.transactions] for item in data.items]
+            assert all(isinstance(tr.value, int) for item in minor_data.items for tr in item.transactions)
+
+            minor_balance_data = minor_data.get_balance_data()
+            assert minor_balance_data["balance"].dtype == np.int64
+            assert list(minor_data.to_decimal(minor_balance_data["balance"])) == list(balance_data["balance"])
+
+    def test_get_transaction_data_minor_units_finer_fraction(self, tmp_path):
+        """should refuse minor units up front when a transaction currency has a finer fraction"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        currency = Commodity(namespace="CURRENCY", mnemonic="TND", fullname="Tunisian dinar", fraction=1000)
+        root = book.root_account
+        cash = Account(name="Cash TND", type="ASSET", parent=root, commodity=currency)
+        food = Account(name="Food TND", type="EXPENSE", parent=root, commodity=currency)
+        Transaction(
+            currency=currency,
+            description="Dinars",
+            post_date=date(2021, 10, 2),
+            splits=[
+                Split(account=cash, value=Decimal("-1.234")),
+                Split(account=food, value=Decimal("1.234"))
+            ])
+        book.save()
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62")
+
+        assert len(TransactionJournal(book=book, config=config).get_transaction_data(
+            date(2021, 9, 1), date(2022, 6, 30)).items) > 0
+        for backend in ["orm", "sql"]:
+            journal = TransactionJournal(book=book, config=dataclasses.replace(
+                config, minor_units=True, backend=backend))
+            with patch.object(TransactionJournal, "_build_transaction_data") as mock_build:
+                with pytest.raises(ValueError, match="Currency TND has a fraction of 1/1000"):
+                    journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+            mock_build.assert_not_called()
+
+        book.close()
+
+    def test_get_transaction_data_minor_units_formula(self, tmp_path):
+        """should round the values of a dividing formula to the fraction of the commodity, as minor units too"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        for split in scheduled.template_account.splits:
+            slots = split["sched-xaction"]
+            for side in ["debit", "credit"]:
+                if slots["{}-numeric".format(side)].value > 0:
+                    slots["{}-numeric".format(side)].value = Decimal(0)
+                    slots["{}-formula".format(side)].value = "rent / 3"
+        book.save()
+        config = TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62",
+            formula_variables={"rent": Decimal(100)})
+
+        def get_values(journal: TransactionJournal) -> list:
+            data = journal.get_transaction_data(date(2021, 9, 1), date(2021, 12, 31))
+            return [tr.value for item in data.items for tr in item.transactions if tr.description == "SampledScheduled"]
+
+        assert get_values(TransactionJournal(book=book, config=config)) == [Decimal("33.33")] * 2
+        for backend in ["orm", "sql"]:
+            assert get_values(TransactionJournal(book=book, config=dataclasses.replace(
+                config, minor_units=True, backend=backend))) == [3333] * 2
+
+        book.close()
+
+    def test_get_transaction_data_templates(self):
+        """should compile each scheduled transaction template once, across loads"""
+        book = TestPiecashHelper.open_book()
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+            liabilities_parent_guid="8e9104e0e32c4e439be578f8549aea62"))
+        data = journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+        templates = dict(journal._templates._templates)
+        assert len(templates) > 0
+        assert journal.get_formula_report() == ""
+
+        again = journal.get_transaction_data(date(2021, 9, 1), date(2022, 6, 30))
+        assert all(journal._templates._templates[guid][1] is template for guid, (_, template) in templates.items())
+        assert again.items == data.items
+
+        # The version of the templates is read once per load, not once per chunk
+        with patch.object(journal, "_update_templates", wraps=journal._update_templates) as update:
+            chunks = list(journal.get_transaction_data_iter(date(2021, 9, 1), date(2022, 6, 30)))
+        assert len(chunks) == 10
+        assert update.call_count == 1
+
+    def test_get_transaction_data_match_tolerance(self, tmp_path):
+        """should cancel the occurence of a scheduled transaction recorded a few days later"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        # Recorded by hand: no occurence is marked as created
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        scheduled.start_date = date(2021, 9, 1)
+        scheduled.last_occur = None
+        book.save()
+
+        def get_scheduled_dates(tolerance_days: int, backend: str = "orm") -> list[date]:
+            journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+                backend=backend,
+                match_tolerance_days=tolerance_days))
+            data = journal.get_transaction_data(date(2021, 9, 1), date(2021, 12, 31))
+            return [item.date for item in data.items for tr in item.transactions
+                    if tr.is_scheduled and tr.description == "SampledScheduled"]
+
+        # Occurence on 2021-10-01, recorded on 2021-10-05
+        assert date(2021, 10, 1) in get_scheduled_dates(0)
+        assert get_scheduled_dates(5) == [date(2021, 9, 1), date(2021, 11, 1), date(2021, 12, 1)]
+        assert get_scheduled_dates(5, backend="sql") == get_scheduled_dates(5)
+        assert get_scheduled_dates(3) == get_scheduled_dates(0)
+
+        book.close()
+
+    def test_get_transaction_data_match_tolerance_created(self):
+        """should pair the instances of the already created occurences with them, not with the forecast ones"""
+        book = TestPiecashHelper.open_book()
+
+        def get_scheduled_dates(tolerance_days: int) -> list[date]:
+            journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+                match_tolerance_days=tolerance_days))
+            data = journal.get_transaction_data(date(2021, 9, 1), date(2021, 12, 31))
+            return [item.date for item in data.items for tr in item.transactions
+                    if tr.is_scheduled and tr.description == "SampledScheduled"]
+
+        # Created until 2021-10-19, with an instance recorded on 2021-10-05
+        assert get_scheduled_dates(0) == [date(2021, 11, 1), date(2021, 12, 1)]
+        for tolerance_days in [3, 27, 40]:
+            assert get_scheduled_dates(tolerance_days) == get_scheduled_dates(0)
+
+    def test_get_transaction_data_match_tolerance_weekly(self, tmp_path):
+        """should not cancel the first forecast occurence of a weekly scheduled transaction"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+        # Weekly on wednesdays, created until 2021-10-06, with an instance recorded on 2021-10-05
+        scheduled.recurrence.recurrence_period_type = "week"
+        scheduled.last_occur = date(2021, 10, 6)
+        book.save()
+
+        def get_scheduled_dates(tolerance_days: int) -> list[date]:
+            journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+                checkings_parent_guid="24b92fc00a9440c2856281f6eb093536",
+                match_tolerance_days=tolerance_days))
+            data = journal.get_transaction_data(date(2021, 10, 1), date(2021, 10, 31))
+            return [item.date for item in data.items for tr in item.transactions
+                    if tr.is_scheduled and tr.description == "SampledScheduled"]
+
+        assert get_scheduled_dates(0) == [date(2021, 10, 13), date(2021, 10, 20), date(2021, 10, 27)]
+        assert get_scheduled_dates(8) == get_scheduled_dates(0)
+
+        book.close()
+
+    def test__get_scheduled_transactions_limits(self, tmp_path):
+        """should only expand the occurences not created yet, within the start, end and number of occurences"""
+        book_path = str(tmp_path / "book.gnucash")
+        shutil.copyfile(sample_data_path, book_path)
+        book = piecash.open_book(book_path, open_if_lock=True, readonly=False)
+        journal = TransactionJournal(book=book, config=TransactionJournalConfig(
+            checkings_parent_guid="24b92fc00a9440c2856281f6eb093536"))
+        scheduled = book.session.query(ScheduledTransaction).filter(
+            ScheduledTransaction.name == "SampledScheduled").one()
+
+        def get_dates(start_date: date = date(2021, 9, 1), end_date: date = date(2021, 12, 31)) -> list[date]:
+            book.save()
+            return dict((tr.name, dates) for tr, dates in journal._get_scheduled_transactions(
+                start_date, end_date)).get("SampledScheduled")
+
+        def get_candidates(start_date: date = None, end_date: date = None) -> list[str]:
+            book.save()
+            return [tr.name for tr in journal._get_scheduled_candidates(start_date, end_date)]
+
+        # Monthly from 2021-09-01, created until 2021-10-19
+        assert get_dates() == [date(2021, 11, 1), date(2021, 12, 1)]
+
+        scheduled.num_occur = 5
+        scheduled.rem_occur = 1
+        assert get_dates() == [date(2021, 11, 1)]
+
+        scheduled.rem_occur = 0
+        assert get_dates() is None
+        assert "SampledScheduled" not in get_candidates()
+
+        scheduled.num_occur = 0
+        scheduled.end_date = date(2021, 11, 15)
+        assert get_dates() == [date(2021, 11, 1)]
+        assert "SampledScheduled" not in get_candidates(date(2021, 11, 16), date(2021, 12, 31))
+
+        scheduled.end_date = date(2021, 10, 19)
+        assert "SampledScheduled" not in get_candidates()
+
+        scheduled.end_date = None
+        scheduled.start_date = date(2021, 11, 2)
+        scheduled.last_occur = None
+        assert get_dates() == [date(2021, 12, 1)]
+        assert "SampledScheduled" not in get_candidates(date(2021, 9, 1), date(2021, 11, 1))
+
+        # The recurrences are loaded with the candidates
+        book.session.expire_all()
+        with QueryCounter(book) as counter:
+            candidates = journal._get_scheduled_candidates()
+            assert all(tr.recurrence is not None for tr in candidates)
+        assert len(candidates) > 1
+        assert counter.count == 1
+
+        book.close()
@@ -7,6 +7,8 @@ from piecash.core.book import Book
 from piecash.core.transaction import ScheduledTransaction, Transaction
 
 working_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sample_data_path = os.path.join(os.path.realpath(
+    working_dir + '/tests/fixtures'), 'sample_data.gnucash')
 
 
 class TestPiecashHelper:
@@ -17,9 +19,7 @@ class TestPiecashHelper:
     scheduled_records: Dict[str, Transaction] = {}
 
     def __init__(self) -> None:
-        smaple_data_path = os.path.join(os.path.realpath(
-            working_dir + '/tests/fixtures'), 'sample_data.gnucash')
-        book: Book = piecash.open_book(smaple_data_path, open_if_lock=True)
+        book: Book = piecash.open_book(sample_data_path, open_if_lock=True)
 
         scheduled = book.query(
             ScheduledTransaction
@@ -37,6 +37,11 @@ class TestPiecashHelper:
         for tr in scheduled:
             self.scheduled_transactions[tr.name] = tr
 
+    @classmethod
+    def open_book(cls) -> Book:
+        """Opens a fresh (readonly) session of the sample book"""
+        return piecash.open_book(sample_data_path, open_if_lock=True, readonly=True)
+
     def get_record_previously_scheduled(self):
         return self.scheduled_records["ScheduledSplit1"]
 